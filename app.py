@@ -2,6 +2,7 @@ import gradio as gr
 import pandas as pd
 import matplotlib.pyplot as plt
 from io import BytesIO
+from datatrace.querycache import cached_query
 from datatrace import (
     add_dataset,
     list_datasets,
@@ -11,6 +12,12 @@ from datatrace import (
     visualize_metric
 )
 
+# Rows per table page; "Next Page" continues from the last row shown
+TABLE_PAGE = 100
+
+def _page_cursor(rows):
+    return rows[-1]["timestamp"], rows[-1]["id"]
+
 def add_dataset_fn(file, metadata: str = ""):
     if file is None:
         return "Please upload a file first!"
@@ -21,14 +28,14 @@ def add_dataset_fn(file, metadata: str = ""):
     except Exception as e:
         return f"Error: {str(e)}"
 
-def list_datasets_fn():
+def list_datasets_fn(after=None):
     try:
-        datasets = list_datasets()
+        datasets = list_datasets(limit=TABLE_PAGE, after=after)
         if not datasets:
-            return pd.DataFrame([{"Status": "No datasets versioned yet"}])
-        return pd.DataFrame(datasets)
+            return pd.DataFrame([{"Status": "No datasets versioned yet" if after is None else "No more datasets"}]), after
+        return pd.DataFrame(datasets), _page_cursor(datasets)
     except Exception as e:
-        return pd.DataFrame([{"Error": str(e)}])
+        return pd.DataFrame([{"Error": str(e)}]), None
 
 def log_experiment_fn(name: str, dataset_hash: str, params: str, metrics: str):
     if not name or not dataset_hash:
@@ -41,14 +48,14 @@ def log_experiment_fn(name: str, dataset_hash: str, params: str, metrics: str):
     except Exception as e:
         return f"Error: {str(e)}"
 
-def show_experiments_fn():
+def show_experiments_fn(after=None):
     try:
-        exps = get_experiments()
+        exps = get_experiments(limit=TABLE_PAGE, after=after)
         if not exps:
-            return pd.DataFrame([{"Status": "No experiments logged yet"}])
-        return pd.DataFrame(exps)
+            return pd.DataFrame([{"Status": "No experiments logged yet" if after is None else "No more experiments"}]), after
+        return pd.DataFrame(exps), _page_cursor(exps)
     except Exception as e:
-        return pd.DataFrame([{"Error": str(e)}])
+        return pd.DataFrame([{"Error": str(e)}]), None
 
 def track_usage_fn(dataset_hash: str, action: str):
     if not dataset_hash or not action:
@@ -59,14 +66,17 @@ def track_usage_fn(dataset_hash: str, action: str):
     except Exception as e:
         return f"Error: {str(e)}"
 
+def _metric_png(metric_name: str):
+    fig = visualize_metric(metric_name)
+    buf = BytesIO()
+    fig.savefig(buf, format="png", bbox_inches="tight")
+    plt.close(fig)
+    return buf.getvalue()
+
 def visualize_metric_fn(metric_name: str):
     try:
-        fig = visualize_metric(metric_name)
-        buf = BytesIO()
-        fig.savefig(buf, format="png", bbox_inches="tight")
-        buf.seek(0)
-        plt.close(fig)
-        return buf
+        # re-rendered only when the database has changed
+        return BytesIO(cached_query(_metric_png, metric_name))
     except Exception as e:
         return f"Could not generate plot: {str(e)}"
 
@@ -83,8 +93,11 @@ with gr.Blocks(title="Datatrace • MLOps Tracker") as demo:
 
             gr.Markdown("---")
             list_btn = gr.Button("Show All Datasets")
+            datasets_next = gr.Button("Next Page")
             datasets_table = gr.Dataframe()
-            list_btn.click(list_datasets_fn, None, datasets_table)
+            datasets_cursor = gr.State(None)
+            list_btn.click(list_datasets_fn, None, [datasets_table, datasets_cursor])
+            datasets_next.click(list_datasets_fn, datasets_cursor, [datasets_table, datasets_cursor])
 
         with gr.Tab("Experiments"):
             exp_name = gr.Textbox(label="Experiment Name")
@@ -97,8 +110,11 @@ with gr.Blocks(title="Datatrace • MLOps Tracker") as demo:
 
             gr.Markdown("---")
             show_exp_btn = gr.Button("Show All Experiments")
+            exp_next = gr.Button("Next Page")
             exp_table = gr.Dataframe()
-            show_exp_btn.click(show_experiments_fn, None, exp_table)
+            exp_cursor = gr.State(None)
+            show_exp_btn.click(show_experiments_fn, None, [exp_table, exp_cursor])
+            exp_next.click(show_experiments_fn, exp_cursor, [exp_table, exp_cursor])
 
         with gr.Tab("Tracking & Visualization"):
             track_hash = gr.Textbox(label="Dataset Hash")
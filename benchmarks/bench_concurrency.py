@@ -0,0 +1,122 @@
+"""
+Concurrent writers: N forked processes call log_experiment on one meta.db.
+
+    python benchmarks/bench_concurrency.py [--writers 64] [--per-writer 200] [--lock | --event-log | --server]
+
+Reports aggregate throughput and per-call latency percentiles, and checks
+that every write landed. --lock enables the cross-process flock
+(DATATRACE_WRITE_LOCK); --event-log appends to segment files instead and
+times the compaction into meta.db separately; --server sends every write
+to a `datatrace serve` process, which batches them. Runs against a throwaway
+datastore.
+"""
+import argparse
+import os
+import signal
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def writer(index, count, lock, event_log, out):
+    from datatrace import db, eventlog
+    from datatrace.experiments import log_experiment
+
+    db.set_write_lock(lock)
+    eventlog.enable(event_log)
+    db.connect()  # opening the connection is not part of the measured write
+    latencies = []
+    for i in range(count):
+        start = time.perf_counter()
+        log_experiment(f"w{index}-{i}", "0" * 64, {"lr": 0.01, "worker": index}, {"accuracy": i / count})
+        latencies.append(time.perf_counter() - start)
+    with open(out, "w") as f:
+        f.write("\n".join(map(str, latencies)))
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--writers", type=int, default=64)
+    parser.add_argument("--per-writer", type=int, default=200)
+    parser.add_argument("--lock", action="store_true", help="serialize writers with an flock")
+    parser.add_argument("--event-log", action="store_true", help="append to the event log")
+    parser.add_argument("--server", action="store_true", help="write through a tracking server")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        from datatrace.db import close_all, connect
+
+        connect()  # create and migrate before forking
+        close_all()
+
+        server = None
+        if args.server:
+            from datatrace.client import SOCKET_PATH
+
+            server = os.fork()
+            if server == 0:
+                from datatrace.server import serve
+
+                serve()
+                os._exit(0)
+            while not SOCKET_PATH.exists():
+                time.sleep(0.01)
+
+        start = time.perf_counter()
+        pids = []
+        for index in range(args.writers):
+            pid = os.fork()
+            if pid == 0:
+                code = 1
+                try:
+                    writer(index, args.per_writer, args.lock, args.event_log, f"lat-{index}")
+                    code = 0
+                finally:
+                    os._exit(code)
+            pids.append(pid)
+        failed = sum(os.waitpid(pid, 0)[1] != 0 for pid in pids)
+        elapsed = time.perf_counter() - start
+        if server is not None:
+            os.kill(server, signal.SIGINT)
+            os.waitpid(server, 0)
+
+        compaction = None
+        if args.event_log:
+            from datatrace.eventlog import compact
+
+            start = time.perf_counter()
+            compact()
+            compaction = time.perf_counter() - start
+
+        latencies = []
+        for index in range(args.writers):
+            if os.path.exists(f"lat-{index}"):
+                latencies += [float(x) for x in Path(f"lat-{index}").read_text().split()]
+        stored = connect().execute("SELECT COUNT(*) FROM experiments").fetchone()[0]
+
+    expected = args.writers * args.per_writer
+    mode = ("event log" if args.event_log else "server" if args.server
+            else "flock" if args.lock else "sqlite only")
+    print(f"writers: {args.writers}  mode: {mode}")
+    print(f"throughput: {stored / elapsed:10.0f} writes/s")
+    if compaction is not None:
+        print(f"compaction: {stored / compaction:10.0f} events/s")
+    print(f"latency p50: {percentile(latencies, 0.50) * 1000:8.2f} ms")
+    print(f"latency p99: {percentile(latencies, 0.99) * 1000:8.2f} ms")
+    print(f"latency max: {max(latencies) * 1000:8.2f} ms")
+    print(f"stored {stored}/{expected} writes, {failed} writers failed")
+    if stored != expected or failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Experiment logging throughput: per-call log_experiment vs log_experiments_batch.
+
+    python benchmarks/bench_experiments.py [--rows 5000]
+
+Runs against a throwaway datastore in a temporary directory.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def records(n):
+    for i in range(n):
+        yield {
+            "name": f"run-{i}",
+            "dataset_hash": "0" * 64,
+            "params": {"lr": 10 ** -(i % 5), "epochs": i % 50},
+            "metrics": {"accuracy": (i % 100) / 100, "loss": 1 / (i + 1)},
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        from datatrace.experiments import log_experiment, log_experiments_batch
+
+        start = time.perf_counter()
+        for r in records(args.rows):
+            log_experiment(r["name"], r["dataset_hash"], r["params"], r["metrics"])
+        per_call = time.perf_counter() - start
+
+        start = time.perf_counter()
+        log_experiments_batch(records(args.rows))
+        batch = time.perf_counter() - start
+
+    print(f"per-call log_experiment: {args.rows / per_call:10.0f} rows/s")
+    print(f"log_experiments_batch:   {args.rows / batch:10.0f} rows/s  ({per_call / batch:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+HTTP load test: worker threads log metric points to an in-process tracking
+server through HTTPClient.
+
+    python benchmarks/bench_http.py [--workers 8] [--points 2000] [--linger 0.005] [--unbatched]
+
+Reports logged points/s, HTTP requests/s and end-to-end latency (from the
+log_metric call until its Future resolves, i.e. the point is stored).
+--unbatched sends each point as its own POST, which is what a worker
+without coalescing would do. Runs against a throwaway datastore.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def worker(client, index, points, unbatched, latencies):
+    run = f"run-{index}"
+    for i in range(points):
+        start = time.perf_counter()
+        if unbatched:
+            client.call("log_metric", run, "loss", 1.0 / (i + 1), i)
+            latencies.append(time.perf_counter() - start)
+        else:
+            future = client.log_metric(run, "loss", 1.0 / (i + 1), i)
+            future.add_done_callback(lambda _, s=start: latencies.append(time.perf_counter() - s))
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--points", type=int, default=2000, help="metric points per worker")
+    parser.add_argument("--linger", type=float, default=0.005, help="batching window in seconds")
+    parser.add_argument("--unbatched", action="store_true", help="one POST per point")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        from datatrace.http_client import HTTPClient
+        from datatrace.metrics import load_metric
+        from datatrace.server import TrackingServer
+
+        loop = asyncio.new_event_loop()
+        server = TrackingServer(http_port=0)
+        loop.run_until_complete(server.start())
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+
+        client = HTTPClient(f"http://127.0.0.1:{server.http_port}", pool_size=args.workers,
+                            linger=args.linger)
+        latencies = []
+        threads = [
+            threading.Thread(target=worker, args=(client, i, args.points, args.unbatched, latencies))
+            for i in range(args.workers)
+        ]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        client.flush()
+        elapsed = time.perf_counter() - start
+        client.close()
+
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.run_until_complete(server.stop())  # writes the buffered points
+        loop.close()
+        stored = sum(len(load_metric(f"run-{i}", "loss")[0]) for i in range(args.workers))
+
+    expected = args.workers * args.points
+    print(f"workers: {args.workers}  mode: {'unbatched' if args.unbatched else f'linger {args.linger}s'}")
+    print(f"points:      {expected / elapsed:10.0f} /s")
+    print(f"requests:    {client.requests / elapsed:10.0f} /s  ({client.requests} total)")
+    print(f"latency p50: {percentile(latencies, 0.50) * 1000:8.2f} ms")
+    print(f"latency p99: {percentile(latencies, 0.99) * 1000:8.2f} ms")
+    print(f"latency max: {max(latencies) * 1000:8.2f} ms")
+    print(f"stored {stored}/{expected} points")
+    if stored != expected:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
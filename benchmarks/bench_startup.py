@@ -0,0 +1,64 @@
+"""
+Start-up benchmark for the CLI and package import.
+
+    python benchmarks/bench_startup.py [--runs 10]
+
+Reports min/median wall time of fresh interpreters running `import datatrace`
+and `datatrace list`, plus the slowest imports from `-X importtime`.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+CASES = {
+    "python -c pass": ["-c", "pass"],
+    "import datatrace": ["-c", "import datatrace"],
+    "datatrace list": ["-m", "datatrace.cli", "list"],
+}
+
+
+def run(args, cwd, env):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, *args], cwd=cwd, env=env, capture_output=True, check=True)
+    return time.perf_counter() - start
+
+
+def slowest_imports(cwd, env, top=10):
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "datatrace.cli", "list"],
+        cwd=cwd, env=env, capture_output=True, text=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), name.rstrip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    with tempfile.TemporaryDirectory() as cwd:
+        for label, case in CASES.items():
+            times = [run(case, cwd, env) for _ in range(args.runs)]
+            print(f"{label:<20} min {min(times) * 1000:7.1f} ms   median {statistics.median(times) * 1000:7.1f} ms")
+
+        print("\nslowest imports for `datatrace list` (cumulative):")
+        for cumulative_us, name in slowest_imports(cwd, env):
+            print(f"  {cumulative_us / 1000:7.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,47 @@
 # datatrace/__init__.py
-from .core import file_hash, dataset_hash, version_id
+# Public names are resolved lazily (PEP 562) so that `import datatrace` and
+# CLI start-up do not pay for pandas/matplotlib until they are actually used.
+import importlib
 
-# Dataset functions
-from .datasets import hash_file, log_dataset, list_datasets
-
-# Versioning
-from .versioning import add_dataset
-
-# Experiments
-from .experiments import init_experiments_table, log_experiment, get_experiments
-
-# Tracking
-from .tracking import track_usage
-
-# Visualization
-from .visualize import visualize_metric, plot_experiments
-
-# Utils
-from .utils import ensure_storage, now, save_json, BASE_DIR, META_DB
+_LAZY = {
+    # Core hashing
+    'file_hash': 'core', 'dataset_hash': 'core', 'version_id': 'core',
+    # Dataset functions
+    'hash_file': 'datasets', 'log_dataset': 'datasets', 'list_datasets': 'datasets',
+    # Versioning
+    'add_dataset': 'versioning',
+    # Experiments
+    'init_experiments_table': 'experiments', 'log_experiment': 'experiments',
+    'get_experiments': 'experiments', 'log_experiments_batch': 'experiments',
+    # Metric curves and run queries
+    'log_metric': 'metrics', 'load_metric': 'metrics', 'flush_metrics': 'metrics',
+    'query_runs': 'query',
+    # Tracking
+    'track_usage': 'tracking',
+    # Visualization
+    'visualize_metric': 'visualize', 'plot_experiments': 'visualize',
+    # Utils
+    'ensure_storage': 'utils', 'now': 'utils', 'save_json': 'utils',
+    'BASE_DIR': 'utils', 'META_DB': 'utils',
+}
 
 __all__ = [
     'add_dataset', 'list_datasets', 'log_dataset', 'hash_file',
-    'log_experiment', 'get_experiments',
+    'log_experiment', 'get_experiments', 'log_experiments_batch',
+    'log_metric', 'load_metric', 'flush_metrics', 'query_runs',
     'track_usage', 'visualize_metric', 'plot_experiments',
     'file_hash', 'dataset_hash', 'version_id',
 ]
+
+
+def __getattr__(name):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'.{module}', __name__), name)
+    globals()[name] = value  # later lookups skip __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
@@ -2,70 +2,307 @@ import typer
 from rich.console import Console
 from rich.table import Table
 
-from datatrace.core import add_dataset, load_metadata
-from datatrace.tracking import track_dataset
-from datatrace.experiments import log_experiment
+# Commands import their modules on first use, so e.g. `datatrace list` never
+# loads the hashing pool, object store or plotting stack.
 
 app = typer.Typer(help="Datatrace – Lightweight MLOps dataset & experiment tracker")
+experiment_app = typer.Typer(help="Log and import ML experiments")
+app.add_typer(experiment_app, name="experiment")
 console = Console()
 
 
 @app.command()
-def add(path: str):
+def add(
+    path: str,
+    rehash: bool = typer.Option(False, "--rehash", help="Ignore the hash cache and rehash every file"),
+    workers: int = typer.Option(1, "--workers", "-w", help="Parallel hashing workers for directories"),
+    link: bool = typer.Option(False, "--link", help="Source is immutable: allow hardlinks into the store"),
+    fast_stats: bool = typer.Option(False, "--fast-stats", help="Count CSV rows by newlines (no quoted line breaks)"),
+):
     """Add and version a dataset"""
-    version = add_dataset(path)
-    console.print(f"📦 Dataset added → version [green]{version}[/green]")
+    from datatrace.versioning import store_dataset
+
+    version, methods = store_dataset(path, rehash=rehash, workers=workers, link=link, fast_stats=fast_stats)
+    used = ", ".join(f"{n} {m or 'already stored'}" for m, n in methods.most_common())
+    console.print(f"📦 Dataset added → version [green]{version}[/green] ({used})")
 
 
 @app.command()
-def list():
+def list(
+    limit: int = typer.Option(None, "--limit", "-n", help="Show at most this many datasets"),
+):
     """List all tracked datasets"""
-    metadata = load_metadata()
+    from itertools import islice
+    from datatrace.db import PAGE_SIZE
+    from datatrace.versioning import iter_metadata
 
-    if not metadata:
+    # Print page by page so the newest datasets show without waiting for the rest
+    entries = iter_metadata(limit=limit)
+    page = [*islice(entries, PAGE_SIZE)]
+    if not page:
         console.print("[yellow]No datasets found[/yellow]")
         return
 
-    table = Table(title="📁 Versioned Datasets")
-    table.add_column("Version", style="cyan")
-    table.add_column("Original File")
-    table.add_column("Stored Name")
-    table.add_column("Timestamp", style="green")
+    title = "📁 Versioned Datasets"
+    while page:
+        table = Table(title=title, show_header=title is not None)
+        table.add_column("Version", style="cyan")
+        table.add_column("Original File")
+        table.add_column("Stored Name")
+        table.add_column("Timestamp", style="green")
 
-    for v, info in metadata.items():
-        table.add_row(
-            v,
-            info["file"],
-            info["stored_as"],
-            info["timestamp"]
-        )
+        for v, info in page:
+            table.add_row(
+                v,
+                info["file"],
+                info["stored_as"],
+                info["timestamp"]
+            )
 
-    console.print(table)
+        console.print(table)
+        title = None
+        page = [*islice(entries, PAGE_SIZE)]
+
+
+@app.command()
+def diff(old: str, new: str):
+    """Show files that changed between two directory versions"""
+    from datatrace.merkle import diff_versions
+
+    changes = diff_versions(old, new)
+    if not changes:
+        console.print("[green]No changes[/green]")
+        return
+
+    styles = {"added": "green", "removed": "red", "modified": "yellow"}
+    for change, path in changes:
+        console.print(f"[{styles[change]}]{change:>8}[/{styles[change]}]  {path}")
+
+
+@app.command()
+def checkout(
+    version: str,
+    dest: str,
+    link: bool = typer.Option(False, "--link", help="Allow hardlinks to the read-only blobs"),
+):
+    """Materialize a stored dataset version into a directory"""
+    from datatrace.objects import checkout as checkout_version
+
+    methods = checkout_version(version, dest, link=link)
+    used = ", ".join(f"{n} {m}" for m, n in methods.most_common())
+    console.print(f"📂 Checked out {sum(methods.values())} files ({used}) → [green]{dest}[/green]")
+
+
+@app.command()
+def gc():
+    """Delete blobs no longer referenced by any version"""
+    from datatrace.objects import gc as gc_objects
+
+    removed, freed = gc_objects()
+    console.print(f"🧹 Removed {removed} blobs, freed {freed} bytes")
 
 
 @app.command()
 def track(path: str):
     """Track dataset usage"""
-    track_dataset(path)
+    from datatrace.core import file_hash
+    from datatrace.tracking import track_usage
+
+    track_usage(file_hash(path), "track")
     console.print("📊 Dataset usage tracked", style="bold green")
 
 
 @app.command()
-def experiment(
+def runs(
+    where: str = typer.Option(None, "--where", help='Filter, e.g. "params.lr<0.01, metrics.accuracy>0.9"'),
+    order_by: str = typer.Option(None, "--order-by", help='Sort field, e.g. "metrics.accuracy" or "params.lr asc"'),
+    limit: int = typer.Option(20, "--limit", "-n", help="Show at most this many runs"),
+):
+    """Query experiments by params, metrics and dataset"""
+    import json
+    from datatrace.query import query_runs
+
+    try:
+        found = query_runs(where, order_by, limit)
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
+
+    if not found:
+        console.print("[yellow]No matching runs[/yellow]")
+        return
+
+    table = Table(title="🧪 Runs")
+    table.add_column("ID", style="cyan")
+    table.add_column("Name")
+    table.add_column("Dataset")
+    table.add_column("Params")
+    table.add_column("Metrics")
+    table.add_column("Timestamp", style="green")
+    for run in found:
+        table.add_row(
+            str(run["id"]),
+            run["name"],
+            run["dataset_hash"],
+            json.dumps(run["params"]),
+            json.dumps(run["metrics"]),
+            run["timestamp"]
+        )
+    console.print(table)
+
+
+@app.command()
+def leaderboard(
+    metric: str = typer.Option(None, "--metric", "-m", help="Only this metric"),
+    direction: str = typer.Option(None, "--direction", help="Rank --metric by 'max' or 'min' from now on"),
+    rebuild: bool = typer.Option(False, "--rebuild", help="Recompute the leaderboard from all experiments"),
+):
+    """Show the best run per dataset for each metric"""
+    from datatrace import leaderboard as board
+
+    if direction:
+        if not metric:
+            raise typer.BadParameter("--direction needs --metric", param_hint="--direction")
+        try:
+            board.set_direction(metric, direction)
+        except ValueError as e:
+            raise typer.BadParameter(str(e), param_hint="--direction")
+    if rebuild:
+        board.rebuild(metric)
+
+    entries = board.get_leaderboard(metric)
+    if not entries:
+        console.print("[yellow]No ranked metrics yet[/yellow]")
+        return
+
+    table = Table(title="🏆 Leaderboard")
+    table.add_column("Metric", style="cyan")
+    table.add_column("Dataset")
+    table.add_column("Best Run")
+    table.add_column("Value", style="green", justify="right")
+    for entry in entries:
+        table.add_row(
+            f"{entry['key']} ({entry['direction']})",
+            entry["dataset_hash"],
+            f"{entry['name']} (#{entry['experiment_id']})",
+            f"{entry['value']:g}"
+        )
+    console.print(table)
+
+
+@app.command()
+def usage(
+    dataset_hash: str = typer.Argument(None, help="Only this dataset"),
+    by: str = typer.Option("day", "--by", help="Bucket size: 'day' or 'hour'"),
+    since: str = typer.Option(None, "--since", help="ISO date to start from, e.g. 2024-05-01"),
+):
+    """Show dataset usage counts per day or hour"""
+    from datatrace.tracking import get_usage_rollup
+
+    try:
+        rollup = get_usage_rollup(dataset_hash, granularity=by, since=since)
+    except ValueError as e:
+        raise typer.BadParameter(str(e), param_hint="--by")
+
+    if not rollup:
+        console.print("[yellow]No usage recorded[/yellow]")
+        return
+
+    table = Table(title="📊 Dataset Usage")
+    table.add_column("Bucket", style="green")
+    table.add_column("Dataset", style="cyan")
+    table.add_column("Action")
+    table.add_column("Count", justify="right")
+    for row in rollup:
+        table.add_row(row["bucket"], row["hash"], row["action"], str(row["count"]))
+    console.print(table)
+
+
+@app.command("compact-usage")
+def compact_usage(
+    retention_days: int = typer.Option(30, "--retention-days", help="Keep raw usage events this many days"),
+    hourly_days: int = typer.Option(90, "--hourly-days", help="Keep hourly rollups this many days"),
+):
+    """Drop old raw usage events (rollups keep their counts) and reclaim space"""
+    from datatrace.tracking import compact_usage as compact
+
+    removed = compact(retention_days=retention_days, hourly_retention_days=hourly_days)
+    console.print(
+        f"🧹 Removed {removed['usage']} usage events and {removed['usage_hourly']} hourly rollups"
+    )
+
+
+@app.command("compact-events")
+def compact_events():
+    """Merge the append-only event log (DATATRACE_EVENT_LOG=1) into meta.db"""
+    from datatrace.eventlog import compact
+
+    merged = compact()
+    console.print(f"🗜 Merged {merged} events")
+
+
+@app.command()
+def serve(
+    port: int = typer.Option(None, "--port", help="Also listen on this localhost TCP port"),
+    http_port: int = typer.Option(None, "--http-port", help="Also serve the HTTP API on this port"),
+    host: str = typer.Option("127.0.0.1", "--host", help="Address for --port and --http-port"),
+    token: str = typer.Option(None, "--token", envvar="DATATRACE_SERVER_TOKEN",
+                              help="Shared token TCP clients must send; required for a non-loopback --host"),
+):
+    """Run a tracking server that batches writes from every local process"""
+    from datatrace.client import SOCKET_PATH
+    from datatrace.server import TrackingServer
+
+    try:
+        server = TrackingServer(port=port, host=host, http_port=http_port, token=token)
+    except ValueError as e:
+        raise typer.BadParameter(str(e), param_hint="--host")
+
+    listening = [str(SOCKET_PATH)]
+    if port is not None:
+        listening.append(f"{host}:{port}")
+    if http_port is not None:
+        listening.append(f"http://{host}:{http_port}")
+    console.print(f"📡 Serving on {', '.join(listening)}")
+    server.run()
+
+
+@experiment_app.command("log")
+def experiment_log(
     name: str,
     version: str,
     lr: float,
     accuracy: float
 ):
     """Log an ML experiment"""
+    from datatrace.experiments import log_experiment
+
     log_experiment(
-        experiment_name=name,
-        dataset_version=version,
+        name=name,
+        dataset_hash=version,
         params={"lr": lr},
         metrics={"accuracy": accuracy}
     )
     console.print("🧪 Experiment logged", style="bold green")
 
 
+@experiment_app.command("import")
+def experiment_import(
+    path: str,
+    batch_size: int = typer.Option(1000, "--batch-size", help="Rows per executemany chunk"),
+):
+    """Import experiments from a JSONL file in one transaction"""
+    import json
+    from datatrace.experiments import log_experiments_batch
+
+    def records():
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    count = log_experiments_batch(records(), batch_size=batch_size)
+    console.print(f"🧪 Imported {count} experiments", style="bold green")
+
+
 if __name__ == "__main__":
     app()
@@ -0,0 +1,150 @@
+"""
+Thin client for ``datatrace serve`` (see datatrace.server).
+
+While a server is listening on SOCKET_PATH, log_experiment, track_usage and
+log_dataset send their rows to it instead of opening SQLite; when there is
+no server they write directly as before. Set DATATRACE_SERVER=0 (or call
+disable()) to always write directly. A row is written directly only when
+it could not be sent; once the server has the request, a dropped
+connection or a missing answer raises ConnectionError instead, since the
+server may still commit it.
+"""
+import json
+import os
+import socket
+import threading
+import time
+
+from datatrace.db import BUSY_TIMEOUT
+from datatrace.utils import BASE_DIR
+
+SOCKET_PATH = BASE_DIR / "serve.sock"
+
+ENABLED = os.environ.get("DATATRACE_SERVER", "") != "0"
+
+# After a failed connect, write directly for this many seconds before retrying
+RETRY_AFTER = 1.0
+
+# A server that takes longer than this to answer is treated as dead; its
+# writes may wait BUSY_TIMEOUT for the database lock first
+TIMEOUT = BUSY_TIMEOUT + 30.0
+
+_local = threading.local()
+_unavailable_until = 0.0
+
+
+class ServerError(RuntimeError):
+    """The server received the request and reported an error."""
+
+
+class Client:
+    """
+    One connection to a tracking server: a Unix socket path, or a
+    (host, port) tuple for its TCP listener. ``token`` (default
+    DATATRACE_SERVER_TOKEN) is sent with each request over TCP.
+    """
+
+    def __init__(self, address=SOCKET_PATH, timeout: float = TIMEOUT, token: str = None):
+        self.token = None
+        if isinstance(address, tuple):
+            self.sock = socket.create_connection(address, timeout=timeout)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.token = token or os.environ.get("DATATRACE_SERVER_TOKEN") or None
+        else:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(timeout)
+            try:
+                self.sock.connect(str(address))
+            except OSError:
+                self.sock.close()
+                raise
+        self.reader = self.sock.makefile("rb")
+        self.pid = os.getpid()
+
+    def call(self, op: str, *args):
+        """Run ``op`` on the server and return its result."""
+        self.send(op, *args)
+        return self.receive()
+
+    def send(self, op: str, *args):
+        request = {"op": op, "args": args}
+        if self.token:
+            request["token"] = self.token
+        self.sock.sendall(json.dumps(request).encode() + b"\n")
+
+    def receive(self):
+        """The result of the oldest request sent and not yet received."""
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("tracking server closed the connection")
+        reply = json.loads(line)
+        if not reply["ok"]:
+            raise ServerError(reply["error"])
+        return reply["result"]
+
+    def close(self):
+        self.reader.close()
+        self.sock.close()
+
+
+def enable(enabled: bool = True):
+    """Use a running server for writes (the default) or always write directly."""
+    global ENABLED
+    ENABLED = enabled
+    if not enabled:
+        _drop()
+
+
+def disable():
+    enable(False)
+
+
+def try_call(op: str, *args):
+    """
+    Send ``op`` to the server if one is running. Returns (True, result), or
+    (False, None) when there is no server to take it. Raises ConnectionError
+    if the server took the request but gave no answer: it may have run it.
+    """
+    client = _client()
+    if client is None:
+        return False, None
+    try:
+        client.send(op, *args)
+    except OSError:
+        # a server that closed this connection never reads the request
+        _drop(back_off=True)
+        return False, None
+    try:
+        return True, client.receive()
+    except (OSError, ValueError) as e:
+        # OSError covers a dead or stuck server; ValueError a garbled reply
+        _drop(back_off=True)
+        raise ConnectionError(f"tracking server did not answer {op}; it may have run it") from e
+
+
+def _client():
+    """This thread's connection to the server, or None if there is none."""
+    global _unavailable_until
+    if not ENABLED:
+        return None
+    client = getattr(_local, "client", None)
+    if client is not None and client.pid == os.getpid():
+        return client
+    if time.monotonic() < _unavailable_until or not SOCKET_PATH.exists():
+        return None
+    try:
+        _local.client = Client(SOCKET_PATH, TIMEOUT)
+    except OSError:
+        _unavailable_until = time.monotonic() + RETRY_AFTER
+        return None
+    return _local.client
+
+
+def _drop(back_off: bool = False):
+    global _unavailable_until
+    client = getattr(_local, "client", None)
+    _local.client = None
+    if client is not None and client.pid == os.getpid():
+        client.close()
+    if back_off:
+        _unavailable_until = time.monotonic() + RETRY_AFTER
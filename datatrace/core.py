@@ -1,10 +1,15 @@
 import hashlib
+import stat
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 
-CHUNK_SIZE = 8192
+CHUNK_SIZE = 1024 * 1024
+# Files queued per worker; bounds memory and open futures on huge trees.
+IN_FLIGHT_PER_WORKER = 4
 
 
-def file_hash(path: Path) -> str:
+def _hash_bytes(path: Path) -> str:
     sha = hashlib.sha256()
     with open(path, "rb") as f:
         while chunk := f.read(CHUNK_SIZE):
@@ -12,16 +17,126 @@ def file_hash(path: Path) -> str:
     return sha.hexdigest()
 
 
-def dataset_hash(dataset_dir: Path) -> str:
-    sha = hashlib.sha256()
+def file_hash(path: Path, use_cache: bool = True, refresh: bool = False) -> str:
+    if not use_cache:
+        return _hash_bytes(path)
+
+    from datatrace.hashcache import HashCache
+
+    path = Path(path)
+    with HashCache(refresh=refresh) as cache:
+        return _cached_hash(cache, path, path.stat())
+
+
+def dataset_hash(
+    dataset_dir: Path,
+    use_cache: bool = True,
+    refresh: bool = False,
+    workers: int = 1,
+    executor: str = "thread",
+) -> str:
+    """
+    Hash a directory tree. With workers > 1 files are hashed on a thread or
+    process pool, but digests are still combined in sorted path order so the
+    result is identical to the sequential walk.
+    """
+    leaves = hash_tree(dataset_dir, use_cache, refresh, workers, executor)
+    return combine_leaves(leaves)
 
+
+def hash_tree(
+    dataset_dir: Path,
+    use_cache: bool = True,
+    refresh: bool = False,
+    workers: int = 1,
+    executor: str = "thread",
+):
+    """
+    Return (relative_path, digest, size) for every file under dataset_dir,
+    in sorted path order.
+    """
+    dataset_dir = Path(dataset_dir)
+    files = []
     for file in sorted(dataset_dir.rglob("*")):
-        if file.is_file():
-            sha.update(str(file.relative_to(dataset_dir)).encode())
-            sha.update(file_hash(file).encode())
+        try:
+            st = file.stat()
+        except FileNotFoundError:  # dangling symlink
+            continue
+        if stat.S_ISREG(st.st_mode):
+            files.append((file, st))
+
+    cache = None
+    if use_cache:
+        from datatrace.hashcache import HashCache
+        cache = HashCache(refresh=refresh)
+
+    try:
+        return [
+            (file.relative_to(dataset_dir), digest, st.st_size)
+            for (file, st), digest in zip(files, _hash_files(files, cache, workers, executor))
+        ]
+    finally:
+        if cache:
+            cache.close()
 
+
+def combine_leaves(leaves) -> str:
+    """Flat directory digest over (relative_path, digest, size) leaves."""
+    sha = hashlib.sha256()
+    for rel, digest, _ in leaves:
+        sha.update(str(rel).encode())
+        sha.update(digest.encode())
     return sha.hexdigest()
 
 
+def _hash_files(files, cache=None, workers: int = 1, executor: str = "thread"):
+    """Yield the digest of each (file, stat) pair, in the order given."""
+    if workers <= 1:
+        for file, st in files:
+            yield _cached_hash(cache, file, st) if cache else _hash_bytes(file)
+        return
+
+    if executor == "thread":
+        pool = ThreadPoolExecutor(max_workers=workers)
+    elif executor == "process":
+        # imported here: pulls in multiprocessing, which slows CLI start-up
+        from concurrent.futures import ProcessPoolExecutor
+        pool = ProcessPoolExecutor(max_workers=workers)
+    else:
+        raise ValueError(f"Unknown executor: {executor!r}")
+
+    pending = deque()
+    with pool:
+        for file, st in files:
+            digest = cache.lookup(file, st) if cache else None
+            if digest is None:
+                future = pool.submit(_hash_bytes, file)
+            else:
+                future = Future()
+                future.set_result(digest)
+                st = None  # cache hit, nothing new to store
+            pending.append((file, st, future))
+
+            if len(pending) >= workers * IN_FLIGHT_PER_WORKER:
+                yield _collect(cache, *pending.popleft())
+        while pending:
+            yield _collect(cache, *pending.popleft())
+
+
+def _collect(cache, file: Path, st, future) -> str:
+    digest = future.result()
+    if cache and st is not None:
+        cache.store(file, st, digest)
+    return digest
+
+
+def _cached_hash(cache, path: Path, st) -> str:
+    digest = cache.lookup(path, st)
+    if digest is None:
+        digest = _hash_bytes(path)
+        cache.store(path, st, digest)
+    return digest
+
+
 def version_id(hash_value: str) -> str:
     return hash_value[:8]
@@ -1,9 +1,11 @@
 import hashlib
-import sqlite3
 import uuid
 from pathlib import Path
 
-from datatrace.utils import ensure_storage, now
+from datatrace import client, eventlog
+from datatrace.db import PAGE_SIZE, connect, iter_keyset, transaction
+from datatrace.querycache import cached_query
+from datatrace.utils import now
 
 
 def hash_file(path: Path):
@@ -14,82 +16,92 @@ def hash_file(path: Path):
     return h.hexdigest()
 
 
-def log_dataset(path: str, rows: int, columns: int):
+def log_dataset(path: str, rows: int, columns: int, file_hash: str = None):
     """
-    Register a dataset and return dataset_id
+    Register a dataset and return dataset_id.
+    Pass file_hash when it is already known to avoid re-reading the file.
     """
     path = Path(path)
-    file_hash = hash_file(path)
+    if file_hash is None:
+        file_hash = hash_file(path)
 
-    db_path = ensure_storage()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+    record = (str(uuid.uuid4()), str(path), file_hash, rows, columns, now())
+    if not eventlog.ENABLED:
+        sent, dataset_id = client.try_call("log_dataset", *record)
+        if sent:
+            return dataset_id
 
     # check if dataset already exists
-    cursor.execute(
+    row = connect().execute(
         "SELECT id FROM datasets WHERE hash = ?",
         (file_hash,)
-    )
-    row = cursor.fetchone()
+    ).fetchone()
 
     if row:
-        conn.close()
         return row[0]
 
-    dataset_id = str(uuid.uuid4())
-
-    cursor.execute(
-        """
-        INSERT INTO datasets (id, path, hash, rows, columns, timestamp)
-        VALUES (?, ?, ?, ?, ?, ?)
-        """,
-        (
-            dataset_id,
-            str(path),
-            file_hash,
-            rows,
-            columns,
-            now(),
-        )
-    )
-
-    conn.commit()
-    conn.close()
+    row = record
+    if eventlog.ENABLED:
+        eventlog.append("dataset", *row)
+        return row[0]
 
-    return dataset_id
+    with transaction() as conn:
+        # another writer may have registered it since the check above
+        _insert_datasets(conn, [row])
+        return conn.execute(
+            "SELECT id FROM datasets WHERE hash = ?",
+            (file_hash,)
+        ).fetchone()[0]
 
 
 # THIS FUNCTION WAS MISSING – ADDING IT NOW
-def list_datasets():
+def list_datasets(limit: int = None, after: tuple = None):
     """
     List all versioned datasets from the database.
     Returns list of dictionaries.
     """
-    db_path = ensure_storage()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
     try:
-        cursor.execute("""
-            SELECT id, path, hash, rows, columns, timestamp
-            FROM datasets
-            ORDER BY timestamp DESC
-        """)
-        rows = cursor.fetchall()
-
-        result = []
-        for row in rows:
-            result.append({
-                "id": row[0],
-                "path": row[1],
-                "hash": row[2],
-                "rows": row[3],
-                "columns": row[4],
-                "timestamp": row[5]
-            })
-        return result
+        return cached_query(iter_datasets, limit=limit, after=after)
     except Exception as e:
         print(f"Error listing datasets: {e}")
         return []
-    finally:
-        conn.close()
+
+
+def iter_datasets(limit: int = None, after: tuple = None, page_size: int = PAGE_SIZE):
+    """
+    Yield datasets newest first, one page per query, including any still in
+    the event log. Resume a listing with after=(row["timestamp"], row["id"])
+    of the last row seen.
+    """
+    rows = iter_keyset(
+        "SELECT id, path, hash, rows, columns, timestamp FROM datasets WHERE 1",
+        after=after, limit=limit, page_size=page_size,
+    )
+    yield from eventlog.union_tail("dataset", map(_dataset_dict, rows), _dataset_dict,
+                                   after=after, limit=limit)
+
+
+def _dataset_dict(row):
+    return {
+        "id": row[0],
+        "path": row[1],
+        "hash": row[2],
+        "rows": row[3],
+        "columns": row[4],
+        "timestamp": row[5]
+    }
+
+
+def _insert_datasets(conn, rows):
+    """
+    Insert (id, path, hash, rows, columns, timestamp) rows, skipping hashes
+    already registered; the caller owns the transaction.
+    """
+    conn.executemany(
+        """
+        INSERT INTO datasets (id, path, hash, rows, columns, timestamp)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (hash) DO NOTHING
+        """,
+        rows
+    )
@@ -0,0 +1,210 @@
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, SQLite locking only
+    fcntl = None
+
+from datatrace.migrations import migrate
+from datatrace.utils import META_DB
+
+# Seconds sqlite3 waits on a locked database before raising
+BUSY_TIMEOUT = 30.0
+
+# transaction(): SQLite's own busy wait per BEGIN IMMEDIATE attempt, then a
+# jittered exponential backoff between attempts, until BUSY_TIMEOUT is spent
+BEGIN_SPIN_MS = 100
+BACKOFF_BASE = 0.002
+BACKOFF_MAX = 0.1
+
+# Serialize writers through an flock on "<db>.lock" (see transaction())
+WRITE_LOCK = os.environ.get("DATATRACE_WRITE_LOCK", "") not in ("", "0")
+
+# Rows fetched per query by iter_keyset
+PAGE_SIZE = 500
+
+PRAGMAS = {
+    # only takes effect on a new database (tracking.compact_usage converts
+    # older ones); lets deletes hand pages back with PRAGMA incremental_vacuum
+    "auto_vacuum": "INCREMENTAL",
+    "journal_mode": "WAL",        # readers never block the writer
+    "synchronous": "NORMAL",      # fsync at checkpoints only; safe with WAL
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,     # negative = KiB, i.e. 64 MiB
+    "temp_store": "MEMORY",
+    "busy_timeout": int(BUSY_TIMEOUT * 1000),
+}
+
+_local = threading.local()
+_migrate_lock = threading.Lock()
+_migrated = set()
+_write_locks = {}  # db path -> (pid, lock file fd, threading.Lock)
+_write_locks_guard = threading.Lock()
+
+
+def connect(db_path: Path = None) -> sqlite3.Connection:
+    """
+    Return this thread's connection to the metadata DB.
+
+    Connections are opened once per (thread, database) with the PRAGMAS above,
+    and migrations run once per database per process, so callers can
+    fetch a connection on every call for the price of a dict lookup. Write
+    through ``with transaction() as conn:``; never close the returned
+    connection.
+    """
+    path = Path(db_path or META_DB).resolve()
+    conns = getattr(_local, "conns", None)
+    if conns is None or _local.pid != os.getpid():
+        # first use in this thread, or inherited across fork(): start fresh
+        conns = _local.conns = {}
+        _local.pid = os.getpid()
+
+    conn = conns.get(path)
+    if conn is None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+        for name, value in PRAGMAS.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        _ensure_migrated(conn, path)
+        conns[path] = conn
+    return conn
+
+
+@contextmanager
+def transaction(db_path: Path = None):
+    """
+    Write transaction that is safe with many processes on one database.
+
+    Takes the write lock up front with BEGIN IMMEDIATE, so the transaction
+    can never fail half way with "database is locked", retrying BEGIN and
+    COMMIT with jittered exponential backoff for up to BUSY_TIMEOUT seconds.
+    With WRITE_LOCK (or DATATRACE_WRITE_LOCK=1) writers first queue on an
+    flock, which keeps the tail latency low with dozens of writers. Rolls
+    back if the body raises; nested uses join the outer transaction.
+    """
+    conn = connect(db_path)
+    if conn.in_transaction:
+        yield conn
+        return
+    path = Path(db_path or META_DB).resolve()
+    with _write_lock(path):
+        _retry_busy(conn, "BEGIN IMMEDIATE", spin=True)
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        try:
+            _retry_busy(conn, "COMMIT")
+        except BaseException:
+            conn.rollback()
+            raise
+
+
+def set_write_lock(enabled: bool = True):
+    """Turn the cross-process write lock of transaction() on or off."""
+    global WRITE_LOCK
+    WRITE_LOCK = enabled
+
+
+def _retry_busy(conn: sqlite3.Connection, statement: str, spin: bool = False):
+    deadline = time.monotonic() + BUSY_TIMEOUT
+    delay = BACKOFF_BASE
+    if spin:
+        conn.execute(f"PRAGMA busy_timeout = {BEGIN_SPIN_MS}")
+    try:
+        while True:
+            try:
+                conn.execute(statement)
+                return
+            except sqlite3.OperationalError as e:
+                if not _is_busy(e) or time.monotonic() >= deadline:
+                    raise
+            time.sleep(random.uniform(0, delay))
+            delay = min(delay * 2, BACKOFF_MAX)
+    finally:
+        if spin:
+            conn.execute(f"PRAGMA busy_timeout = {PRAGMAS['busy_timeout']}")
+
+
+def _is_busy(e: sqlite3.OperationalError) -> bool:
+    code = getattr(e, "sqlite_errorcode", None)
+    if code is not None:
+        return code & 0xFF in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    return "locked" in str(e) or "busy" in str(e)
+
+
+@contextmanager
+def _write_lock(path: Path):
+    if not WRITE_LOCK or fcntl is None:
+        yield
+        return
+    entry = _write_locks.get(path)
+    if entry is None or entry[0] != os.getpid():
+        with _write_locks_guard:
+            entry = _write_locks.get(path)
+            if entry is None or entry[0] != os.getpid():
+                # after fork the parent's fd would share its flock; reopen
+                fd = os.open(f"{path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+                entry = _write_locks[path] = (os.getpid(), fd, threading.Lock())
+    _, fd, thread_lock = entry
+    # flock excludes other processes; threads of this one share the fd
+    with thread_lock:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+def close_all():
+    """Close the calling thread's connections."""
+    for conn in getattr(_local, "conns", {}).values():
+        conn.close()
+    _local.conns = {}
+    _local.pid = os.getpid()
+
+
+def _ensure_migrated(conn: sqlite3.Connection, path: Path):
+    with _migrate_lock:
+        if path not in _migrated:
+            migrate(conn)
+            _migrated.add(path)
+
+
+def iter_keyset(sql: str, params=(), after=None, limit: int = None,
+                page_size: int = PAGE_SIZE, key=("timestamp", "id")):
+    """
+    Yield the rows of a newest-first listing one page per query.
+
+    ``sql`` is a SELECT ending in a WHERE clause (use ``WHERE 1`` for none)
+    whose last selected columns are the ``key`` columns. Pages continue from
+    the key of the previous page's last row (keyset pagination), so every
+    page is an index seek no matter how deep, and no read transaction stays
+    open between pages. ``after`` is a key tuple from an earlier listing;
+    ``limit`` caps the number of rows yielded.
+    """
+    conn = connect()
+    columns = ", ".join(key)
+    order = ", ".join(f"{c} DESC" for c in key)
+    first = f"{sql} ORDER BY {order} LIMIT ?"
+    rest = f"{sql} AND ({columns}) < ({', '.join('?' * len(key))}) ORDER BY {order} LIMIT ?"
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = page_size if remaining is None else min(page_size, remaining)
+        if after is None:
+            rows = conn.execute(first, (*params, size)).fetchall()
+        else:
+            rows = conn.execute(rest, (*params, *after, size)).fetchall()
+        yield from rows
+        if len(rows) < size:
+            return
+        after = rows[-1][-len(key):]
+        if remaining is not None:
+            remaining -= len(rows)
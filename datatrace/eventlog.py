@@ -0,0 +1,280 @@
+"""
+Optional append-only event log in front of meta.db.
+
+With the log enabled (DATATRACE_EVENT_LOG=1 or enable()), log_experiment,
+track_usage and log_dataset append one record to a segment file owned by
+the calling process instead of opening a write transaction: a single
+O_APPEND write, no locks shared with other processes. compact() merges the
+segments into meta.db in large transactions, remembering how far it got in
+each segment, so every record is applied exactly once even if it runs
+concurrently with writers or is interrupted.
+
+Segment files are events/<pid>-<random>.seg, a sequence of records
+``<u32 length><u32 crc32><JSON payload>``. A partially written record at the
+end of a live segment is simply not read yet. A writer ends its segment
+with a "seal" record when it rotates to a new one or exits; compact()
+deletes a segment once it has merged everything up to the seal, or all
+complete records once the owning process is gone; a record it was killed
+in the middle of writing is then discarded.
+
+Readers (iter_experiments, iter_usage_records, iter_datasets) union the
+unmerged tail with the database; aggregates such as the metrics table, the
+leaderboard and usage rollups see events once they are compacted.
+"""
+import atexit
+import heapq
+import json
+import logging
+import os
+import struct
+import threading
+import uuid
+import zlib
+from itertools import islice
+
+from datatrace.utils import BASE_DIR
+
+logger = logging.getLogger(__name__)
+
+EVENTS_DIR = BASE_DIR / "events"
+
+# Start a new segment past this size
+SEGMENT_BYTES = 64 * 1024 * 1024
+
+# Records merged per transaction by compact()
+COMPACT_BATCH = 50_000
+
+ENABLED = os.environ.get("DATATRACE_EVENT_LOG", "") not in ("", "0")
+
+HEADER = struct.Struct("<II")
+SUFFIX = ".seg"
+
+_segment = None  # [pid, fd, size] of this process's open segment
+_lock = threading.Lock()
+_atexit_registered = False
+
+
+def enable(enabled: bool = True):
+    """Route log_experiment, track_usage and log_dataset through the event log."""
+    global ENABLED
+    ENABLED = enabled
+
+
+def append(kind: str, *fields):
+    """Append one record to this process's segment."""
+    payload = json.dumps([kind, *fields], separators=(",", ":")).encode()
+    record = HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+    # the lock only orders this process's threads around rotation
+    with _lock:
+        fd, size = _open_segment()
+        os.write(fd, record)
+        size += len(record)
+        if size >= SEGMENT_BYTES:
+            _seal()
+        else:
+            _segment[2] = size
+
+
+def seal():
+    """End this process's current segment; the next append starts a new one."""
+    with _lock:
+        _seal()
+
+
+def compact(batch: int = COMPACT_BATCH) -> int:
+    """
+    Merge every complete record of every segment into meta.db. Returns the
+    number of records merged.
+    """
+    from datatrace.db import transaction
+
+    merged = 0
+    known = _offsets()
+    for path in _segment_paths():
+        try:
+            merged += _compact_segment(path, batch)
+        except FileNotFoundError:
+            continue  # another compactor finished it
+
+    # forget segments whose files are gone
+    live = {p.name for p in _segment_paths()}
+    stale = [(name,) for name in known if name not in live]
+    if stale:
+        with transaction() as conn:
+            conn.executemany("DELETE FROM event_segments WHERE name = ?", stale)
+    return merged
+
+
+def _compact_segment(path, batch) -> int:
+    from datatrace.db import transaction
+
+    name, merged = path.name, 0
+    # checked before reading: a live owner may still finish its last record
+    owner_gone = _owner_gone(name)
+    while True:
+        # read the offset inside the write transaction, so concurrent
+        # compactors never merge the same records twice
+        with transaction() as conn:
+            row = conn.execute(
+                "SELECT position, sealed FROM event_segments WHERE name = ?", (name,)
+            ).fetchone()
+            end, sealed = row or (0, False)
+            if sealed:
+                break
+            records, end, sealed = _read(path, end, batch)
+            if records or sealed:
+                apply_records(conn, records)
+                conn.execute(
+                    "INSERT OR REPLACE INTO event_segments (name, position, sealed) VALUES (?, ?, ?)",
+                    (name, end, sealed),
+                )
+                merged += len(records)
+        if sealed or len(records) < batch:
+            break
+    if sealed or owner_gone:
+        size = path.stat().st_size
+        if not sealed and end < size:
+            logger.warning("discarding %d bytes its writer left unfinished at the end of %s",
+                           size - end, name)
+        path.unlink(missing_ok=True)
+    return merged
+
+
+def pending(kind: str):
+    """Unmerged records of ``kind``, as lists of their fields, oldest segment first."""
+    if not EVENTS_DIR.exists():
+        return []
+    offsets = _offsets()
+    found = []
+    for path in _segment_paths():
+        offset, sealed = offsets.get(path.name, (0, False))
+        if sealed:
+            continue
+        try:
+            records, _, _ = _read(path, offset)
+        except FileNotFoundError:
+            continue  # compacted meanwhile
+        found.extend(fields for k, *fields in records if k == kind)
+    return found
+
+
+def union_tail(kind: str, rows, make, after=None, limit=None, match=None):
+    """
+    Merge the unmerged ``kind`` events into ``rows`` (dicts newest first from
+    the database). ``make`` turns a record's fields into a dict with a
+    timestamp (its id is None until compaction assigns one), ``match``
+    filters records, and after/limit mirror the keyset listing.
+    """
+    tail = [make(fields) for fields in pending(kind) if match is None or match(fields)]
+    if after is not None:
+        tail = [t for t in tail if t["timestamp"] < after[0]]
+    if not tail:
+        return rows
+    tail.sort(key=lambda t: t["timestamp"], reverse=True)
+    merged = heapq.merge(tail, rows, key=lambda r: r["timestamp"], reverse=True)
+    return merged if limit is None else islice(merged, limit)
+
+
+def apply_records(conn, records):
+    """
+    Write [kind, *fields] records (experiment, usage or dataset, as appended
+    by log_experiment, track_usage and log_dataset); the caller owns the
+    transaction.
+    """
+    from datatrace.datasets import _insert_datasets
+    from datatrace.experiments import _insert_experiments
+    from datatrace.tracking import _insert_usage
+
+    by_kind = {"experiment": [], "usage": [], "dataset": []}
+    for kind, *fields in records:
+        if kind in by_kind:
+            by_kind[kind].append(tuple(fields))
+        else:
+            logger.warning("skipping unknown event kind %r", kind)
+    if by_kind["experiment"]:
+        _insert_experiments(conn, by_kind["experiment"])
+    if by_kind["usage"]:
+        _insert_usage(conn, by_kind["usage"])
+    if by_kind["dataset"]:
+        _insert_datasets(conn, by_kind["dataset"])
+
+
+def _open_segment():
+    global _segment, _atexit_registered
+    if _segment is None or _segment[0] != os.getpid():
+        # first append, after a seal, or in a forked child
+        EVENTS_DIR.mkdir(parents=True, exist_ok=True)
+        path = EVENTS_DIR / f"{os.getpid()}-{uuid.uuid4().hex[:12]}{SUFFIX}"
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT | os.O_EXCL, 0o644)
+        _segment = [os.getpid(), fd, 0]
+        if not _atexit_registered:
+            atexit.register(seal)
+            _atexit_registered = True
+    return _segment[1], _segment[2]
+
+
+def _seal():
+    global _segment
+    if _segment is None or _segment[0] != os.getpid():
+        return
+    fd = _segment[1]
+    _segment = None
+    payload = b'["seal"]'
+    os.write(fd, HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+    os.close(fd)
+
+
+def _read(path, offset, limit=None):
+    """Decode complete records after ``offset``: (records, end offset, sealed)."""
+    records, sealed = [], False
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read()
+    pos = 0
+    while limit is None or len(records) < limit:
+        if pos + HEADER.size > len(data):
+            break
+        length, crc = HEADER.unpack_from(data, pos)
+        payload = data[pos + HEADER.size:pos + HEADER.size + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            break  # still being written
+        pos += HEADER.size + length
+        record = json.loads(payload)
+        if record[0] == "seal":
+            sealed = True
+            break
+        records.append(record)
+    return records, offset + pos, sealed
+
+
+def _offsets():
+    from datatrace.db import connect
+
+    return {
+        name: (position, bool(sealed))
+        for name, position, sealed in connect().execute(
+            "SELECT name, position, sealed FROM event_segments"
+        )
+    }
+
+
+def _segment_paths():
+    if not EVENTS_DIR.exists():
+        return []
+    return sorted(EVENTS_DIR.glob(f"*{SUFFIX}"))
+
+
+def _owner_gone(name: str) -> bool:
+    try:
+        pid = int(name.split("-", 1)[0])
+    except ValueError:
+        return True
+    if pid == os.getpid():
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        return False
+    return False
@@ -3,30 +3,24 @@
 
 import sqlite3
 import json
-from datatrace.utils import ensure_storage, now
+from itertools import islice
+from datatrace import client, eventlog
+from datatrace.db import PAGE_SIZE, connect, iter_keyset, transaction
+from datatrace.leaderboard import update_leaderboard
+from datatrace.metrics import insert_metrics, metric_rows
+from datatrace.querycache import cached_query
+from datatrace.utils import now
+
+# Rows per executemany call in log_experiments_batch
+BATCH_SIZE = 1000
 
 
 def init_experiments_table():
     """
     Create the experiments table if it doesn't exist.
+    The schema is owned by datatrace.migrations; opening the DB applies it.
     """
-    db_path = ensure_storage()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS experiments (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            dataset_hash TEXT NOT NULL,
-            params TEXT,               -- JSON string of parameters
-            metrics TEXT,              -- JSON string of metrics
-            timestamp TEXT NOT NULL
-        )
-    """)
-
-    conn.commit()
-    conn.close()
+    connect()
 
 
 def log_experiment(name: str, dataset_hash: str, params: dict, metrics: dict):
@@ -34,55 +28,108 @@ def log_experiment(name: str, dataset_hash: str, params: dict, metrics: dict):
     Log an experiment with parameters and metrics.
     Params and metrics are stored as JSON strings.
     """
-    db_path = ensure_storage()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+    record = (name, dataset_hash, params, metrics, now())
+    if eventlog.ENABLED:
+        eventlog.append("experiment", *record)
+        return
+    sent, _ = client.try_call("log_experiment", *record)
+    if sent:
+        return
+    with transaction() as conn:
+        _insert_experiments(conn, [record])
 
-    # Initialize table if not exists
-    init_experiments_table()
 
-    params_json = json.dumps(params) if params else '{}'
-    metrics_json = json.dumps(metrics) if metrics else '{}'
+def log_experiments_batch(records, batch_size: int = BATCH_SIZE) -> int:
+    """
+    Log many experiments in a single transaction.
 
-    cursor.execute("""
+    ``records`` is any iterable of dicts with name, dataset_hash and optional
+    params, metrics and timestamp keys. It is consumed in chunks of
+    ``batch_size`` rows, so generators over large files stream through in
+    bounded memory. Nothing is written if any record fails.
+    Returns the number of experiments logged.
+    """
+    records = iter(records)
+    count = 0
+    with transaction() as conn:
+        while chunk := list(islice(records, batch_size)):
+            _insert_experiments(conn, [
+                (r["name"], r["dataset_hash"], r.get("params"), r.get("metrics"), r.get("timestamp"))
+                for r in chunk
+            ])
+            count += len(chunk)
+    return count
+
+
+def _insert_experiments(conn, records):
+    """
+    Insert (name, dataset_hash, params, metrics, timestamp) records and their
+    normalized metrics; the caller owns the transaction. Returns the new
+    experiment ids.
+    """
+    conn.executemany("""
         INSERT INTO experiments (name, dataset_hash, params, metrics, timestamp)
         VALUES (?, ?, ?, ?, ?)
-    """, (name, dataset_hash, params_json, metrics_json, now()))
+    """, [
+        (name, dataset_hash, json.dumps(params) if params else '{}',
+         json.dumps(metrics) if metrics else '{}', timestamp or now())
+        for name, dataset_hash, params, metrics, timestamp in records
+    ])
+    # Inside one write transaction AUTOINCREMENT ids are consecutive
+    last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+    ids = range(last_id - len(records) + 1, last_id + 1)
+    rows = [
+        row for experiment_id, record in zip(ids, records)
+        for row in metric_rows(experiment_id, record[3])
+    ]
+    insert_metrics(conn, rows)
+    datasets = {experiment_id: record[1] for experiment_id, record in zip(ids, records)}
+    update_leaderboard(conn, [
+        (key, datasets[experiment_id], experiment_id, value)
+        for experiment_id, key, step, value in rows
+    ])
+    return ids
 
-    conn.commit()
-    conn.close()
 
-
-def get_experiments():
+def get_experiments(limit: int = None, after: tuple = None):
     """
     Retrieve all logged experiments.
     Returns list of dicts with parsed JSON params/metrics.
     """
-    db_path = ensure_storage()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
     try:
-        cursor.execute("""
-            SELECT id, name, dataset_hash, params, metrics, timestamp
-            FROM experiments
-            ORDER BY timestamp DESC
-        """)
-        rows = cursor.fetchall()
-
-        experiments = []
-        for row in rows:
-            experiments.append({
-                "id": row[0],
-                "name": row[1],
-                "dataset_hash": row[2],
-                "params": json.loads(row[3]) if row[3] else {},
-                "metrics": json.loads(row[4]) if row[4] else {},
-                "timestamp": row[5]
-            })
-        return experiments
+        return cached_query(iter_experiments, limit=limit, after=after)
     except sqlite3.Error as e:
         print(f"Database error in get_experiments: {e}")
         return []
-    finally:
-        conn.close()
+
+
+def iter_experiments(limit: int = None, after: tuple = None, page_size: int = PAGE_SIZE):
+    """
+    Yield experiments newest first, one page per query, including any still
+    in the event log (with id None until compacted). Resume a listing with
+    after=(row["timestamp"], row["id"]) of the last row seen.
+    """
+    rows = iter_keyset(
+        "SELECT name, dataset_hash, params, metrics, timestamp, id FROM experiments WHERE 1",
+        after=after, limit=limit, page_size=page_size,
+    )
+    yield from eventlog.union_tail(
+        "experiment", map(experiment_dict, rows),
+        lambda fields: {
+            "id": None, "name": fields[0], "dataset_hash": fields[1],
+            "params": fields[2] or {}, "metrics": fields[3] or {}, "timestamp": fields[4],
+        },
+        after=after, limit=limit,
+    )
+
+
+def experiment_dict(row):
+    """Dict for a (name, dataset_hash, params, metrics, timestamp, id) row."""
+    return {
+        "id": row[5],
+        "name": row[0],
+        "dataset_hash": row[1],
+        "params": json.loads(row[2]) if row[2] else {},
+        "metrics": json.loads(row[3]) if row[3] else {},
+        "timestamp": row[4]
+    }
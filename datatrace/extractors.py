@@ -0,0 +1,123 @@
+import ast
+import json
+import logging
+import math
+import struct
+from pathlib import Path
+
+from datatrace.stats import CHUNK_SIZE, MAX_HEADER, csv_stats
+
+logger = logging.getLogger(__name__)
+
+# suffix -> function(path) returning (rows, columns)
+EXTRACTORS = {}
+
+
+def register_extractor(*suffixes):
+    """Register a (rows, columns) extractor for one or more file suffixes."""
+    def decorator(func):
+        for suffix in suffixes:
+            EXTRACTORS[suffix.lower()] = func
+        return func
+    return decorator
+
+
+def has_extractor(path: Path) -> bool:
+    return Path(path).suffix.lower() in EXTRACTORS
+
+
+def extract_stats(path: Path):
+    """
+    Return (rows, columns) for a file, reading only what its format needs.
+    Unknown formats, formats whose optional reader is not installed, and
+    files that turn out not to be in the format their suffix claims give
+    (0, 0).
+    """
+    path = Path(path)
+    func = EXTRACTORS.get(path.suffix.lower())
+    if func is None:
+        return 0, 0
+    try:
+        return func(path)
+    except ImportError as e:
+        logger.info("no reader for %s: %s", path.suffix, e)
+        return 0, 0
+    except Exception as e:
+        if not isinstance(e, _read_errors()):
+            raise
+        logger.warning("could not read stats from %s: %s", path, e)
+        return 0, 0
+
+
+def _read_errors():
+    """Exceptions that mean a corrupt or mislabelled file."""
+    errors = (ValueError, OSError, SyntaxError, KeyError, struct.error)
+    try:
+        import pyarrow
+    except ImportError:
+        return errors
+    return errors + (pyarrow.ArrowException,)
+
+
+@register_extractor(".csv")
+def _csv(path: Path):
+    return csv_stats(path)
+
+
+@register_extractor(".parquet", ".pq")
+def _parquet(path: Path):
+    # Only the footer (row group metadata and schema) is read
+    import pyarrow.parquet as pq
+
+    meta = pq.ParquetFile(path).metadata
+    return meta.num_rows, meta.num_columns
+
+
+@register_extractor(".arrow", ".feather", ".ipc")
+def _arrow_ipc(path: Path):
+    # Memory-mapped: batch lengths come from message metadata, bodies stay on disk
+    import pyarrow as pa
+
+    with pa.memory_map(str(path)) as source:
+        reader = pa.ipc.open_file(source)
+        rows = sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+        return rows, len(reader.schema)
+
+
+@register_extractor(".npy")
+def _npy(path: Path):
+    with open(path, "rb") as f:
+        magic = f.read(8)
+        if magic[:6] != b"\x93NUMPY":
+            raise ValueError(f"{path} is not a .npy file")
+        if magic[6] == 1:
+            (header_len,) = struct.unpack("<H", f.read(2))
+        else:
+            (header_len,) = struct.unpack("<I", f.read(4))
+        header = ast.literal_eval(f.read(header_len).decode("latin1"))
+
+    shape = header["shape"]
+    if not shape:
+        return 1, 1
+    return shape[0], math.prod(shape[1:])
+
+
+@register_extractor(".jsonl", ".ndjson")
+def _jsonl(path: Path):
+    rows = 0
+    last = b""
+    with open(path, "rb") as f:
+        first_line = f.readline(MAX_HEADER)
+        f.seek(0)
+        while chunk := f.read(CHUNK_SIZE):
+            rows += chunk.count(b"\n")
+            last = chunk[-1:]
+    if last not in (b"\n", b""):
+        rows += 1
+
+    try:
+        record = json.loads(first_line)
+    except ValueError:
+        record = None
+    columns = len(record) if isinstance(record, dict) else 0
+    return rows, columns
@@ -0,0 +1,84 @@
+import errno
+import os
+import shutil
+import sys
+from pathlib import Path
+
+FICLONE = 0x40049409  # _IOW(0x94, 9, int) from linux/fs.h
+
+# Errors meaning "this method is not available here", as opposed to real I/O
+# failures, which are raised.
+_UNSUPPORTED = {
+    errno.EOPNOTSUPP, errno.ENOTSUP, errno.EXDEV, errno.EINVAL,
+    errno.ENOSYS, errno.ENOTTY, errno.EBADF, errno.EPERM,
+}
+
+
+def clone_file(src: Path, dst: Path, allow_hardlink: bool = False) -> str:
+    """
+    Materialize ``src`` at ``dst`` (which must not exist) as cheaply as the
+    filesystem allows. Tries, in order:
+
+    - "reflink": copy-on-write clone via the FICLONE ioctl (btrfs, XFS)
+    - "hardlink": only with allow_hardlink, i.e. when neither side is ever
+      modified in place
+    - "copy_file_range": in-kernel copy, no userspace round trip
+    - "copy": plain shutil.copyfile
+
+    Returns the name of the method that worked.
+    """
+    src, dst = Path(src), Path(dst)
+    for name, method in _METHODS:
+        if name == "hardlink" and not allow_hardlink:
+            continue
+        try:
+            if method(src, dst):
+                return name
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED:
+                raise
+        _discard(dst)
+    shutil.copyfile(src, dst)
+    return "copy"
+
+
+def _reflink(src: Path, dst: Path) -> bool:
+    if not sys.platform.startswith("linux"):
+        return False
+    import fcntl
+
+    with open(src, "rb") as fin, open(dst, "xb") as fout:
+        fcntl.ioctl(fout.fileno(), FICLONE, fin.fileno())
+    return True
+
+
+def _copy_file_range(src: Path, dst: Path) -> bool:
+    if not hasattr(os, "copy_file_range"):
+        return False
+    with open(src, "rb") as fin, open(dst, "xb") as fout:
+        remaining = os.fstat(fin.fileno()).st_size
+        while remaining > 0:
+            n = os.copy_file_range(fin.fileno(), fout.fileno(), remaining)
+            if n == 0:
+                break
+            remaining -= n
+    return remaining <= 0
+
+
+def _hardlink(src: Path, dst: Path) -> bool:
+    os.link(src, dst)
+    return True
+
+
+def _discard(path: Path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+_METHODS = [
+    ("reflink", _reflink),
+    ("hardlink", _hardlink),  # before copy_file_range, which always works on Linux
+    ("copy_file_range", _copy_file_range),
+]
@@ -0,0 +1,68 @@
+import time
+from pathlib import Path
+
+from datatrace.db import connect, transaction
+
+# Files modified this recently may still change within the same mtime tick,
+# so their digests are not cached (the "racily clean" problem).
+RACY_WINDOW_NS = 2_000_000_000
+
+
+class HashCache:
+    """
+    Stat-keyed cache of file digests stored in meta.db.
+
+    A cached digest is reused only when size, mtime_ns, inode and device all
+    match the current stat of the file. With refresh=True every lookup misses
+    and fresh digests overwrite the stored ones.
+    """
+
+    def __init__(self, refresh: bool = False):
+        self.refresh = refresh
+        self.conn = connect()
+        self.pending = []
+
+    def lookup(self, path: Path, st=None):
+        if self.refresh:
+            return None
+        st = st or Path(path).stat()
+        row = self.conn.execute(
+            """
+            SELECT hash FROM hash_cache
+            WHERE path = ? AND size = ? AND mtime_ns = ? AND inode = ? AND device = ?
+            """,
+            (_key(path), st.st_size, st.st_mtime_ns, st.st_ino, st.st_dev),
+        ).fetchone()
+        return row[0] if row else None
+
+    def store(self, path: Path, st, digest: str):
+        if time.time_ns() - st.st_mtime_ns < RACY_WINDOW_NS:
+            return
+        self.pending.append(
+            (_key(path), st.st_size, st.st_mtime_ns, st.st_ino, st.st_dev, digest)
+        )
+
+    def flush(self):
+        if self.pending:
+            with transaction() as conn:
+                conn.executemany(
+                    """
+                    INSERT OR REPLACE INTO hash_cache (path, size, mtime_ns, inode, device, hash)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    """,
+                    self.pending,
+                )
+            self.pending = []
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _key(path: Path) -> str:
+    return str(Path(path).resolve())
@@ -0,0 +1,218 @@
+"""
+Client for the tracking server's HTTP API (``datatrace serve --http-port``),
+for workers that log to a server on another host.
+
+    client = HTTPClient("http://tracker:8765")
+    for step, loss in enumerate(losses):
+        client.log_metric(run, "loss", loss, step)
+    client.log_experiment("resnet", dataset_hash, params, metrics)
+    client.close()
+
+Connections are HTTP/1.1 keep-alive and pooled. Logging calls return a
+Future at once; calls made within ``linger`` seconds of each other are sent
+together as one POST /v1/batch, in order, gzip-compressed when large.
+Requests that fail on a dropped connection, a timeout or a 5xx status are
+retried with backoff. A batch whose response was lost is sent again, so a
+write may then be stored twice.
+
+If the server was started with DATATRACE_SERVER_TOKEN, pass the same token
+(or set the variable here too); it is sent as a Bearer header.
+"""
+import gzip
+import http.client
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from urllib.parse import urlsplit
+
+from datatrace.client import ServerError
+from datatrace.utils import now
+
+# Connections kept open for reuse
+POOL_SIZE = 8
+
+# How long the first queued call waits for others to join its batch
+LINGER = 0.005
+
+# Most calls sent in one POST
+MAX_BATCH = 1000
+
+# Gzip request bodies at least this large
+COMPRESS_MIN = 4096
+
+RETRIES = 3
+BACKOFF_BASE = 0.05
+
+
+class HTTPClient:
+    def __init__(self, url: str = "http://127.0.0.1:8765", pool_size: int = POOL_SIZE,
+                 linger: float = LINGER, max_batch: int = MAX_BATCH,
+                 compress_min: int = COMPRESS_MIN, retries: int = RETRIES, timeout: float = 30.0,
+                 token: str = None):
+        parts = urlsplit(url)
+        if parts.scheme != "http" or not parts.hostname:
+            raise ValueError(f"expected an http://host:port URL, got {url!r}")
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.linger = linger
+        self.max_batch = max_batch
+        self.compress_min = compress_min
+        self.retries = retries
+        self.timeout = timeout
+        self.token = token or os.environ.get("DATATRACE_SERVER_TOKEN") or None
+        self.requests = 0  # HTTP requests sent, including retries
+        self._pool = queue.LifoQueue(pool_size)
+        self._pending = []  # (op, args, future) waiting to be sent
+        self._outstanding = set()  # futures queued or in flight
+        self._cond = threading.Condition()
+        self._closed = False
+        self._sender = threading.Thread(target=self._send_loop, daemon=True,
+                                        name="datatrace-http-sender")
+        self._sender.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def log_experiment(self, name: str, dataset_hash: str, params: dict, metrics: dict) -> Future:
+        return self.submit("log_experiment", name, dataset_hash, params, metrics, now())
+
+    def track_usage(self, dataset_hash: str, action: str) -> Future:
+        return self.submit("track_usage", dataset_hash, action, now())
+
+    def log_metric(self, run, key: str, value: float, step: int = None) -> Future:
+        return self.submit("log_metric", run, key, value, step)
+
+    def load_metric(self, run, key: str) -> tuple:
+        """(steps, values) of a metric curve, as lists."""
+        return tuple(self.call("load_metric", run, key))
+
+    def submit(self, op: str, *args) -> Future:
+        """Queue ``op`` for the next batch; the Future resolves to its result."""
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("HTTPClient is closed")
+            self._pending.append((op, args, future))
+            self._outstanding.add(future)
+            if len(self._pending) == 1 or len(self._pending) >= self.max_batch:
+                self._cond.notify()
+        future.add_done_callback(self._settled)
+        return future
+
+    def flush(self):
+        """Send everything queued so far and wait for the replies."""
+        with self._cond:
+            # including batches the sender has taken but not heard back on
+            futures = [*self._outstanding]
+            self._cond.notify()
+        for future in futures:
+            future.exception()
+
+    def call(self, op: str, *args):
+        """Run ``op`` (typically a read such as get_experiments) right away."""
+        reply = self._post(f"/v1/{op}", list(args))
+        if not reply["ok"]:
+            raise ServerError(reply["error"])
+        return reply["result"]
+
+    def close(self):
+        """Send what is queued, stop the sender and close pooled connections."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._sender.join()
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def _settled(self, future):
+        with self._cond:
+            self._outstanding.discard(future)
+
+    def _send_loop(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return  # closed and drained
+                # give concurrent callers a moment to join this batch
+                deadline = time.monotonic() + self.linger
+                while len(self._pending) < self.max_batch and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._cond.wait(remaining):
+                        break
+                batch = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+            self._send_batch(batch)
+
+    def _send_batch(self, batch):
+        try:
+            reply = self._post("/v1/batch", [{"op": op, "args": args} for op, args, _ in batch])
+            if not reply["ok"]:
+                raise ServerError(reply["error"])
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, _, future), result in zip(batch, reply["results"]):
+            if result["ok"]:
+                future.set_result(result["result"])
+            else:
+                future.set_exception(ServerError(result["error"]))
+
+    def _post(self, path: str, payload):
+        body = json.dumps(payload, separators=(",", ":")).encode()
+        headers = {"Content-Type": "application/json", "Accept-Encoding": "gzip"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        if len(body) >= self.compress_min:
+            body = gzip.compress(body, 1)
+            headers["Content-Encoding"] = "gzip"
+        for attempt in range(self.retries + 1):
+            conn = self._connection()
+            try:
+                self.requests += 1
+                conn.request("POST", path, body, headers)
+                response = conn.getresponse()
+                data = response.read()
+            except (OSError, http.client.HTTPException):
+                # a dropped keep-alive connection, a refused connect or a timeout
+                conn.close()
+                if attempt == self.retries:
+                    raise
+            else:
+                if response.will_close:
+                    conn.close()
+                else:
+                    self._release(conn)
+                if response.getheader("Content-Encoding") == "gzip":
+                    data = gzip.decompress(data)
+                if response.status < 500:
+                    reply = json.loads(data)
+                    if response.status >= 400:
+                        raise ServerError(reply.get("error", f"HTTP {response.status}"))
+                    return reply
+                if attempt == self.retries:
+                    raise ServerError(f"HTTP {response.status}")
+            time.sleep(BACKOFF_BASE * 2 ** attempt)
+
+    def _connection(self):
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def _release(self, conn):
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
@@ -0,0 +1,57 @@
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+
+from datatrace.stats import CsvCounter
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def ingest_file(src: Path, dest_dir: Path = None, count_csv: bool = None,
+                chunk_size: int = CHUNK_SIZE, fast_stats: bool = False):
+    """
+    Read ``src`` once, hashing it, copying it into ``dest_dir`` and counting
+    CSV rows/columns in the same pass.
+
+    The copy is written to a temporary file in ``dest_dir``; the caller names
+    it once the hash is known. With dest_dir=None nothing is written, for
+    callers that materialize the file another way. fast_stats counts plain
+    newlines, for files known to have no quoted line breaks.
+    Returns (hash, temp_path, rows, columns).
+    """
+    src = Path(src)
+    if count_csv is None:
+        count_csv = src.suffix == ".csv"
+
+    sha = hashlib.sha256()
+    counter = CsvCounter(fast=fast_stats) if count_csv else None
+
+    if dest_dir is None:
+        with open(src, "rb") as fin:
+            while chunk := fin.read(chunk_size):
+                sha.update(chunk)
+                if counter:
+                    counter.feed(chunk)
+        rows, columns = counter.result() if counter else (0, 0)
+        return sha.hexdigest(), None, rows, columns
+
+    dest_dir = Path(dest_dir)
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=dest_dir, prefix=".ingest-")
+    try:
+        with open(src, "rb") as fin, os.fdopen(fd, "wb") as fout:
+            while chunk := fin.read(chunk_size):
+                sha.update(chunk)
+                fout.write(chunk)
+                if counter:
+                    counter.feed(chunk)
+        # keep shutil.copy semantics for the permission bits
+        os.chmod(tmp_name, os.stat(src).st_mode & 0o777)
+        rows, columns = counter.result() if counter else (0, 0)
+    except BaseException:
+        # the caller only owns the temp file once we return it
+        os.unlink(tmp_name)
+        raise
+    return sha.hexdigest(), Path(tmp_name), rows, columns
+
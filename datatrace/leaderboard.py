@@ -0,0 +1,102 @@
+"""
+Best run per dataset per metric, maintained as experiments are logged.
+
+Every numeric metric is ranked; higher is better unless the metric is
+configured with set_direction(key, "min"); loss-like names (loss, error,
+mse, ...) start out as "min". Reads are primary-key lookups,
+so they cost the same however much history there is.
+"""
+from datatrace.db import connect, transaction
+
+DIRECTIONS = ("max", "min")
+
+# Replace the stored best only on a strict improvement, so ties keep the
+# earlier run, matching rebuild().
+_UPSERT = """
+    INSERT INTO leaderboard (key, dataset_hash, experiment_id, value)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT (key, dataset_hash) DO UPDATE SET
+        experiment_id = excluded.experiment_id,
+        value = excluded.value
+    WHERE CASE (SELECT direction FROM leaderboard_metrics WHERE key = excluded.key)
+        WHEN 'min' THEN excluded.value < leaderboard.value
+        ELSE excluded.value > leaderboard.value
+    END
+"""
+
+
+def update_leaderboard(conn, rows):
+    """
+    Offer (key, dataset_hash, experiment_id, value) rows to the leaderboard;
+    the caller owns the transaction. NaN values never rank.
+    """
+    conn.executemany(_UPSERT, [row for row in rows if row[3] == row[3]])
+
+
+def rebuild(key: str = None):
+    """Recompute the leaderboard (or one metric of it) from scratch."""
+    with transaction() as conn:
+        recompute(conn, key)
+
+
+def recompute(conn, key: str = None):
+    """rebuild() inside the caller's transaction."""
+    where, params = ("AND m.key = ?", (key,)) if key else ("", ())
+    conn.execute(f"DELETE FROM leaderboard {'WHERE key = ?' if key else ''}", params)
+    conn.execute(f"""
+        INSERT INTO leaderboard (key, dataset_hash, experiment_id, value)
+        SELECT key, dataset_hash, experiment_id, value FROM (
+            SELECT m.key, e.dataset_hash, m.experiment_id, m.value,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY m.key, e.dataset_hash
+                       ORDER BY CASE WHEN d.direction = 'min' THEN m.value ELSE -m.value END,
+                                m.experiment_id
+                   ) AS rank
+            FROM metrics m
+            JOIN experiments e ON e.id = m.experiment_id
+            LEFT JOIN leaderboard_metrics d ON d.key = m.key
+            WHERE m.step = 0 AND m.value IS NOT NULL {where}
+        )
+        WHERE rank = 1
+    """, params)
+
+
+def set_direction(key: str, direction: str):
+    """Rank ``key`` by "max" or "min" from now on, re-ranking its history."""
+    if direction not in DIRECTIONS:
+        raise ValueError(f"direction must be one of {DIRECTIONS}, not {direction!r}")
+    with transaction() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO leaderboard_metrics (key, direction) VALUES (?, ?)",
+            (key, direction),
+        )
+        recompute(conn, key)
+
+
+def get_leaderboard(key: str = None):
+    """
+    Best run per dataset, for one metric or all of them. Returns list of
+    dicts with key, direction, dataset_hash, experiment_id, name and value.
+    """
+    where, params = ("WHERE l.key = ?", (key,)) if key else ("", ())
+    rows = connect().execute(f"""
+        SELECT l.key, COALESCE(d.direction, 'max'), l.dataset_hash, l.experiment_id, e.name, l.value
+        FROM leaderboard l
+        JOIN experiments e ON e.id = l.experiment_id
+        LEFT JOIN leaderboard_metrics d ON d.key = l.key
+        {where}
+        ORDER BY l.key, l.dataset_hash
+    """, params).fetchall()
+    return [
+        {"key": r[0], "direction": r[1], "dataset_hash": r[2], "experiment_id": r[3],
+         "name": r[4], "value": r[5]}
+        for r in rows
+    ]
+
+
+def best_run(dataset_hash: str, key: str):
+    """(experiment_id, value) of the best run on a dataset, or None."""
+    return connect().execute(
+        "SELECT experiment_id, value FROM leaderboard WHERE key = ? AND dataset_hash = ?",
+        (key, dataset_hash),
+    ).fetchone()
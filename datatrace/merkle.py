@@ -0,0 +1,139 @@
+import hashlib
+from pathlib import PurePosixPath
+
+from datatrace.db import connect, transaction
+from datatrace.objects import MissingObjects, add_refs, has_object
+
+ROOT = ""
+
+
+def build_tree(leaves):
+    """
+    Build Merkle nodes from (relative_path, digest, size) leaves.
+
+    Returns {path: (parent, kind, digest, size)} where path is a POSIX
+    relative path, "" is the root, and a directory digest covers the sorted
+    (kind, name, digest) of its children.
+    """
+    nodes = {}
+    children = {ROOT: []}
+
+    for rel, digest, size in leaves:
+        path = PurePosixPath(*rel.parts)
+        parent = _parent(path)
+        nodes[str(path)] = (parent, "file", digest, size)
+        children.setdefault(parent, []).append(str(path))
+        # register every ancestor directory up to the root
+        while parent != ROOT and parent not in nodes:
+            grandparent = _parent(PurePosixPath(parent))
+            nodes[parent] = (grandparent, "dir", None, 0)
+            children.setdefault(parent, [])
+            children.setdefault(grandparent, []).append(parent)
+            parent = grandparent
+    nodes[ROOT] = (None, "dir", None, 0)
+
+    # deepest directories first so children are final before their parent
+    for dir_path in sorted(children, key=lambda p: p.count("/") + (p != ROOT), reverse=True):
+        sha = hashlib.sha256()
+        size = 0
+        for child in sorted(children[dir_path]):
+            _, kind, digest, child_size = nodes[child]
+            sha.update(f"{kind} {PurePosixPath(child).name} {digest}\n".encode())
+            size += child_size
+        parent = nodes[dir_path][0]
+        nodes[dir_path] = (parent, "dir", sha.hexdigest(), size)
+
+    return nodes
+
+
+def save_manifest(dataset_hash: str, nodes: dict) -> bool:
+    """
+    Store the Merkle nodes of a dataset version and take a reference on each
+    of its blobs. Returns False if the version already had a manifest.
+    Raises MissingObjects, storing nothing, if a blob is not in the store.
+    """
+    with transaction() as conn:
+        exists = conn.execute(
+            "SELECT 1 FROM manifests WHERE dataset_hash = ? AND path = ''",
+            (dataset_hash,),
+        ).fetchone()
+        if not exists:
+            # checked under the write lock, so gc cannot remove them before commit
+            missing = sorted({
+                digest for _, kind, digest, _ in nodes.values()
+                if kind == "file" and not has_object(digest)
+            })
+            if missing:
+                raise MissingObjects(missing)
+            conn.executemany(
+                """
+                INSERT INTO manifests (dataset_hash, path, parent, kind, digest, size)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                [(dataset_hash, path, *node) for path, node in nodes.items()],
+            )
+            add_refs(conn, nodes)
+    return not exists
+
+
+def resolve_version(version: str) -> str:
+    """Expand a short version id to the full hash of a stored manifest."""
+    # hex digests sort below "g", so this range is exactly the prefix match
+    # and, unlike LIKE, can use the primary key
+    rows = connect().execute(
+        "SELECT dataset_hash FROM manifests WHERE dataset_hash >= ? AND dataset_hash < ? AND path = ''",
+        (version, version + "g"),
+    ).fetchall()
+    if not rows:
+        raise ValueError(f"No manifest for version {version}")
+    if len(rows) > 1:
+        raise ValueError(f"Ambiguous version {version}")
+    return rows[0][0]
+
+
+def diff_versions(old: str, new: str):
+    """
+    Compare two manifests, descending only into directories whose digests
+    differ. Returns a sorted list of (change, path) with change in
+    "added", "removed" or "modified".
+    """
+    old, new = resolve_version(old), resolve_version(new)
+    conn = connect()
+    changes = []
+
+    def children(version, parent):
+        rows = conn.execute(
+            "SELECT path, kind, digest FROM manifests WHERE dataset_hash = ? AND parent = ?",
+            (version, parent),
+        ).fetchall()
+        return {r[0]: (r[1], r[2]) for r in rows}
+
+    def walk(dir_path):
+        a, b = children(old, dir_path), children(new, dir_path)
+        for path in a.keys() | b.keys():
+            if path not in b:
+                changes.append(("removed", path))
+            elif path not in a:
+                changes.append(("added", path))
+            elif a[path] != b[path]:
+                if a[path][0] == b[path][0] == "dir":
+                    walk(path)
+                else:
+                    changes.append(("modified", path))
+
+    if _root_digest(conn, old) != _root_digest(conn, new):
+        walk(ROOT)
+    return sorted(changes, key=lambda c: c[1])
+
+
+def _root_digest(conn, version):
+    row = conn.execute(
+        "SELECT digest FROM manifests WHERE dataset_hash = ? AND path = ''",
+        (version,),
+    ).fetchone()
+    return row[0]
+
+
+def _parent(path: PurePosixPath) -> str:
+    parent = str(path.parent)
+    return ROOT if parent == "." else parent
@@ -0,0 +1,234 @@
+# datatrace/metrics.py
+# Normalized per-experiment metric values, queried with indexed SQL,
+# and step-wise metric curves stored as packed arrays
+
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from pathlib import Path
+
+from datatrace.db import connect, transaction
+from datatrace.querycache import cached
+from datatrace.utils import META_DB
+
+AGGREGATES = {"max": "MAX", "min": "MIN", "avg": "AVG", "sum": "SUM", "count": "COUNT"}
+
+
+def metric_rows(experiment_id: int, metrics: dict, step: int = 0):
+    """
+    (experiment_id, key, step, value) rows for the numeric entries of a
+    metrics dict; numeric strings are converted, anything else is skipped.
+    """
+    rows = []
+    for key, value in (metrics or {}).items():
+        if isinstance(value, bool):
+            value = float(value)
+        try:
+            rows.append((experiment_id, str(key), step, float(value)))
+        except (TypeError, ValueError):
+            continue
+    return rows
+
+
+def insert_metrics(conn, rows):
+    """Insert metric rows; the caller owns the transaction."""
+    conn.executemany("""
+        INSERT OR REPLACE INTO metrics (experiment_id, key, step, value)
+        VALUES (?, ?, ?, ?)
+    """, rows)
+
+
+@cached
+def get_metric(key: str, step: int = 0):
+    """
+    Value of one metric for every experiment that logged it, in logging
+    order. Returns list of dicts with experiment_id, name and value.
+    """
+    rows = connect().execute("""
+        SELECT m.experiment_id, e.name, m.value
+        FROM metrics m
+        JOIN experiments e ON e.id = m.experiment_id
+        WHERE m.key = ? AND m.step = ?
+        ORDER BY m.experiment_id
+    """, (key, step)).fetchall()
+    return [{"experiment_id": r[0], "name": r[1], "value": r[2]} for r in rows]
+
+
+def aggregate_metric(key: str, agg: str = "max", step: int = 0):
+    """
+    Aggregate one metric per dataset, e.g. the best f1 for each dataset.
+    Returns {dataset_hash: value}.
+    """
+    func = AGGREGATES.get(agg.lower())
+    if func is None:
+        raise ValueError(f"agg must be one of {sorted(AGGREGATES)}, not {agg!r}")
+    rows = connect().execute(f"""
+        SELECT e.dataset_hash, {func}(m.value)
+        FROM metrics m
+        JOIN experiments e ON e.id = m.experiment_id
+        WHERE m.key = ? AND m.step = ?
+        GROUP BY e.dataset_hash
+    """, (key, step)).fetchall()
+    return dict(rows)
+
+
+# --- step-wise series -------------------------------------------------------
+#
+# Training curves are buffered in memory and stored in chunks of up to
+# SERIES_CHUNK points per row: values and timestamps as packed float32
+# arrays, steps as packed int64 only when they are not consecutive.
+
+SERIES_CHUNK = 4096
+
+_series_lock = threading.Lock()
+_series_buffers = {}  # (cwd, run, key) -> _SeriesBuffer; META_DB is relative
+_atexit_registered = False
+
+
+class _SeriesBuffer:
+    def __init__(self, db_path, next_step):
+        self.db_path = db_path
+        self.steps = array("q")
+        self.values = array("f")
+        self.times = array("d")
+        self.next_step = next_step
+
+
+def log_metric(run, key: str, value: float, step: int = None):
+    """
+    Record one point of a metric curve, e.g. the loss of each batch.
+
+    ``run`` identifies the training run (an experiment id or name). Without
+    ``step`` the point follows the previous one. Points are written in
+    chunks of SERIES_CHUNK; call flush_metrics() to write a partial chunk
+    (it also runs at exit). A chunk never replaces a stored one: writing
+    one that starts at a stored chunk's first step raises ValueError and
+    drops its points.
+    """
+    global _atexit_registered
+    run = str(run)
+    buffer_key = (os.getcwd(), run, key)
+    with _series_lock:
+        buf = _series_buffers.get(buffer_key)
+        if buf is None:
+            db_path = Path(META_DB).resolve()
+            buf = _series_buffers[buffer_key] = _SeriesBuffer(
+                db_path, _last_stored_step(db_path, run, key) + 1
+            )
+            if not _atexit_registered:
+                atexit.register(flush_metrics)
+                _atexit_registered = True
+        if step is None:
+            step = buf.next_step
+        buf.steps.append(step)
+        buf.values.append(value)
+        buf.times.append(time.time())
+        buf.next_step = step + 1
+        if len(buf.values) >= SERIES_CHUNK:
+            _write_chunk(run, key, buf)
+
+
+def flush_metrics():
+    """Write every buffered metric point."""
+    error = None
+    with _series_lock:
+        for (_, run, key), buf in _series_buffers.items():
+            if buf.values:
+                try:
+                    _write_chunk(run, key, buf)
+                except ValueError as e:
+                    error = error or e  # still write the other curves
+    if error is not None:
+        raise error
+
+
+def load_metric(run, key: str, with_timestamps: bool = False):
+    """
+    Load a whole metric curve with one query.
+
+    Returns (steps, values) as NumPy arrays (int64, float32), plus unix
+    timestamps (float64) with with_timestamps=True. Falls back to
+    array.array when NumPy is not installed.
+    """
+    flush_metrics()
+    rows = connect().execute("""
+        SELECT first_step, count, steps, "values", t0, times
+        FROM metric_series
+        WHERE run = ? AND key = ?
+        ORDER BY first_step
+    """, (str(run), key)).fetchall()
+
+    try:
+        import numpy as np
+    except ImportError:
+        return _decode_series(rows, with_timestamps)
+
+    steps = [
+        np.arange(first, first + count, dtype=np.int64) if blob is None
+        else np.frombuffer(blob, dtype=np.int64)
+        for first, count, blob, _, _, _ in rows
+    ]
+    values = [np.frombuffer(row[3], dtype=np.float32) for row in rows]
+    result = (
+        np.concatenate(steps) if rows else np.empty(0, np.int64),
+        np.concatenate(values) if rows else np.empty(0, np.float32),
+    )
+    if with_timestamps:
+        times = [row[4] + np.frombuffer(row[5], dtype=np.float32).astype(np.float64) for row in rows]
+        result += (np.concatenate(times) if rows else np.empty(0, np.float64),)
+    return result
+
+
+def _decode_series(rows, with_timestamps):
+    steps, values, times = array("q"), array("f"), array("d")
+    for first, count, step_blob, value_blob, t0, time_blob in rows:
+        if step_blob is None:
+            steps.extend(range(first, first + count))
+        else:
+            steps.frombytes(step_blob)
+        values.frombytes(value_blob)
+        if with_timestamps:
+            offsets = array("f")
+            offsets.frombytes(time_blob)
+            times.extend(t0 + o for o in offsets)
+    return (steps, values, times) if with_timestamps else (steps, values)
+
+
+def _write_chunk(run, key, buf):
+    steps = buf.steps
+    first = steps[0]
+    consecutive = steps[-1] - first == len(steps) - 1 and all(
+        b - a == 1 for a, b in zip(steps, steps[1:])
+    )
+    t0 = buf.times[0]
+    try:
+        with transaction(buf.db_path) as conn:
+            conn.execute("""
+                INSERT INTO metric_series
+                    (run, key, first_step, last_step, count, steps, "values", t0, times)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                run, key, first, max(steps), len(steps),
+                None if consecutive else steps.tobytes(),
+                buf.values.tobytes(), t0,
+                array("f", (t - t0 for t in buf.times)).tobytes(),
+            ))
+    except sqlite3.IntegrityError:
+        buf.steps, buf.values, buf.times = array("q"), array("f"), array("d")
+        raise ValueError(
+            f"metric {key!r} of run {run!r} already has a chunk from step {first}; "
+            "log a resumed run under a new run name or continue after its last step"
+        ) from None
+    buf.steps, buf.values, buf.times = array("q"), array("f"), array("d")
+
+
+def _last_stored_step(db_path, run, key):
+    row = connect(db_path).execute("""
+        SELECT last_step FROM metric_series
+        WHERE run = ? AND key = ?
+        ORDER BY first_step DESC LIMIT 1
+    """, (run, key)).fetchone()
+    return row[0] if row else -1
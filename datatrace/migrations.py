@@ -0,0 +1,341 @@
+"""
+Versioned schema migrations for meta.db.
+
+The database records the last applied migration in ``PRAGMA user_version``.
+``migrate`` applies every newer entry of MIGRATIONS in order, each in its own
+IMMEDIATE transaction, so concurrent processes opening the same store apply
+each step exactly once. Add a migration by appending a function; never edit
+one that has shipped.
+"""
+import json
+import sqlite3
+
+EXPERIMENTS_TABLE = """
+    CREATE TABLE experiments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        dataset_hash TEXT NOT NULL DEFAULT '',
+        params TEXT,               -- JSON string of parameters
+        metrics TEXT,              -- JSON string of metrics
+        notes TEXT,
+        timestamp TEXT NOT NULL
+    )
+"""
+
+
+def _base_tables(conn):
+    """Tables as of the first release; existing stores keep what they have."""
+    conn.execute(EXPERIMENTS_TABLE.replace("CREATE TABLE", "CREATE TABLE IF NOT EXISTS", 1))
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS datasets (
+            id TEXT PRIMARY KEY,
+            path TEXT,
+            hash TEXT,
+            rows INTEGER,
+            columns INTEGER,
+            timestamp TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS experiment_datasets (
+            experiment_id TEXT,
+            dataset_id TEXT,
+            PRIMARY KEY (experiment_id, dataset_id)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS usage (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            dataset_hash TEXT NOT NULL,
+            action TEXT NOT NULL,
+            timestamp TEXT NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS manifests (
+            dataset_hash TEXT,
+            path TEXT,
+            parent TEXT,
+            kind TEXT,
+            digest TEXT,
+            size INTEGER,
+            PRIMARY KEY (dataset_hash, path)
+        )
+    """)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_manifests_parent ON manifests (dataset_hash, parent)"
+    )
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS objects (
+            digest TEXT PRIMARY KEY,
+            size INTEGER,
+            refcount INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS hash_cache (
+            path TEXT PRIMARY KEY,
+            size INTEGER,
+            mtime_ns INTEGER,
+            inode INTEGER,
+            device INTEGER,
+            hash TEXT
+        )
+    """)
+
+
+def _experiments_integer_ids(conn):
+    """
+    Stores created by utils.ensure_storage have experiments(id TEXT, ...)
+    without dataset_hash, which log_experiment cannot insert into. Rebuild
+    them to the INTEGER AUTOINCREMENT layout, keeping existing rows.
+
+    Each row's new id is its old rowid. experiment_datasets.experiment_id
+    holds the old TEXT ids, so it is rewritten to the new ids in the same
+    transaction; links to ids that no experiment has are kept as they are.
+    """
+    columns = table_columns(conn, "experiments")
+    if "dataset_hash" in columns and columns["id"].upper() == "INTEGER":
+        return
+    new_ids = dict(conn.execute("SELECT id, rowid FROM experiments WHERE id IS NOT NULL"))
+    rebuild_table(
+        conn, "experiments", EXPERIMENTS_TABLE,
+        source={"id": "rowid"}, fill={"name": "''", "timestamp": "''"},
+    )
+    links = conn.execute("SELECT experiment_id, dataset_id FROM experiment_datasets").fetchall()
+    conn.execute("DELETE FROM experiment_datasets")
+    conn.executemany(
+        "INSERT OR IGNORE INTO experiment_datasets (experiment_id, dataset_id) VALUES (?, ?)",
+        [(new_ids.get(experiment_id, experiment_id), dataset_id)
+         for experiment_id, dataset_id in links],
+    )
+
+
+def _lookup_indexes(conn):
+    """
+    Index every lookup and ORDER BY path, and make datasets.hash unique
+    (log_dataset already dedups on it; drop any older duplicates first).
+    """
+    conn.execute("""
+        DELETE FROM datasets WHERE rowid NOT IN (
+            SELECT MIN(rowid) FROM datasets GROUP BY hash
+        )
+    """)
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_datasets_hash ON datasets (hash)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_datasets_timestamp ON datasets (timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_experiments_timestamp ON experiments (timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_usage_timestamp ON usage (timestamp)")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_usage_hash_timestamp ON usage (dataset_hash, timestamp)"
+    )
+    # gc deletes dead blob rows; a partial index keeps that off the live set
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_objects_dead ON objects (digest) WHERE refcount <= 0"
+    )
+
+
+def _metrics_table(conn):
+    """
+    Normalized metric values, one row per (experiment, key, step), backfilled
+    from the JSON in experiments.metrics.
+    """
+    from datatrace.metrics import insert_metrics, metric_rows
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS metrics (
+            experiment_id INTEGER NOT NULL,
+            key TEXT NOT NULL,
+            step INTEGER NOT NULL DEFAULT 0,
+            value REAL,
+            PRIMARY KEY (experiment_id, key, step)
+        ) WITHOUT ROWID
+    """)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_metrics_key ON metrics (key, experiment_id, step, value)"
+    )
+    for experiment_id, metrics in conn.execute("SELECT id, metrics FROM experiments").fetchall():
+        try:
+            parsed = json.loads(metrics) if metrics else {}
+        except ValueError:
+            continue
+        if isinstance(parsed, dict):
+            insert_metrics(conn, metric_rows(experiment_id, parsed))
+
+
+def _metric_series_table(conn):
+    """Chunked metric curves; see datatrace.metrics.log_metric."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS metric_series (
+            run TEXT NOT NULL,
+            key TEXT NOT NULL,
+            first_step INTEGER NOT NULL,
+            last_step INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            steps BLOB,                -- int64 array, NULL when consecutive
+            "values" BLOB NOT NULL,    -- float32 array
+            t0 REAL NOT NULL,          -- unix time of the first point
+            times BLOB NOT NULL,       -- float32 offsets from t0
+            PRIMARY KEY (run, key, first_step)
+        ) WITHOUT ROWID
+    """)
+
+
+def _datasets_keyset_index(conn):
+    """
+    Page datasets by (timestamp, id). The id is TEXT, so unlike experiments
+    and usage it is not implied by a timestamp index; this one replaces it.
+    """
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_datasets_timestamp_id ON datasets (timestamp, id)"
+    )
+    conn.execute("DROP INDEX IF EXISTS idx_datasets_timestamp")
+
+
+def _run_query_indexes(conn):
+    """
+    Indexes for datatrace.query: metric range filters and ordering by a
+    metric's value, and experiments by dataset.
+    """
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_metrics_value ON metrics (key, step, value)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_experiments_dataset ON experiments (dataset_hash, timestamp)"
+    )
+
+
+def _leaderboard_tables(conn):
+    """Best run per (metric, dataset); see datatrace.leaderboard."""
+    from datatrace.leaderboard import recompute
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS leaderboard_metrics (
+            key TEXT PRIMARY KEY,
+            direction TEXT NOT NULL CHECK (direction IN ('max', 'min'))
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS leaderboard (
+            key TEXT NOT NULL,
+            dataset_hash TEXT NOT NULL,
+            experiment_id INTEGER NOT NULL,
+            value REAL NOT NULL,
+            PRIMARY KEY (key, dataset_hash)
+        ) WITHOUT ROWID
+    """)
+    conn.executemany(
+        "INSERT OR IGNORE INTO leaderboard_metrics (key, direction) VALUES (?, 'min')",
+        [("loss",), ("val_loss",), ("error",), ("rmse",), ("mae",), ("mse",)],
+    )
+    recompute(conn)
+
+
+def _usage_rollups(conn):
+    """
+    Hourly and daily usage counts, kept current by tracking._insert_usage
+    and backfilled from the raw usage rows.
+    """
+    for table in ("usage_hourly", "usage_daily"):
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                dataset_hash TEXT NOT NULL,
+                bucket TEXT NOT NULL,      -- timestamp prefix: YYYY-MM-DDTHH or YYYY-MM-DD
+                action TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (dataset_hash, bucket, action)
+            ) WITHOUT ROWID
+        """)
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_bucket ON {table} (bucket)")
+    conn.execute("""
+        INSERT OR REPLACE INTO usage_hourly (dataset_hash, bucket, action, count)
+        SELECT dataset_hash, substr(timestamp, 1, 13), action, COUNT(*)
+        FROM usage GROUP BY 1, 2, 3
+    """)
+    conn.execute("""
+        INSERT OR REPLACE INTO usage_daily (dataset_hash, bucket, action, count)
+        SELECT dataset_hash, substr(bucket, 1, 10), action, SUM(count)
+        FROM usage_hourly GROUP BY 1, 2, 3
+    """)
+
+
+def _event_segments_table(conn):
+    """How far datatrace.eventlog.compact has merged each segment file."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS event_segments (
+            name TEXT PRIMARY KEY,
+            position INTEGER NOT NULL,      -- byte offset merged up to
+            sealed INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+
+
+MIGRATIONS = [
+    _base_tables,
+    _experiments_integer_ids,
+    _lookup_indexes,
+    _metrics_table,
+    _metric_series_table,
+    _datasets_keyset_index,
+    _run_query_indexes,
+    _leaderboard_tables,
+    _usage_rollups,
+    _event_segments_table,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """Bring the database up to SCHEMA_VERSION. Returns the version applied from."""
+    start = current = user_version(conn)
+    while current < SCHEMA_VERSION:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # another process may have migrated while we waited for the lock
+            current = user_version(conn)
+            if current < SCHEMA_VERSION:
+                MIGRATIONS[current](conn)
+                current += 1
+                conn.execute(f"PRAGMA user_version = {current}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    return start
+
+
+def user_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def table_columns(conn: sqlite3.Connection, table: str) -> dict:
+    """Map column name -> declared type."""
+    return {row[1]: row[2] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def rebuild_table(conn: sqlite3.Connection, table: str, create_sql: str, skip=(), fill=None,
+                  source=None):
+    """
+    Rebuild ``table`` in place with a new definition (SQLite's recommended
+    create-copy-drop-rename procedure). Columns present in both layouts are
+    copied, except those in ``skip``, which take their new defaults; ``fill``
+    maps a column to an SQL expression used where the old value is NULL, and
+    ``source`` to an expression over the old row copied instead of it.
+    Indexes on the old table are dropped with it; later migrations recreate
+    them. Must run inside a transaction.
+    """
+    fill = fill or {}
+    source = source or {}
+    old_columns = table_columns(conn, table)
+    tmp = f"{table}__rebuild"
+    conn.execute(f"DROP TABLE IF EXISTS {tmp}")
+    conn.execute(create_sql.replace(f"CREATE TABLE {table}", f"CREATE TABLE {tmp}", 1))
+    shared = [c for c in table_columns(conn, tmp)
+              if (c in old_columns or c in source) and c not in skip]
+    values = [source.get(c, c) for c in shared]
+    values = [f"COALESCE({v}, {fill[c]})" if c in fill else v for c, v in zip(shared, values)]
+    conn.execute(
+        f"INSERT INTO {tmp} ({', '.join(shared)}) SELECT {', '.join(values)} FROM {table}"
+    )
+    conn.execute(f"DROP TABLE {table}")
+    conn.execute(f"ALTER TABLE {tmp} RENAME TO {table}")
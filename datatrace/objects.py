@@ -0,0 +1,154 @@
+import os
+import uuid
+from collections import Counter
+from pathlib import Path, PurePosixPath
+
+from datatrace.core import _hash_bytes
+from datatrace.db import connect, transaction
+from datatrace.fastcopy import clone_file
+from datatrace.utils import BASE_DIR
+
+OBJECTS_DIR = BASE_DIR / "objects"
+TMP_DIR = OBJECTS_DIR / "tmp"
+
+
+class MissingObjects(FileNotFoundError):
+    """Blobs a manifest refers to are not in the store (e.g. gc removed them)."""
+
+    def __init__(self, digests):
+        super().__init__(f"{len(digests)} blobs missing from the store")
+        self.digests = digests
+
+
+class DigestMismatch(ValueError):
+    """A file no longer hashes to the digest it is being stored under."""
+
+
+def object_path(digest: str) -> Path:
+    """Location of a blob: objects/ab/cdef... keyed by its SHA-256."""
+    return OBJECTS_DIR / digest[:2] / digest[2:]
+
+
+def has_object(digest: str) -> bool:
+    return object_path(digest).exists()
+
+
+def adopt(tmp_path: Path, digest: str, readonly: bool = True) -> bool:
+    """
+    Move an already-hashed temporary file into the store.
+    Returns False (and drops the temp file) if the blob already exists.
+    """
+    dest = object_path(digest)
+    if dest.exists():
+        os.unlink(tmp_path)
+        return False
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    if readonly:
+        os.chmod(tmp_path, 0o444)  # blobs are immutable
+    os.replace(tmp_path, dest)
+    return True
+
+
+def put_file(src: Path, digest: str, allow_hardlink: bool = False):
+    """
+    Store ``src`` under ``digest`` unless it is already there.
+
+    Returns the clone_file method used, or None if the blob existed. Pass
+    allow_hardlink only when the source will never be modified in place.
+    ``digest`` usually comes from an earlier read of ``src``, so the staged
+    copy is hashed again; DigestMismatch means ``src`` changed in between.
+    """
+    if has_object(digest):
+        return None
+    TMP_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = TMP_DIR / f"put-{uuid.uuid4().hex}"
+    try:
+        method = clone_file(src, tmp_path, allow_hardlink=allow_hardlink)
+        if _hash_bytes(tmp_path) != digest:
+            raise DigestMismatch(f"{src} changed while it was being stored; add it again")
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    # a hardlink shares the source inode, so leave its mode alone
+    adopt(tmp_path, digest, readonly=method != "hardlink")
+    return method
+
+
+def add_refs(conn, nodes: dict):
+    """Take one reference per file leaf of a manifest (caller commits)."""
+    conn.executemany(
+        """
+        INSERT INTO objects (digest, size, refcount) VALUES (?, ?, 1)
+        ON CONFLICT(digest) DO UPDATE SET refcount = refcount + 1
+        """,
+        [(digest, size) for _, kind, digest, size in nodes.values() if kind == "file"],
+    )
+
+
+def release_version(dataset_hash: str):
+    """Drop a version's manifest and the blob references it held."""
+    with transaction() as conn:
+        conn.execute(
+            """
+            UPDATE objects SET refcount = refcount - (
+                SELECT COUNT(*) FROM manifests m
+                WHERE m.dataset_hash = ? AND m.kind = 'file' AND m.digest = objects.digest
+            )
+            WHERE digest IN (
+                SELECT digest FROM manifests WHERE dataset_hash = ? AND kind = 'file'
+            )
+            """,
+            (dataset_hash, dataset_hash),
+        )
+        conn.execute("DELETE FROM manifests WHERE dataset_hash = ?", (dataset_hash,))
+        conn.execute("DELETE FROM datasets WHERE hash = ?", (dataset_hash,))
+
+
+def gc():
+    """
+    Delete unreferenced blobs. Returns (blobs removed, bytes freed).
+
+    The sweep holds the write transaction, so no manifest can take a
+    reference meanwhile; save_manifest checks its blobs exist in its own
+    transaction, so one put_file found just before the sweep is not lost.
+    """
+    removed = freed = 0
+    with transaction() as conn:
+        live = {
+            row[0] for row in conn.execute("SELECT digest FROM objects WHERE refcount > 0")
+        }
+        if OBJECTS_DIR.exists():
+            for prefix in OBJECTS_DIR.iterdir():
+                if len(prefix.name) != 2 or not prefix.is_dir():
+                    continue
+                for blob in prefix.iterdir():
+                    if prefix.name + blob.name not in live:
+                        freed += blob.stat().st_size
+                        blob.unlink()
+                        removed += 1
+        conn.execute("DELETE FROM objects WHERE refcount <= 0")
+    return removed, freed
+
+
+def checkout(version: str, dest: Path, link: bool = False) -> Counter:
+    """
+    Materialize a stored version under ``dest`` using reflinks or in-kernel
+    copies where possible; link=True also allows hardlinks to the read-only
+    blobs. Returns a Counter of the methods used.
+    """
+    from datatrace.merkle import resolve_version
+
+    dataset_hash = resolve_version(version)
+    dest = Path(dest)
+    rows = connect().execute(
+        "SELECT path, digest FROM manifests WHERE dataset_hash = ? AND kind = 'file'",
+        (dataset_hash,),
+    ).fetchall()
+
+    methods = Counter()
+    for rel, digest in rows:
+        target = dest.joinpath(*PurePosixPath(rel).parts)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.unlink(missing_ok=True)
+        methods[clone_file(object_path(digest), target, allow_hardlink=link)] += 1
+    return methods
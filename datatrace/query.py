@@ -0,0 +1,128 @@
+"""
+Filter and sort experiments in SQL.
+
+A filter is a list of ``field op value`` conditions joined with commas or
+``and``, e.g. ``params.lr<0.01, metrics.accuracy>=0.9, dataset=abc``. Fields
+are id, name, dataset (or dataset_hash), timestamp, ``params.<key>`` (read
+with JSON1 json_extract, dotted keys reach nested params) and
+``metrics.<key>`` (the normalized metrics table, step 0). Operators are
+< <= > >= = == and !=.
+"""
+import re
+
+from datatrace.db import connect
+from datatrace.experiments import experiment_dict
+
+COLUMNS = {
+    "id": "e.id",
+    "name": "e.name",
+    "dataset": "e.dataset_hash",
+    "dataset_hash": "e.dataset_hash",
+    "timestamp": "e.timestamp",
+}
+OPERATORS = {"<": "<", "<=": "<=", ">": ">", ">=": ">=", "=": "=", "==": "=", "!=": "<>"}
+
+# the value may not be empty; compare with '' to match an empty string
+CONDITION = re.compile(r"^\s*([\w.]+)\s*(<=|>=|!=|==|=|<|>)\s*(\S.*?)\s*$")
+SEPARATOR = re.compile(r",|\s+and\s+", re.IGNORECASE)
+KEY = re.compile(r"^\w+(\.\w+)*$")
+
+
+def query_runs(where: str = None, order_by: str = None, limit: int = None):
+    """
+    Experiments matching ``where``, sorted by ``order_by`` (a field, optionally
+    followed by "asc" or "desc"; descending by default) and capped at
+    ``limit``. Sorting by a metric skips runs that did not log it. Returns
+    dicts shaped like get_experiments(); raises ValueError on a bad filter.
+    """
+    sql, params = compile_query(where, order_by, limit)
+    return [experiment_dict(row) for row in connect().execute(sql, params)]
+
+
+def compile_query(where: str = None, order_by: str = None, limit: int = None):
+    """Return the (sql, params) that query_runs executes."""
+    joins, conditions, params, order_params = [], [], [], []
+    if order_by:
+        field, _, direction = order_by.strip().partition(" ")
+        direction = direction.strip().upper() or "DESC"
+        if direction not in ("ASC", "DESC"):
+            raise ValueError(f"order direction must be asc or desc, not {direction.lower()!r}")
+        kind, key = _split_field(field)
+        if kind == "metrics":
+            # an inner join lets SQLite walk idx_metrics_value in order
+            joins.append("JOIN metrics o ON o.experiment_id = e.id AND o.key = ? AND o.step = 0")
+            params.append(key)
+            order = f"o.value {direction}, o.experiment_id {direction}"
+        elif kind == "params":
+            order = f"json_extract(e.params, ?) {direction}, e.id {direction}"
+            order_params.append(_json_path(key))
+        else:
+            order = f"{COLUMNS[key]} {direction}, e.id {direction}"
+    else:
+        order = "e.timestamp DESC, e.id DESC"
+
+    for condition in SEPARATOR.split(where or ""):
+        if condition.strip():
+            sql, values = _compile_condition(condition)
+            conditions.append(sql)
+            params.extend(values)
+
+    params.extend(order_params)
+
+    sql = (
+        "SELECT e.name, e.dataset_hash, e.params, e.metrics, e.timestamp, e.id"
+        f" FROM {' '.join(['experiments e', *joins])}"
+        f" WHERE {' AND '.join(conditions) or '1'}"
+        f" ORDER BY {order}"
+    )
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return sql, params
+
+
+def _compile_condition(condition: str):
+    match = CONDITION.match(condition)
+    if not match:
+        raise ValueError(f"Cannot parse condition {condition.strip()!r}")
+    field, op, raw = match.groups()
+    kind, key = _split_field(field)
+    value = _parse_value(raw)
+    op = OPERATORS[op]
+
+    if kind == "metrics":
+        if not isinstance(value, (int, float)):
+            raise ValueError(f"metrics.{key} can only be compared with a number")
+        return (
+            f"e.id IN (SELECT experiment_id FROM metrics WHERE key = ? AND step = 0 AND value {op} ?)",
+            [key, value],
+        )
+    if kind == "params":
+        return f"json_extract(e.params, ?) {op} ?", [_json_path(key), value]
+    return f"{COLUMNS[key]} {op} ?", [value]
+
+
+def _split_field(field: str):
+    kind, dot, key = field.partition(".")
+    if dot and kind in ("params", "metrics") and KEY.match(key):
+        return kind, key
+    if not dot and field in COLUMNS:
+        return "column", field
+    raise ValueError(
+        f"Unknown field {field!r}; use {', '.join(COLUMNS)}, params.<key> or metrics.<key>"
+    )
+
+
+def _json_path(key: str) -> str:
+    return "$." + ".".join(f'"{part}"' for part in key.split("."))
+
+
+def _parse_value(raw: str):
+    if len(raw) >= 2 and raw[0] == raw[-1] and raw[0] in "'\"":
+        return raw[1:-1]
+    for cast in (int, float):
+        try:
+            return cast(raw)
+        except ValueError:
+            pass
+    return raw
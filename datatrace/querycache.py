@@ -0,0 +1,149 @@
+"""
+Read-through cache for listing queries (list_datasets, get_experiments,
+get_metric), so a dashboard that re-reads unchanged data pays one
+``PRAGMA data_version`` instead of a query and JSON decode.
+
+Each database gets a watcher connection that never writes; its
+data_version changes whenever any other connection, in this process or
+another, commits. A cached result is reused while that number is the one it
+was computed under. Results are kept in one LRU bounded by their estimated
+size in memory (DATATRACE_QUERY_CACHE_MB, default 64; 0 disables caching).
+
+Callers get a shallow copy of a cached list or dict: they may reorder or
+extend it, but must not modify the rows.
+"""
+import functools
+import os
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+from collections.abc import Iterator
+from pathlib import Path
+
+from datatrace import eventlog
+from datatrace.utils import META_DB
+
+MAX_BYTES = int(float(os.environ.get("DATATRACE_QUERY_CACHE_MB", "64")) * 1024 * 1024)
+
+_lock = threading.Lock()
+_entries = OrderedDict()  # (cwd, query key) -> (data_version, size, result)
+_watchers = {}  # cwd -> (pid, connection, lock); META_DB is relative
+_bytes = 0
+_hits = 0
+_misses = 0
+
+
+def cached(func):
+    """Decorate a query function so its results go through cached_query."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return cached_query(func, *args, **kwargs)
+
+    wrapper.uncached = func
+    return wrapper
+
+
+def cached_query(func, *args, **kwargs):
+    """
+    ``func(*args, **kwargs)``, served from the cache while the database has
+    not changed. Generators are materialized into lists.
+    """
+    global _hits, _misses
+    if MAX_BYTES <= 0 or _has_event_tail():
+        return _materialize(func(*args, **kwargs))
+
+    cwd = os.getcwd()
+    key = (cwd, func.__module__, func.__qualname__, repr(args), repr(sorted(kwargs.items())))
+    # read the version before querying: a commit in between only makes
+    # the stored result look older than it is
+    version = data_version(cwd)
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None and entry[0] == version:
+            _entries.move_to_end(key)
+            _hits += 1
+            return _copy(entry[2])
+        _misses += 1
+
+    result = _materialize(func(*args, **kwargs))
+    _store(key, version, result)
+    return _copy(result)
+
+
+def data_version(cwd: str = None):
+    """The watcher's PRAGMA data_version for the database under ``cwd``."""
+    cwd = cwd or os.getcwd()
+    watcher = _watchers.get(cwd)
+    if watcher is None or watcher[0] != os.getpid():
+        watcher = _open_watcher(cwd)
+    _, conn, lock = watcher
+    with lock:
+        return conn.execute("PRAGMA data_version").fetchone()[0]
+
+
+def cache_info():
+    """Hit and miss counts and the current size of the cache."""
+    with _lock:
+        return {"hits": _hits, "misses": _misses, "entries": len(_entries), "bytes": _bytes}
+
+
+def clear():
+    """Drop every cached result and reset the counters."""
+    global _bytes, _hits, _misses
+    with _lock:
+        _entries.clear()
+        _bytes = _hits = _misses = 0
+
+
+def _store(key, version, result):
+    global _bytes
+    size = _sizeof(result)
+    if size > MAX_BYTES // 4:
+        return  # one huge listing would evict everything else
+    with _lock:
+        old = _entries.pop(key, None)
+        if old is not None:
+            _bytes -= old[1]
+        _entries[key] = (version, size, result)
+        _bytes += size
+        while _bytes > MAX_BYTES:
+            _, (_, evicted, _) = _entries.popitem(last=False)
+            _bytes -= evicted
+
+
+def _materialize(result):
+    return list(result) if isinstance(result, Iterator) else result
+
+
+def _copy(result):
+    return result.copy() if isinstance(result, (list, dict)) else result
+
+
+def _open_watcher(cwd):
+    from datatrace.db import connect
+
+    connect()  # create and migrate the database first
+    path = Path(cwd, META_DB).resolve()
+    watcher = (os.getpid(), sqlite3.connect(path, check_same_thread=False), threading.Lock())
+    _watchers[cwd] = watcher
+    return watcher
+
+
+def _has_event_tail():
+    """Unmerged event log records are not covered by data_version."""
+    try:
+        with os.scandir(eventlog.EVENTS_DIR) as entries:
+            return any(e.name.endswith(eventlog.SUFFIX) for e in entries)
+    except FileNotFoundError:
+        return False
+
+
+def _sizeof(obj):
+    """Approximate memory held by a result of lists, tuples, dicts and scalars."""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_sizeof(k) + _sizeof(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(_sizeof(v) for v in obj)
+    return size
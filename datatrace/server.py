@@ -0,0 +1,438 @@
+"""
+Long-lived tracking server: ``datatrace serve``.
+
+One process owns meta.db and answers newline-delimited JSON requests on a
+Unix socket (and optionally a localhost TCP port)::
+
+    {"op": "log_experiment", "args": [...]}   ->   {"ok": true, "result": ...}
+
+With an HTTP port it also serves the same operations over HTTP/1.1 with
+keep-alive, for workers on other hosts (see datatrace.http_client)::
+
+    POST /v1/<op>     [args...]                      ->  {"ok": ..., "result": ...}
+    POST /v1/batch    [{"op": ..., "args": [...]}]   ->  {"ok": true, "results": [...]}
+
+Request bodies may be gzip-encoded; responses are gzipped when large and
+the client accepts it.
+
+Only the Unix socket is trusted (by its file permissions). With a token
+(DATATRACE_SERVER_TOKEN) TCP requests must carry it, as an
+``Authorization: Bearer`` header over HTTP or a "token" field in a JSON
+line; without one the TCP listeners may only bind a loopback address.
+
+Writes from all clients are queued and committed together, one transaction
+per batch, on a single writer thread; a client gets its reply once its
+write is committed. Reads run on a reader thread whose connection, page
+cache and prepared statements stay warm. datatrace.client routes
+log_experiment, track_usage and log_dataset here while the server runs.
+log_metric points are buffered as in metrics.log_metric and written at the
+end of each HTTP batch, or within METRIC_LINGER seconds when sent one by
+one; their replies wait for that write too.
+"""
+import asyncio
+import contextlib
+import gzip
+import hmac
+import ipaddress
+import json
+import logging
+import os
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from datatrace.client import SOCKET_PATH
+
+logger = logging.getLogger(__name__)
+
+# Most queued writes committed in one transaction
+WRITE_BATCH = 5000
+
+# Request line limit (a JSON-encoded call)
+MAX_REQUEST = 16 * 1024 * 1024
+
+# Gzip HTTP responses at least this large
+GZIP_MIN = 4096
+
+# Seconds log_metric points wait for others before their chunks are written
+METRIC_LINGER = 0.005
+
+# op -> event kind of the record it writes (see eventlog.apply_records)
+WRITES = {"log_experiment": "experiment", "track_usage": "usage", "log_dataset": "dataset"}
+
+
+def _read_ops():
+    from datatrace.datasets import list_datasets
+    from datatrace.experiments import get_experiments
+    from datatrace.leaderboard import get_leaderboard
+    from datatrace.metrics import aggregate_metric, get_metric, load_metric
+    from datatrace.query import query_runs
+    from datatrace.tracking import get_usage_records, get_usage_rollup
+
+    return {
+        "ping": lambda: "pong",
+        "list_datasets": list_datasets,
+        "get_experiments": get_experiments,
+        "get_usage_records": get_usage_records,
+        "get_usage_rollup": get_usage_rollup,
+        "get_metric": get_metric,
+        "aggregate_metric": aggregate_metric,
+        "load_metric": lambda *args: [a.tolist() for a in load_metric(*args)],
+        "query_runs": query_runs,
+        "get_leaderboard": get_leaderboard,
+    }
+
+
+class TrackingServer:
+    def __init__(self, socket_path: Path = SOCKET_PATH, port: int = None, host: str = "127.0.0.1",
+                 http_port: int = None, token: str = None):
+        self.socket_path = Path(socket_path)
+        self.port = port
+        self.host = host
+        self.http_port = http_port
+        self.token = token or os.environ.get("DATATRACE_SERVER_TOKEN") or None
+        listens_on_tcp = port is not None or http_port is not None
+        if listens_on_tcp and not self.token and not _is_loopback(host):
+            raise ValueError(
+                f"refusing to serve on {host} without a token; set DATATRACE_SERVER_TOKEN"
+            )
+        self.reads = _read_ops()
+        self.queue = None
+        self.servers = []
+        self._handlers = set()
+        self._metric_flush = None
+        self._writer = ThreadPoolExecutor(1, thread_name_prefix="datatrace-serve-write")
+        self._reader = ThreadPoolExecutor(1, thread_name_prefix="datatrace-serve-read")
+
+    async def start(self):
+        self.queue = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+        # open and migrate the DB on both threads before accepting requests
+        await loop.run_in_executor(self._writer, _warm_up)
+        await loop.run_in_executor(self._reader, _warm_up)
+
+        _claim_socket(self.socket_path)
+        self.servers.append(await asyncio.start_unix_server(
+            self.handle, path=str(self.socket_path), limit=MAX_REQUEST
+        ))
+        if self.port is not None:
+            self.servers.append(await asyncio.start_server(
+                self.handle_tcp, self.host, self.port, limit=MAX_REQUEST
+            ))
+        if self.http_port is not None:
+            server = await asyncio.start_server(self.handle_http, self.host, self.http_port)
+            self.http_port = server.sockets[0].getsockname()[1]  # resolve port 0
+            self.servers.append(server)
+        self._write_task = asyncio.create_task(self.write_loop())
+
+    async def stop(self):
+        for server in self.servers:
+            server.close()
+            await server.wait_closed()
+        tasks = [*self._handlers, self._write_task]
+        if self._metric_flush is not None:
+            tasks.append(self._metric_flush)  # the flush below covers its points
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.get_running_loop().run_in_executor(self._writer, _flush_metrics)
+        self.socket_path.unlink(missing_ok=True)
+        self._writer.shutdown()
+        self._reader.shutdown()
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await asyncio.gather(*(s.serve_forever() for s in self.servers))
+        finally:
+            await self.stop()
+
+    def run(self):
+        """Serve until interrupted."""
+        try:
+            asyncio.run(self.serve_forever())
+        except KeyboardInterrupt:
+            pass
+
+    async def handle_tcp(self, reader, writer):
+        await self.handle(reader, writer, check_token=True)
+
+    async def handle(self, reader, writer, check_token: bool = False):
+        """Newline-delimited JSON on the Unix socket and the --port listener."""
+        async with self._connection(writer):
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                    if check_token and not self._authorized(request.get("token")):
+                        raise PermissionError("missing or wrong token")
+                    reply = await self.call(request["op"], request.get("args", []))
+                except Exception as e:
+                    reply = _error(e)
+                writer.write(json.dumps(reply).encode() + b"\n")
+                await writer.drain()
+
+    async def handle_http(self, reader, writer):
+        """HTTP/1.1 with keep-alive on the --http-port listener."""
+        async with self._connection(writer):
+            while True:
+                request = await _read_http_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                status, reply = await self.route(method, path, headers, body)
+                data = json.dumps(reply).encode()
+                extra = ""
+                if len(data) >= GZIP_MIN and "gzip" in headers.get("accept-encoding", ""):
+                    data = gzip.compress(data, 1)
+                    extra = "Content-Encoding: gzip\r\n"
+                keep_alive = status < 400 and headers.get("connection", "").lower() != "close"
+                writer.write(
+                    f"HTTP/1.1 {status} {_REASONS[status]}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n{extra}"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+
+    async def route(self, method, path, headers, body):
+        """Answer one HTTP request: (status, JSON reply)."""
+        scheme, _, token = headers.get("authorization", "").partition(" ")
+        if not self._authorized(token if scheme.lower() == "bearer" else None):
+            return 401, {"ok": False, "error": "missing or wrong token"}
+        if method != "POST" or not path.startswith("/v1/"):
+            return 404, {"ok": False, "error": f"no route for {method} {path}"}
+        if body is None:
+            if "transfer-encoding" in headers:
+                return 411, {"ok": False, "error": "send a Content-Length, not a chunked body"}
+            return 413, {"ok": False, "error": f"request body over {MAX_REQUEST} bytes"}
+        try:
+            if headers.get("content-encoding") == "gzip":
+                body = gzip.decompress(body)
+            payload = json.loads(body) if body else []
+        except (OSError, ValueError) as e:
+            return 400, _error(e)
+        op = path[len("/v1/"):]
+        if op != "batch":
+            return 200, await self.call(op, payload)
+        if not isinstance(payload, list):
+            return 400, {"ok": False, "error": "a batch is a list of {op, args} calls"}
+        calls = [(c.get("op"), c.get("args", [])) if isinstance(c, dict) else (None, [])
+                 for c in payload]
+        # metric points are buffered in one hop to the writer thread, in order
+        points = [i for i, (op, _) in enumerate(calls) if op == "log_metric"]
+        logged = asyncio.get_running_loop().run_in_executor(
+            self._writer, _log_metrics, [calls[i][1] for i in points]
+        )
+        # queue every write before awaiting any, so the batch lands in one commit
+        others = [i for i, (op, _) in enumerate(calls) if op != "log_metric"]
+        replies = await asyncio.gather(*(self.call(*calls[i]) for i in others))
+        results = [None] * len(calls)
+        for i, reply in zip(others, replies):
+            results[i] = reply
+        logged = await logged
+        if points:
+            try:
+                await asyncio.get_running_loop().run_in_executor(self._writer, _flush_metrics)
+            except Exception as e:
+                logged = [_error(e) if reply["ok"] else reply for reply in logged]
+        for i, reply in zip(points, logged):
+            results[i] = reply
+        return 200, {"ok": True, "results": results}
+
+    def _authorized(self, token) -> bool:
+        if not self.token:
+            return True
+        return isinstance(token, str) and hmac.compare_digest(token.encode(), self.token.encode())
+
+    async def call(self, op, args):
+        try:
+            return {"ok": True, "result": await self.dispatch(op, args)}
+        except Exception as e:
+            return _error(e)
+
+    @contextlib.asynccontextmanager
+    async def _connection(self, writer):
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        try:
+            yield
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._handlers.discard(task)
+            writer.close()
+
+    async def dispatch(self, op, args):
+        loop = asyncio.get_running_loop()
+        if op in WRITES:
+            done = loop.create_future()
+            await self.queue.put(([WRITES[op], *args], done))
+            return await done
+        if op == "track_usage_batch":
+            # rows from a client's background usage writer (see tracking)
+            done = [loop.create_future() for _ in args[0]]
+            for row, future in zip(args[0], done):
+                await self.queue.put((["usage", *row], future))
+            await asyncio.gather(*done)
+            return len(done)
+        if op == "log_metric":
+            from datatrace.metrics import log_metric
+            result = await loop.run_in_executor(self._writer, log_metric, *args)
+            await self._metrics_written()
+            return result
+        if op == "flush_metrics":
+            return await loop.run_in_executor(self._writer, _flush_metrics)
+        if op == "log_experiments_batch":
+            from datatrace.experiments import log_experiments_batch
+            return await loop.run_in_executor(self._writer, log_experiments_batch, *args)
+        if op in self.reads:
+            return await loop.run_in_executor(self._reader, self.reads[op], *args)
+        raise ValueError(f"unknown op {op!r}")
+
+    async def _metrics_written(self):
+        """Wait until the metric points buffered so far are in the database."""
+        if self._metric_flush is None:
+            self._metric_flush = asyncio.ensure_future(self._flush_metrics_soon())
+        await asyncio.shield(self._metric_flush)
+
+    async def _flush_metrics_soon(self):
+        await asyncio.sleep(METRIC_LINGER)
+        # points buffered from here on wait for the next flush
+        self._metric_flush = None
+        await asyncio.get_running_loop().run_in_executor(self._writer, _flush_metrics)
+
+    async def write_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < WRITE_BATCH and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            try:
+                results = await loop.run_in_executor(self._writer, _commit, [r for r, _ in batch])
+            except Exception as e:
+                logger.exception("write batch of %d failed", len(batch))
+                results = [(False, e)] * len(batch)
+            for (_, done), (ok, value) in zip(batch, results):
+                if done.done():
+                    continue  # the client went away
+                if ok:
+                    done.set_result(value)
+                else:
+                    done.set_exception(value)
+
+
+_REASONS = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found", 411: "Length Required",
+            413: "Payload Too Large"}
+
+
+async def _read_http_request(reader):
+    """(method, path, headers, body) of the next request, or None at EOF."""
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    headers = {}
+    while (header := await reader.readline()).strip():
+        name, _, value = header.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        method, path, _ = line.decode("latin-1").split(" ", 2)
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        return None  # not HTTP; drop the connection
+    if "transfer-encoding" in headers or length > MAX_REQUEST:
+        return method, path, headers, None  # refused by route(); the body stays unread
+    return method, path, headers, await reader.readexactly(length)
+
+
+def _is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False  # a hostname may resolve to anything
+
+
+def _error(e):
+    return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+
+
+def _log_metrics(calls):
+    from datatrace.metrics import log_metric
+
+    replies = []
+    for args in calls:
+        try:
+            replies.append({"ok": True, "result": log_metric(*args)})
+        except Exception as e:
+            replies.append(_error(e))
+    return replies
+
+
+def _flush_metrics():
+    from datatrace.metrics import flush_metrics
+
+    flush_metrics()
+
+
+def _warm_up():
+    from datatrace.db import connect
+
+    connect()
+
+
+def _commit(records):
+    """
+    Write queued records in one transaction. If that fails, write them one
+    by one so a bad record only fails its own request. Returns (ok, result
+    or exception) per record; a dataset's result is its id.
+    """
+    from datatrace.db import transaction
+    from datatrace.eventlog import apply_records
+
+    try:
+        with transaction() as conn:
+            apply_records(conn, records)
+            return [(True, _result(conn, r)) for r in records]
+    except Exception as e:
+        if len(records) == 1:
+            return [(False, e)]
+    results = []
+    for record in records:
+        try:
+            with transaction() as conn:
+                apply_records(conn, [record])
+                results.append((True, _result(conn, record)))
+        except Exception as e:
+            results.append((False, e))
+    return results
+
+
+def _result(conn, record):
+    if record[0] == "dataset":
+        # an existing registration of the same hash wins
+        return conn.execute("SELECT id FROM datasets WHERE hash = ?", (record[3],)).fetchone()[0]
+    return None
+
+
+def _claim_socket(path: Path):
+    """Remove a stale socket file; refuse if another server is listening on it."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if not path.exists():
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(str(path))
+    except OSError:
+        path.unlink()
+    else:
+        raise RuntimeError(f"a datatrace server is already listening on {path}")
+    finally:
+        probe.close()
+
+
+def serve(socket_path: Path = SOCKET_PATH, port: int = None, host: str = "127.0.0.1",
+          http_port: int = None, token: str = None):
+    """Run the tracking server until interrupted."""
+    TrackingServer(socket_path, port, host, http_port, token).run()
@@ -0,0 +1,113 @@
+import csv
+import re
+from pathlib import Path
+
+CHUNK_SIZE = 1024 * 1024
+MAX_HEADER = 1024 * 1024
+# A complete quoted span; escaped quotes ("") just split it into two spans.
+QUOTED = re.compile(rb'"[^"]*"')
+# A line break followed by a blank line; dropping these leaves one break per
+# non-blank line (after \r\n and \r are turned into \n).
+BLANK_LINES = re.compile(rb"\n[ \t]*(?=\n)")
+MAYBE_BLANK = re.compile(rb"\n[\n \t]")  # one cheap scan before the sub
+
+
+class CsvCounter:
+    """
+    Count CSV records and header columns from a stream of byte chunks.
+
+    Records end at \n, \r\n or a bare \r, and lines holding nothing but
+    spaces or tabs are skipped, as pandas reads them; line breaks inside
+    quoted fields do not end a record. Memory use is bounded by the chunk
+    size and MAX_HEADER, whatever the file size. With fast=True every line
+    break ends a record, which is only right for files without quoted line
+    breaks but runs at memchr speed.
+    """
+
+    def __init__(self, fast: bool = False):
+        self.fast = fast
+        self.header = b""
+        self.header_done = False
+        self.records = 0  # non-blank lines ended so far, the header's included
+        self.line_blank = True  # only spaces/tabs since the last line break
+        self.in_quotes = False
+
+    def feed(self, chunk: bytes):
+        if not chunk:
+            return
+        if not self.header_done:
+            self._feed_header(chunk)
+        if self.fast or (b'"' not in chunk and not self.in_quotes):
+            self._count(chunk)
+        else:
+            self._feed_quoted(chunk)
+
+    def _count(self, data: bytes):
+        """Count the non-blank lines ended in data (text outside quoted fields)."""
+        text = data
+        if b"\r" in text:
+            text = text.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+        if MAYBE_BLANK.search(text):
+            text = BLANK_LINES.sub(b"", text)
+        ends = text.count(b"\n")
+        if not ends:
+            self.line_blank = self.line_blank and not text.strip(b" \t")
+            return
+        if self.line_blank and not text[:text.index(b"\n")].strip(b" \t"):
+            ends -= 1  # the line this chunk finishes was blank (or a split \r\n)
+        self.records += ends
+        self.line_blank = not text[text.rindex(b"\n") + 1:].strip(b" \t")
+
+    def _feed_quoted(self, chunk: bytes):
+        if self.in_quotes:
+            close = chunk.find(b'"')
+            if close < 0:
+                return
+            chunk = chunk[close + 1:]
+            self.in_quotes = False
+        # replace complete quoted spans in C (a field, even "", is not
+        # blank), then look for one left open
+        outside = QUOTED.sub(b"_", chunk)
+        open_quote = outside.find(b'"')
+        if open_quote >= 0:
+            self.in_quotes = True
+            outside = outside[:open_quote] + b"_"
+        self._count(outside)
+
+    def _feed_header(self, chunk: bytes):
+        # like pandas, the header is the first non-blank line
+        self.header = (self.header + chunk).lstrip(b" \t\r\n")
+        quotes = 0
+        for i, byte in enumerate(self.header):
+            if byte == 0x22:
+                quotes += 1
+            elif byte in (0x0A, 0x0D) and quotes % 2 == 0:
+                self.header = self.header[:i]
+                self.header_done = True
+                return
+        if len(self.header) > MAX_HEADER:
+            self.header_done = True
+
+    def result(self):
+        """Return (rows, columns), not counting the header as a row."""
+        if not self.header.strip():
+            return 0, 0
+        line = self.header.decode("utf-8", errors="replace")
+        try:
+            columns = len(next(csv.reader([line])))
+        except csv.Error:
+            columns = line.count(",") + 1
+        records = self.records + (not self.line_blank)
+        return max(records - 1, 0), columns
+
+
+def csv_stats(path: Path, fast: bool = False, chunk_size: int = CHUNK_SIZE):
+    """
+    Return (rows, columns) of a CSV file without loading it: columns come
+    from the header, rows from a chunked scan of the rest.
+    """
+    counter = CsvCounter(fast=fast)
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            counter.feed(chunk)
+    return counter.result()
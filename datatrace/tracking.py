@@ -1,24 +1,24 @@
-import sqlite3
-from datatrace.utils import ensure_storage, now
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
 
+from datatrace import client, eventlog
+from datatrace.db import PAGE_SIZE, connect, iter_keyset, transaction
+from datatrace.utils import META_DB, now
+from datatrace.writer import BackgroundWriter
 
-def init_usage_table():
-    """Create the usage table if it does not exist."""
-    db_path = ensure_storage()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS usage (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            dataset_hash TEXT NOT NULL,
-            action TEXT NOT NULL,
-            timestamp TEXT NOT NULL
-        )
-    """)
+# granularity -> (rollup table, length of the ISO timestamp prefix it groups by)
+ROLLUPS = {"hour": ("usage_hourly", 13), "day": ("usage_daily", 10)}
+
+_usage_writer = None
 
-    conn.commit()
-    conn.close()
+
+def init_usage_table():
+    """
+    Create the usage table if it does not exist.
+    The schema is owned by datatrace.migrations; opening the DB applies it.
+    """
+    connect()
 
 
 def track_usage(dataset_hash: str, action: str):
@@ -29,41 +29,163 @@ def track_usage(dataset_hash: str, action: str):
     if not dataset_hash or not action:
         raise ValueError("dataset_hash and action are required!")
 
-    db_path = ensure_storage()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+    row = (dataset_hash, action, now())
+    if eventlog.ENABLED:
+        eventlog.append("usage", *row)
+        return
+    if _usage_writer is not None:
+        # the writer thread sends to the server if one runs; never block here
+        _usage_writer.put(row)
+        return
+    sent, _ = client.try_call("track_usage", *row)
+    if sent:
+        return
+
+    with transaction() as conn:
+        _insert_usage(conn, [row])
+
+
+def configure_usage_writer(async_mode: bool = True, maxsize: int = 10000,
+                           on_full: str = "block", batch_size: int = 500):
+    """
+    Switch track_usage between synchronous inserts and a background writer.
+
+    In async mode track_usage only timestamps the event and queues it; a
+    daemon thread writes queued events in batched transactions. ``on_full``
+    decides whether a full queue blocks the caller or drops the event. Events
+    are flushed at exit and by flush(). Returns the writer (or None).
+    """
+    global _usage_writer
+    if _usage_writer is not None:
+        _usage_writer.close()
+        _usage_writer = None
+    if async_mode:
+        db_path = Path(META_DB).resolve()
+
+        def write_batch(rows):
+            sent, _ = client.try_call("track_usage_batch", rows)
+            if sent:
+                return
+            with transaction(db_path) as conn:
+                _insert_usage(conn, rows)
+
+        _usage_writer = BackgroundWriter(write_batch, maxsize, on_full, batch_size)
+    return _usage_writer
 
-    init_usage_table()  # ensure table exists
 
-    cursor.execute("""
+def flush():
+    """Wait until every queued usage event is in the database."""
+    if _usage_writer is not None:
+        _usage_writer.flush()
+
+
+def _insert_usage(conn, rows):
+    """
+    Insert (dataset_hash, action, timestamp) rows and add them to the hourly
+    and daily rollups; the caller owns the transaction.
+    """
+    conn.executemany("""
         INSERT INTO usage (dataset_hash, action, timestamp)
         VALUES (?, ?, ?)
-    """, (dataset_hash, action, now()))
-
-    conn.commit()
-    conn.close()
+    """, rows)
+    for table, width in ROLLUPS.values():
+        counts = Counter((h, ts[:width], action) for h, action, ts in rows)
+        conn.executemany(f"""
+            INSERT INTO {table} (dataset_hash, bucket, action, count) VALUES (?, ?, ?, ?)
+            ON CONFLICT (dataset_hash, bucket, action) DO UPDATE SET count = count + excluded.count
+        """, [(*key, n) for key, n in counts.items()])
 
 
-def get_usage_records(dataset_hash: str = None):
+def get_usage_records(dataset_hash: str = None, limit: int = None, after: tuple = None):
     """Optional: Get usage records (for future use)."""
-    db_path = ensure_storage()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
     try:
-        if dataset_hash:
-            cursor.execute("""
-                SELECT action, timestamp
-                FROM usage
-                WHERE dataset_hash = ?
-                ORDER BY timestamp DESC
-            """, (dataset_hash,))
-        else:
-            cursor.execute("SELECT dataset_hash, action, timestamp FROM usage ORDER BY timestamp DESC")
-        rows = cursor.fetchall()
-        return [{"hash": r[0], "action": r[1], "timestamp": r[2]} for r in rows] if not dataset_hash else [{"action": r[0], "timestamp": r[1]} for r in rows]
+        return [*iter_usage_records(dataset_hash, limit=limit, after=after)]
     except Exception as e:
         print(f"Error getting usage: {e}")
         return []
-    finally:
-        conn.close()
+
+
+def iter_usage_records(dataset_hash: str = None, limit: int = None, after: tuple = None,
+                       page_size: int = PAGE_SIZE):
+    """
+    Yield usage records newest first, one page per query; queued records are
+    flushed first and any still in the event log are included (with id None).
+    Resume with after=(row["timestamp"], row["id"]).
+    """
+    flush()
+    if dataset_hash:
+        rows = iter_keyset(
+            "SELECT action, timestamp, id FROM usage WHERE dataset_hash = ?", (dataset_hash,),
+            after=after, limit=limit, page_size=page_size,
+        )
+        rows = ({"id": r[2], "action": r[0], "timestamp": r[1]} for r in rows)
+        yield from eventlog.union_tail(
+            "usage", rows, lambda f: {"id": None, "action": f[1], "timestamp": f[2]},
+            after=after, limit=limit, match=lambda f: f[0] == dataset_hash,
+        )
+    else:
+        rows = iter_keyset(
+            "SELECT dataset_hash, action, timestamp, id FROM usage WHERE 1",
+            after=after, limit=limit, page_size=page_size,
+        )
+        rows = ({"id": r[3], "hash": r[0], "action": r[1], "timestamp": r[2]} for r in rows)
+        yield from eventlog.union_tail(
+            "usage", rows, lambda f: {"id": None, "hash": f[0], "action": f[1], "timestamp": f[2]},
+            after=after, limit=limit,
+        )
+
+
+def get_usage_rollup(dataset_hash: str = None, granularity: str = "day", since: str = None):
+    """
+    Usage counts per (bucket, action), newest bucket first, from the rollup
+    tables; these keep covering events that compact_usage removed. Buckets
+    are timestamp prefixes (2024-05-01 or 2024-05-01T13); ``since`` is an
+    ISO date or timestamp.
+    """
+    if granularity not in ROLLUPS:
+        raise ValueError(f"granularity must be one of {sorted(ROLLUPS)}, not {granularity!r}")
+    table, width = ROLLUPS[granularity]
+    flush()
+    conditions, params = ["bucket >= ?"], [(since or "")[:width]]
+    if dataset_hash:
+        conditions.append("dataset_hash = ?")
+        params.append(dataset_hash)
+    rows = connect().execute(f"""
+        SELECT dataset_hash, bucket, action, count FROM {table}
+        WHERE {' AND '.join(conditions)}
+        ORDER BY bucket DESC
+    """, params).fetchall()
+    return [{"hash": r[0], "bucket": r[1], "action": r[2], "count": r[3]} for r in rows]
+
+
+def compact_usage(retention_days: int = 30, hourly_retention_days: int = 90) -> dict:
+    """
+    Enforce the usage retention policy.
+
+    Raw events older than ``retention_days`` are deleted (every event is
+    already counted in the rollups when it is inserted), hourly rollups older
+    than ``hourly_retention_days`` are dropped in favour of the daily ones,
+    and the freed pages are returned to the filesystem with an incremental
+    vacuum. A database created before auto_vacuum was enabled is converted
+    with a one-off VACUUM. Returns the number of rows removed per table.
+    """
+    flush()
+    now_ = datetime.utcnow()
+    raw_cutoff = (now_ - timedelta(days=retention_days)).isoformat()
+    hourly_cutoff = (now_ - timedelta(days=hourly_retention_days)).isoformat()[:13]
+
+    with transaction() as conn:
+        removed = {
+            "usage": conn.execute(
+                "DELETE FROM usage WHERE timestamp < ?", (raw_cutoff,)
+            ).rowcount,
+            "usage_hourly": conn.execute(
+                "DELETE FROM usage_hourly WHERE bucket < ?", (hourly_cutoff,)
+            ).rowcount,
+        }
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:  # 2 = INCREMENTAL
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+    else:
+        conn.execute("PRAGMA incremental_vacuum").fetchall()
+    return removed
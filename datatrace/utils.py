@@ -1,5 +1,4 @@
 import json
-import sqlite3
 from pathlib import Path
 from datetime import datetime
 
@@ -12,44 +11,9 @@ def ensure_storage():
     """
     Ensure datastore folder and SQLite DB exist
     """
-    BASE_DIR.mkdir(exist_ok=True)
-
-    conn = sqlite3.connect(META_DB)
-    cursor = conn.cursor()
-
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS experiments (
-        id TEXT PRIMARY KEY,
-        name TEXT,
-        params TEXT,
-        metrics TEXT,
-        notes TEXT,
-        timestamp TEXT
-    )
-    """)
-
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS datasets (
-        id TEXT PRIMARY KEY,
-        path TEXT,
-        hash TEXT,
-        rows INTEGER,
-        columns INTEGER,
-        timestamp TEXT
-    )
-    """)
-    cursor.execute("""
-CREATE TABLE IF NOT EXISTS experiment_datasets (
-    experiment_id TEXT,
-    dataset_id TEXT,
-    PRIMARY KEY (experiment_id, dataset_id)
-)
-""")
-
-
-    conn.commit()
-    conn.close()
+    from datatrace.db import connect
 
+    connect(META_DB)
     return META_DB
 
 
@@ -1,60 +1,129 @@
-import shutil
-import pandas as pd
+import logging
+from collections import Counter
 from pathlib import Path
-from datatrace.core import file_hash, dataset_hash, version_id
-from datatrace.datasets import log_dataset
-from datatrace.utils import BASE_DIR, ensure_storage
+from datatrace.core import combine_leaves, hash_tree, version_id
+from datatrace.datasets import iter_datasets, log_dataset
+from datatrace.db import PAGE_SIZE, connect
+from datatrace.extractors import extract_stats, has_extractor
+from datatrace.hashcache import HashCache
+from datatrace.ingest import ingest_file
+from datatrace.merkle import build_tree, save_manifest
+from datatrace.objects import TMP_DIR, MissingObjects, adopt, has_object, object_path, put_file
+from datatrace.stats import csv_stats
 
-def add_dataset(path: str) -> str:
-    ensure_storage()
+logger = logging.getLogger(__name__)
+
+def add_dataset(
+    path: str,
+    rehash: bool = False,
+    workers: int = 1,
+    link: bool = False,
+    fast_stats: bool = False,
+) -> str:
+    """
+    Version a file or directory and return its short version id.
+    See store_dataset, which also reports how each blob was stored.
+    """
+    return store_dataset(path, rehash=rehash, workers=workers, link=link, fast_stats=fast_stats)[0]
+
+
+def store_dataset(
+    path: str,
+    rehash: bool = False,
+    workers: int = 1,
+    link: bool = False,
+    fast_stats: bool = False,
+):
+    """
+    Version a file or directory. Returns (short version id, Counter of the
+    clone methods used per file, with None for blobs already stored).
+
+    File contents go to the content-addressed object store, so blobs shared
+    between versions are stored once; a version is a manifest over blobs.
+    Unchanged files are recognised from the hash cache unless rehash=True;
+    directory files are hashed on ``workers`` threads. Blobs are cloned into
+    the store (reflink, copy_file_range, copy); link=True declares the source
+    immutable and also allows hardlinks. Cloned blobs are hashed again, and
+    a file modified since it was hashed raises objects.DigestMismatch. CSV
+    rows are counted while streaming; fast_stats skips quote tracking for
+    files without quoted line breaks.
+    """
     path = Path(path)
+    methods = Counter()
     
     if path.is_file():
-        # Single file (assume CSV for stats)
-        hash_val = file_hash(path)
-        version = version_id(hash_val)
-        stored_path = BASE_DIR / "datasets" / f"{version}_{path.name}"
-        stored_path.parent.mkdir(parents=True, exist_ok=True)
-        shutil.copy(path, stored_path)
-        
-        # Auto-compute rows/columns if CSV
-        if path.suffix == '.csv':
-            df = pd.read_csv(path)
-            rows, columns = df.shape
-        else:
-            rows, columns = 0, 0  # Or handle other formats
-        
-        log_dataset(str(stored_path), rows, columns)
+        st = path.stat()
+        with HashCache(refresh=rehash) as cache:
+            hash_val = cache.lookup(path, st)
+            if hash_val is not None and has_object(hash_val):
+                # Already stored and unchanged since: only read it for stats
+                # if no dataset records them (the blob may belong to a
+                # directory version)
+                rows, columns = 0, 0
+                if path.suffix == ".csv" and not _registered(hash_val):
+                    rows, columns = csv_stats(path, fast=fast_stats)
+            elif link:
+                # Read once for hash and stats, then link instead of copying
+                hash_val, _, rows, columns = ingest_file(path, fast_stats=fast_stats)
+                cache.store(path, st, hash_val)
+                methods[put_file(path, hash_val, allow_hardlink=True)] += 1
+            else:
+                # Single file: hash, copy and CSV rows/columns in one read
+                hash_val, tmp_path, rows, columns = ingest_file(path, TMP_DIR, fast_stats=fast_stats)
+                cache.store(path, st, hash_val)
+                methods["stream" if adopt(tmp_path, hash_val) else None] += 1
+            if path.suffix != ".csv" and has_extractor(path):
+                # Parquet/Arrow/NPY/JSONL stats from headers and footers
+                rows, columns = extract_stats(path)
+        leaves = [(Path(path.name), hash_val, st.st_size)]
     else:
-        # Directory
-        hash_val = dataset_hash(path)
-        version = version_id(hash_val)
-        stored_path = BASE_DIR / "datasets" / version
-        shutil.copytree(path, stored_path, dirs_exist_ok=True)
+        # Directory: leaf digests give both the flat version hash and the
+        # Merkle manifest, so nothing is hashed twice
+        leaves = hash_tree(path, refresh=rehash, workers=workers)
+        hash_val = combine_leaves(leaves)
+        for rel, digest, _ in leaves:
+            methods[put_file(path / rel, digest, allow_hardlink=link)] += 1
         rows, columns = 0, 0  # Dir stats TBD
-    
-    return version
 
-def load_metadata() -> dict:
-    db_path = ensure_storage()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT id, path, hash, rows, columns, timestamp FROM datasets")
-    rows = cursor.fetchall()
-    
-    metadata = {}
-    for row in rows:
-        version = version_id(row[2])  # Use short version from hash
-        metadata[version] = {
-            "id": row[0],
-            "file": row[1],
-            "stored_as": str(BASE_DIR / "datasets" / f"{version}_{Path(row[1]).name}"),
-            "rows": row[3],
-            "columns": row[4],
-            "timestamp": row[5]
+    try:
+        save_manifest(hash_val, build_tree(leaves))
+    except MissingObjects as e:
+        # a concurrent gc removed blobs put_file found already stored
+        sources = {digest: path if path.is_file() else path / rel for rel, digest, _ in leaves}
+        for digest in e.digests:
+            methods[put_file(sources[digest], digest, allow_hardlink=link)] += 1
+        save_manifest(hash_val, build_tree(leaves))
+
+    stored = {k: v for k, v in methods.items() if k is not None}
+    logger.info("stored %d new blobs for %s: %s", sum(stored.values()), path, stored or "all deduplicated")
+    log_dataset(str(path), rows, columns, file_hash=hash_val)
+    return version_id(hash_val), methods
+
+
+def _registered(hash_val: str) -> bool:
+    return connect().execute(
+        "SELECT 1 FROM datasets WHERE hash = ?", (hash_val,)
+    ).fetchone() is not None
+
+
+def load_metadata(limit: int = None, after: tuple = None) -> dict:
+    return dict(iter_metadata(limit=limit, after=after))
+
+
+def iter_metadata(limit: int = None, after: tuple = None, page_size: int = PAGE_SIZE):
+    """
+    Yield (version, info) for stored datasets newest first, one page per query,
+    including any still in the event log (their id is None until compaction).
+    Resume with after=(info["timestamp"], info["id"]) of the last entry seen.
+    """
+    for row in iter_datasets(limit=limit, after=after, page_size=page_size):
+        version = version_id(row["hash"])  # Use short version from hash
+        yield version, {
+            "id": row["id"],
+            "file": row["path"],
+            "stored_as": str(object_path(row["hash"])) if has_object(row["hash"]) else f"manifest {version}",
+            "rows": row["rows"],
+            "columns": row["columns"],
+            "timestamp": row["timestamp"]
         }
-    
-    conn.close()
-    return metadata
 
@@ -1,8 +1,7 @@
 import matplotlib.pyplot as plt
-import json
-import sqlite3
 import pandas as pd
-from datatrace.utils import ensure_storage
+from datatrace.db import connect
+from datatrace.metrics import get_metric
 
 
 def visualize_metric(metric_name: str = "accuracy"):
@@ -10,27 +9,17 @@ def visualize_metric(metric_name: str = "accuracy"):
     Create a line plot of a metric across all experiments.
     Returns a matplotlib Figure object (for Gradio or saving).
     """
-    db_path = ensure_storage()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
     try:
-        cursor.execute("SELECT name, metrics FROM experiments ORDER BY timestamp")
-        rows = cursor.fetchall()
+        # indexed lookup in the normalized metrics table, no JSON decoding
+        values = get_metric(metric_name)
 
-        if not rows:
+        if not values and not connect().execute("SELECT 1 FROM experiments LIMIT 1").fetchone():
             fig, ax = plt.subplots()
             ax.text(0.5, 0.5, "No experiments logged yet", ha='center', va='center')
             return fig
 
-        x = []
-        y = []
-        for row in rows:
-            name = row[0]
-            metrics = json.loads(row[1]) if row[1] else {}
-            if metric_name in metrics:
-                x.append(name)
-                y.append(metrics[metric_name])
+        x = [v["name"] for v in values]
+        y = [v["value"] for v in values]
 
         if not y:
             fig, ax = plt.subplots()
@@ -53,8 +42,6 @@ def visualize_metric(metric_name: str = "accuracy"):
         fig, ax = plt.subplots()
         ax.text(0.5, 0.5, f"Error: {str(e)}", ha='center', va='center')
         return fig
-    finally:
-        conn.close()
 
 
 def plot_experiments():
@@ -62,10 +49,7 @@ def plot_experiments():
     Plot number of experiments over time (bar chart).
     Returns a matplotlib Figure.
     """
-    db_path = ensure_storage()
-    conn = sqlite3.connect(db_path)
-    df = pd.read_sql_query("SELECT timestamp FROM experiments", conn)
-    conn.close()
+    df = pd.read_sql_query("SELECT timestamp FROM experiments", connect())
 
     if df.empty:
         fig, ax = plt.subplots()
@@ -0,0 +1,88 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundWriter:
+    """
+    Buffer rows in a bounded in-memory queue and write them from a daemon
+    thread in batches, one transaction per batch.
+
+    ``write_batch(rows)`` is called on the writer thread. When the queue is
+    full, ``on_full="block"`` makes put() wait for space and ``"drop"``
+    discards the row (counted in ``dropped``). The queue is flushed on
+    flush(), close() and at interpreter exit.
+    """
+
+    def __init__(self, write_batch, maxsize: int = 10000, on_full: str = "block",
+                 batch_size: int = 500):
+        if on_full not in ("block", "drop"):
+            raise ValueError(f"on_full must be 'block' or 'drop', not {on_full!r}")
+        self.write_batch = write_batch
+        self.on_full = on_full
+        self.batch_size = batch_size
+        self.dropped = 0
+        self.errors = 0
+        self._queue = queue.Queue(maxsize)
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def put(self, row) -> bool:
+        """Queue a row. Returns False if it was dropped because the queue is full."""
+        self._ensure_thread()
+        if self.on_full == "drop":
+            try:
+                self._queue.put_nowait(row)
+            except queue.Full:
+                self.dropped += 1
+                return False
+        else:
+            self._queue.put(row)
+        return True
+
+    def flush(self):
+        """Block until every queued row has been written."""
+        if self._thread is not None and self._pid == os.getpid():
+            self._queue.join()
+
+    def close(self):
+        self.flush()
+        atexit.unregister(self.flush)
+
+    def _ensure_thread(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                # first use, or forked: the parent's thread does not exist here
+                if self._pid is not None:
+                    self._queue = queue.Queue(self._queue.maxsize)
+                self._thread = threading.Thread(
+                    target=self._run, name="datatrace-writer", daemon=True
+                )
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def _run(self):
+        q = self._queue
+        while True:
+            rows = [q.get()]
+            while len(rows) < self.batch_size:
+                try:
+                    rows.append(q.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.write_batch(rows)
+            except Exception:
+                self.errors += 1
+                logger.exception("background write of %d rows failed", len(rows))
+            finally:
+                for _ in rows:
+                    q.task_done()
@@ -0,0 +1,7 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def isolated_datastore(tmp_path, monkeypatch):
+    """Run each test against a fresh relative ``datastore/`` directory."""
+    monkeypatch.chdir(tmp_path)
@@ -0,0 +1,25 @@
+import pytest
+
+from datatrace.core import dataset_hash
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "tree"
+    for i in range(40):
+        sub = root / f"d{i % 3}"
+        sub.mkdir(parents=True, exist_ok=True)
+        (sub / f"f{i}.bin").write_bytes(bytes([i]) * (i * 100))
+    return root
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_parallel_dataset_hash_matches_sequential(tree, executor):
+    expected = dataset_hash(tree, use_cache=False)
+    assert dataset_hash(tree, use_cache=False, workers=4, executor=executor) == expected
+
+
+def test_parallel_dataset_hash_with_cache(tree):
+    expected = dataset_hash(tree, use_cache=False)
+    assert dataset_hash(tree, workers=3) == expected
+    assert dataset_hash(tree, workers=3) == expected
@@ -0,0 +1,96 @@
+import os
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from datatrace import db
+from datatrace.experiments import log_experiment
+from datatrace.tracking import track_usage
+
+
+def test_connection_is_reused_per_thread_with_pragmas():
+    conn = db.connect()
+    assert db.connect() is conn
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+
+    other = []
+    t = threading.Thread(target=lambda: other.append(db.connect()))
+    t.start()
+    t.join()
+    assert other[0] is not conn
+
+
+def test_hot_path_runs_no_ddl():
+    conn = db.connect()
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        track_usage("abc123", "train")
+    finally:
+        conn.set_trace_callback(None)
+
+    assert not [s for s in statements if "CREATE" in s.upper()]
+    assert [s for s in statements if s.lstrip().upper().startswith("INSERT")]
+
+
+def hold_write_lock(seconds):
+    """Take the write lock from another connection, releasing it after ``seconds``."""
+    other = sqlite3.connect(db.META_DB, check_same_thread=False)
+    other.execute("BEGIN IMMEDIATE")
+    timer = threading.Timer(seconds, other.rollback)
+    timer.start()
+    return timer
+
+
+def test_transaction_backs_off_until_the_lock_is_free(monkeypatch):
+    monkeypatch.setattr(db, "BEGIN_SPIN_MS", 10)
+    db.connect()
+    hold_write_lock(0.3)
+    start = time.monotonic()
+    with db.transaction() as conn:
+        conn.execute("INSERT INTO usage (dataset_hash, action, timestamp) VALUES ('a', 'b', 'c')")
+    assert time.monotonic() - start >= 0.25
+    assert db.connect().execute("SELECT COUNT(*) FROM usage").fetchone()[0] == 1
+
+
+def test_transaction_gives_up_after_busy_timeout(monkeypatch):
+    monkeypatch.setattr(db, "BEGIN_SPIN_MS", 10)
+    monkeypatch.setattr(db, "BUSY_TIMEOUT", 0.2)
+    db.connect()
+    timer = hold_write_lock(1.0)
+    with pytest.raises(sqlite3.OperationalError):
+        with db.transaction():
+            pass
+    timer.join()
+
+
+def test_transaction_rolls_back_on_error():
+    with pytest.raises(RuntimeError):
+        with db.transaction() as conn:
+            conn.execute("INSERT INTO usage (dataset_hash, action, timestamp) VALUES ('a', 'b', 'c')")
+            raise RuntimeError
+    assert not db.connect().in_transaction
+    assert db.connect().execute("SELECT COUNT(*) FROM usage").fetchone()[0] == 0
+
+
+@pytest.mark.parametrize("lock", [False, True])
+def test_forked_writers_lose_nothing(monkeypatch, lock):
+    monkeypatch.setattr(db, "WRITE_LOCK", lock)
+    db.connect()
+    pids = []
+    for w in range(4):
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                for i in range(25):
+                    log_experiment(f"w{w}-{i}", "d", {}, {"accuracy": i})
+                code = 0
+            finally:
+                os._exit(code)
+        pids.append(pid)
+    assert all(os.waitpid(pid, 0)[1] == 0 for pid in pids)
+    assert db.connect().execute("SELECT COUNT(*) FROM experiments").fetchone()[0] == 100
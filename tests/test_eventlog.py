@@ -0,0 +1,110 @@
+import os
+
+import pytest
+
+from datatrace import eventlog, querycache
+from datatrace.datasets import list_datasets, log_dataset
+from datatrace.db import connect
+from datatrace.experiments import get_experiments, log_experiment
+from datatrace.tracking import get_usage_records, track_usage
+from datatrace.versioning import iter_metadata
+
+
+@pytest.fixture
+def event_log(monkeypatch):
+    monkeypatch.setattr(eventlog, "ENABLED", True)
+    yield
+    eventlog.seal()
+
+
+def count(table):
+    return connect().execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_appends_are_visible_before_and_after_compaction(event_log):
+    log_experiment("a", "d1", {"lr": 0.1}, {"accuracy": 0.9})
+    track_usage("d1", "train")
+    dataset_id = log_dataset("data.csv", 3, 2, file_hash="d1")
+    assert count("experiments") == count("usage") == count("datasets") == 0
+
+    assert [(e["id"], e["name"]) for e in get_experiments()] == [(None, "a")]
+    assert [u["action"] for u in get_usage_records("d1")] == ["train"]
+    assert [d["id"] for d in list_datasets()] == [dataset_id]
+    assert [info["file"] for _, info in iter_metadata()] == ["data.csv"]
+
+    assert eventlog.compact() == 3
+    assert count("experiments") == count("usage") == count("datasets") == 1
+    assert count("leaderboard") == 1
+    assert [e["name"] for e in get_experiments()] == ["a"]
+    assert get_experiments()[0]["id"] is not None
+    assert len(get_usage_records()) == 1
+
+    # the live segment stays until its writer seals it
+    log_experiment("b", "d1", {}, {})
+    assert len(list(eventlog.EVENTS_DIR.iterdir())) == 1
+    eventlog.seal()
+    assert eventlog.compact() == 1
+    assert count("experiments") == 2
+    assert list(eventlog.EVENTS_DIR.iterdir()) == []
+    assert eventlog.compact() == 0
+
+
+def test_forked_writers_are_merged_exactly_once(event_log):
+    connect()
+    pids = []
+    for w in range(4):
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                for i in range(50):
+                    track_usage(f"w{w}", "step")
+                code = 0
+            finally:
+                os._exit(code)  # no atexit: segments are left unsealed
+        pids.append(pid)
+    assert all(os.waitpid(pid, 0)[1] == 0 for pid in pids)
+
+    assert len(get_usage_records()) == 200
+    assert eventlog.compact(batch=30) == 200
+    assert eventlog.compact() == 0
+    assert count("usage") == 200
+    # writers are gone, so their fully merged segments are removed
+    assert list(eventlog.EVENTS_DIR.iterdir()) == []
+
+
+def test_torn_record_waits_for_the_rest(event_log):
+    track_usage("d1", "a")
+    track_usage("d1", "b")
+    eventlog.seal()
+    path, = eventlog.EVENTS_DIR.iterdir()
+    data = path.read_bytes()
+    seal_size = eventlog.HEADER.size + len(b'["seal"]')
+    path.write_bytes(data[:-seal_size - 3])  # second record cut short
+
+    assert eventlog.compact() == 1
+    assert [u["action"] for u in get_usage_records("d1")] == ["a"]
+    path.write_bytes(data)
+    assert eventlog.compact() == 1
+    assert sorted(u["action"] for u in get_usage_records("d1")) == ["a", "b"]
+
+
+def test_torn_record_of_a_dead_writer_is_discarded(event_log):
+    pid = os.fork()
+    if pid == 0:
+        os._exit(0)
+    os.waitpid(pid, 0)
+    track_usage("d1", "a")
+    track_usage("d1", "b")
+    eventlog.seal()
+    path, = eventlog.EVENTS_DIR.iterdir()
+    data = path.read_bytes()
+    seal_size = eventlog.HEADER.size + len(b'["seal"]')
+    path.unlink()
+    dead = eventlog.EVENTS_DIR / f"{pid}-crashed{eventlog.SUFFIX}"
+    dead.write_bytes(data[:-seal_size - 3])  # killed while writing the second record
+
+    assert eventlog.compact() == 1
+    assert [u["action"] for u in get_usage_records("d1")] == ["a"]
+    assert list(eventlog.EVENTS_DIR.iterdir()) == []
+    assert not querycache._has_event_tail()
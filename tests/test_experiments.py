@@ -0,0 +1,52 @@
+import json
+
+import pytest
+from typer.testing import CliRunner
+
+from datatrace.cli import app
+from datatrace.experiments import get_experiments, iter_experiments, log_experiments_batch
+
+
+def test_batch_streams_in_chunks():
+    records = (
+        {"name": f"run{i}", "dataset_hash": "abc", "params": {"lr": i}, "metrics": {"acc": i / 10}}
+        for i in range(25)
+    )
+    assert log_experiments_batch(records, batch_size=7) == 25
+    assert sorted(e["params"]["lr"] for e in get_experiments()) == list(range(25))
+
+
+def test_batch_is_atomic():
+    records = [{"name": "ok", "dataset_hash": "abc"}, {"name": "missing hash"}]
+    with pytest.raises(KeyError):
+        log_experiments_batch(records)
+    assert get_experiments() == []
+
+
+def test_cli_import(tmp_path):
+    runs = tmp_path / "runs.jsonl"
+    runs.write_text("\n".join(
+        json.dumps({"name": f"r{i}", "dataset_hash": "abc", "metrics": {"acc": 0.5}})
+        for i in range(3)
+    ) + "\n\n")
+    result = CliRunner().invoke(app, ["experiment", "import", str(runs)])
+    assert result.exit_code == 0, result.output
+    assert len(get_experiments()) == 3
+
+
+def test_keyset_pages_cover_every_row_once():
+    # equal timestamps exercise the id tie-break
+    log_experiments_batch(
+        {"name": f"run{i}", "dataset_hash": "abc", "timestamp": f"2024-01-0{1 + i % 3}"}
+        for i in range(30)
+    )
+    everything = get_experiments()
+    assert [e["timestamp"] for e in everything] == sorted((e["timestamp"] for e in everything), reverse=True)
+
+    pages, after = [], None
+    while page := get_experiments(limit=7, after=after):
+        pages.extend(page)
+        after = (page[-1]["timestamp"], page[-1]["id"])
+    assert pages == everything
+    assert [e["id"] for e in iter_experiments(page_size=4)] == [e["id"] for e in everything]
+    assert len(list(iter_experiments(limit=9, page_size=4))) == 9
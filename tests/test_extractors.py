@@ -0,0 +1,57 @@
+import json
+
+import numpy as np
+import pytest
+
+from datatrace.extractors import EXTRACTORS, extract_stats, register_extractor
+from datatrace.versioning import add_dataset, load_metadata
+
+
+def test_npy_header_shape(tmp_path):
+    p = tmp_path / "x.npy"
+    np.save(p, np.zeros((7, 3, 2)))
+    assert extract_stats(p) == (7, 6)
+
+
+def test_jsonl_line_count_and_keys(tmp_path):
+    p = tmp_path / "x.jsonl"
+    p.write_text("\n".join(json.dumps({"a": i, "b": i * 2}) for i in range(5)))
+    assert extract_stats(p) == (5, 2)
+
+
+def test_parquet_and_arrow_footers(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    table = pa.table({"a": list(range(100)), "b": ["x"] * 100, "c": [1.0] * 100})
+    pq.write_table(table, tmp_path / "x.parquet", row_group_size=30)
+    with pa.ipc.new_file(tmp_path / "x.arrow", table.schema) as writer:
+        writer.write_table(table, max_chunksize=40)
+
+    assert extract_stats(tmp_path / "x.parquet") == (100, 3)
+    assert extract_stats(tmp_path / "x.arrow") == (100, 3)
+
+    add_dataset(str(tmp_path / "x.parquet"))
+    (info,) = load_metadata().values()
+    assert (info["rows"], info["columns"]) == (100, 3)
+
+
+def test_corrupt_files_give_zero_stats(tmp_path):
+    (tmp_path / "bad.npy").write_bytes(b"not a numpy file at all")
+    (tmp_path / "bad.parquet").write_bytes(b"PAR1 garbage PAR1")
+    (tmp_path / "bad.feather").write_bytes(b"FEA1" + b"\0" * 64)
+    for name in ("bad.npy", "bad.parquet", "bad.feather"):
+        assert extract_stats(tmp_path / name) == (0, 0)
+
+    version = add_dataset(str(tmp_path / "bad.parquet"))
+    info = load_metadata()[version]
+    assert (info["rows"], info["columns"]) == (0, 0)
+
+
+def test_register_custom_extractor(tmp_path, monkeypatch):
+    monkeypatch.setitem(EXTRACTORS, ".tsv", None)
+    register_extractor(".tsv")(lambda path: (1, 4))
+    p = tmp_path / "x.tsv"
+    p.write_text("a\tb\tc\td\n1\t2\t3\t4\n")
+    assert extract_stats(p) == (1, 4)
+    assert extract_stats(tmp_path / "unknown.bin") == (0, 0)
@@ -0,0 +1,31 @@
+import errno
+import os
+
+from datatrace import fastcopy
+from datatrace.fastcopy import clone_file
+
+
+def _unsupported(src, dst):
+    raise OSError(errno.EOPNOTSUPP, "not supported")
+
+
+def test_clone_file_copies_content(tmp_path):
+    src = tmp_path / "src.bin"
+    src.write_bytes(os.urandom(200_000))
+    method = clone_file(src, tmp_path / "dst.bin")
+    assert method in {"reflink", "copy_file_range", "copy"}
+    assert (tmp_path / "dst.bin").read_bytes() == src.read_bytes()
+
+
+def test_clone_file_falls_back_in_order(tmp_path, monkeypatch):
+    monkeypatch.setattr(fastcopy, "_METHODS", [
+        ("reflink", _unsupported),
+        ("hardlink", fastcopy._hardlink),
+        ("copy_file_range", _unsupported),
+    ])
+    src = tmp_path / "src.txt"
+    src.write_text("data")
+
+    assert clone_file(src, tmp_path / "copy.txt") == "copy"
+    assert clone_file(src, tmp_path / "link.txt", allow_hardlink=True) == "hardlink"
+    assert os.path.samefile(src, tmp_path / "link.txt")
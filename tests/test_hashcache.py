@@ -0,0 +1,43 @@
+import os
+
+from datatrace import core
+from datatrace.hashcache import HashCache
+
+
+def _age(path, seconds=60):
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns - seconds * 10**9))
+
+
+def test_unchanged_files_reuse_cached_digest(tmp_path, monkeypatch):
+    data = tmp_path / "data"
+    data.mkdir()
+    for name in ("a.txt", "b.txt"):
+        (data / name).write_text(name)
+        _age(data / name)
+
+    first = core.dataset_hash(data)
+
+    def fail(path):
+        raise AssertionError(f"{path} was rehashed")
+
+    monkeypatch.setattr(core, "_hash_bytes", fail)
+    assert core.dataset_hash(data) == first
+
+
+def test_changed_stat_or_refresh_misses(tmp_path):
+    f = tmp_path / "a.txt"
+    f.write_text("one")
+    _age(f)
+
+    with HashCache() as cache:
+        cache.store(f, f.stat(), "cached")
+    with HashCache() as cache:
+        assert cache.lookup(f) == "cached"
+    with HashCache(refresh=True) as cache:
+        assert cache.lookup(f) is None
+
+    f.write_text("two!")
+    _age(f)
+    with HashCache() as cache:
+        assert cache.lookup(f) is None
@@ -0,0 +1,160 @@
+import asyncio
+import gzip
+import http.client
+import json
+import threading
+import time
+
+import pytest
+
+from datatrace.client import SOCKET_PATH, Client, ServerError
+from datatrace.db import connect
+from datatrace.experiments import get_experiments
+from datatrace.http_client import HTTPClient
+from datatrace.metrics import load_metric
+from datatrace.server import TrackingServer
+
+
+@pytest.fixture
+def server():
+    loop = asyncio.new_event_loop()
+    srv = TrackingServer(http_port=0)
+    loop.run_until_complete(srv.start())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield srv
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.run_until_complete(srv.stop())
+    loop.close()
+
+
+def test_logging_calls_are_coalesced_into_batches(server):
+    with HTTPClient(f"http://127.0.0.1:{server.http_port}", linger=0.05) as client:
+        futures = [client.log_metric("run1", "loss", 1.0 / (i + 1)) for i in range(500)]
+        futures.append(client.log_experiment("a", "d1", {"lr": 0.1}, {"loss": 0.5}))
+        client.flush()
+        assert all(f.done() and f.exception() is None for f in futures)
+        assert client.requests <= 2
+
+        assert [e["name"] for e in client.call("get_experiments")] == ["a"]
+        with pytest.raises(ServerError, match="unknown op"):
+            client.call("drop_everything")
+        bad = client.submit("drop_everything")
+        with pytest.raises(ServerError):
+            bad.result(timeout=5)
+
+    assert [e["name"] for e in get_experiments()] == ["a"]
+    steps, values = load_metric("run1", "loss")
+    assert list(steps) == list(range(500))
+
+
+def test_metric_points_are_written_before_their_reply(server):
+    stored = "SELECT COALESCE(SUM(count), 0) FROM metric_series WHERE run = 'run1'"
+    with HTTPClient(f"http://127.0.0.1:{server.http_port}") as client:
+        for i in range(3):
+            client.log_metric("run1", "loss", float(i)).result(timeout=5)
+            # the server shares this process, so read the table, not the buffer
+            assert connect().execute(stored).fetchone()[0] == i + 1
+        steps, values = client.load_metric("run1", "loss")
+        assert steps == [0, 1, 2] and values == [0.0, 1.0, 2.0]
+        assert client.call("flush_metrics") is None
+
+    direct = Client(SOCKET_PATH, timeout=5)
+    direct.call("log_metric", "run1", "loss", 3.0)
+    assert connect().execute(stored).fetchone()[0] == 4
+    direct.close()
+
+
+def test_flush_waits_for_batches_in_flight(server, monkeypatch):
+    from datatrace import server as server_module
+
+    real = server_module._commit
+    monkeypatch.setattr(server_module, "_commit", lambda records: time.sleep(0.3) or real(records))
+    with HTTPClient(f"http://127.0.0.1:{server.http_port}", linger=0) as client:
+        futures = [client.track_usage("d1", "train") for _ in range(5)]
+        time.sleep(0.05)  # let the sender take the batch
+        client.flush()
+        assert all(f.done() for f in futures)
+        assert len(client.call("get_usage_records", "d1")) == 5
+
+
+def test_keep_alive_gzip_and_batch_endpoint(server):
+    conn = http.client.HTTPConnection("127.0.0.1", server.http_port, timeout=5)
+    calls = [{"op": "track_usage", "args": ["d1", "train", f"2024-01-01T00:00:{i:02d}"]}
+             for i in range(60)] + [{"op": "ping"}]
+    body = gzip.compress(json.dumps(calls).encode())
+    for _ in range(2):  # the same connection serves both requests
+        conn.request("POST", "/v1/batch", body, {
+            "Content-Encoding": "gzip", "Accept-Encoding": "gzip",
+        })
+        response = conn.getresponse()
+        data = response.read()
+        assert response.status == 200
+        reply = json.loads(data)
+        assert reply["ok"] and reply["results"][-1] == {"ok": True, "result": "pong"}
+
+    conn.request("POST", "/v1/get_usage_records", json.dumps(["d1"]), {"Accept-Encoding": "gzip"})
+    response = conn.getresponse()
+    assert response.getheader("Content-Encoding") == "gzip"
+    assert len(json.loads(gzip.decompress(response.read()))["result"]) == 120
+
+    conn.request("GET", "/v1/ping")
+    response = conn.getresponse()
+    assert response.status == 404
+    response.read()
+    conn.close()
+
+
+def test_token_is_required_once_set(monkeypatch):
+    monkeypatch.delenv("DATATRACE_SERVER_TOKEN", raising=False)
+    with pytest.raises(ValueError, match="DATATRACE_SERVER_TOKEN"):
+        TrackingServer(http_port=0, host="0.0.0.0")
+
+    loop = asyncio.new_event_loop()
+    srv = TrackingServer(port=0, http_port=0, host="0.0.0.0", token="s3cret")
+    loop.run_until_complete(srv.start())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        url = f"http://127.0.0.1:{srv.http_port}"
+        for token in (None, "wrong"):
+            with HTTPClient(url, retries=0, token=token) as client:
+                with pytest.raises(ServerError, match="token"):
+                    client.call("ping")
+        with HTTPClient(url, token="s3cret") as client:
+            assert client.call("ping") == "pong"
+
+        tcp_port = srv.servers[1].sockets[0].getsockname()[1]
+        tcp = Client(("127.0.0.1", tcp_port), timeout=5)
+        with pytest.raises(ServerError, match="token"):
+            tcp.call("ping")
+        tcp.close()
+        tcp = Client(("127.0.0.1", tcp_port), timeout=5, token="s3cret")
+        assert tcp.call("ping") == "pong"
+        tcp.close()
+
+        # the Unix socket is guarded by its file permissions alone
+        local = Client(SOCKET_PATH, timeout=5)
+        assert local.call("ping") == "pong"
+        local.close()
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.run_until_complete(srv.stop())
+        loop.close()
+
+
+def test_retries_then_gives_up_when_the_server_is_down(monkeypatch):
+    monkeypatch.setattr("datatrace.http_client.BACKOFF_BASE", 0.001)
+    with HTTPClient("http://127.0.0.1:9", retries=2) as client:
+        with pytest.raises(OSError):
+            client.call("ping")
+        assert client.requests == 3
+        future = client.track_usage("d1", "train")
+        assert isinstance(future.exception(timeout=5), OSError)
+
+
+def test_rejects_non_http_urls():
+    with pytest.raises(ValueError):
+        HTTPClient("unix:///tmp/serve.sock")
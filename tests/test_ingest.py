@@ -0,0 +1,36 @@
+import pytest
+
+from datatrace.ingest import CsvCounter, ingest_file
+from datatrace.core import file_hash
+
+
+def test_ingest_file_hashes_copies_and_counts(tmp_path):
+    src = tmp_path / "data.csv"
+    src.write_text('a,b,c\n1,2,3\n4,"x\ny",6\n')
+
+    digest, tmp_copy, rows, columns = ingest_file(src, tmp_path / "store")
+
+    assert digest == file_hash(src)
+    assert tmp_copy.read_bytes() == src.read_bytes()
+    assert (rows, columns) == (2, 3)
+
+
+def test_temp_copy_is_removed_when_counting_fails(tmp_path, monkeypatch):
+    src = tmp_path / "data.csv"
+    src.write_text("a,b\n1,2\n")
+
+    def fail(self):
+        raise ValueError("bad header")
+
+    monkeypatch.setattr(CsvCounter, "result", fail)
+    with pytest.raises(ValueError):
+        ingest_file(src, tmp_path / "store")
+    assert list((tmp_path / "store").iterdir()) == []
+
+
+def test_csv_counter_across_chunk_boundaries():
+    data = b'id,"note, with comma"\n1,"multi\nline ""quoted"""\n2,plain'
+    counter = CsvCounter()
+    for i in range(0, len(data), 3):
+        counter.feed(data[i:i + 3])
+    assert counter.result() == (2, 2)
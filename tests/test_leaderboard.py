@@ -0,0 +1,51 @@
+from typer.testing import CliRunner
+
+from datatrace import leaderboard
+from datatrace.cli import app
+from datatrace.db import connect
+from datatrace.experiments import log_experiment, log_experiments_batch
+
+
+def best(dataset_hash, key):
+    row = leaderboard.best_run(dataset_hash, key)
+    return row and (connect().execute("SELECT name FROM experiments WHERE id = ?", (row[0],)).fetchone()[0], row[1])
+
+
+def test_leaderboard_tracks_best_run_on_insert():
+    log_experiment("a", "d1", {}, {"accuracy": 0.8, "loss": 0.5})
+    log_experiments_batch([
+        {"name": "b", "dataset_hash": "d1", "metrics": {"accuracy": 0.9, "loss": 0.6}},
+        {"name": "c", "dataset_hash": "d1", "metrics": {"accuracy": 0.9, "loss": 0.4}},
+        {"name": "d", "dataset_hash": "d2", "metrics": {"accuracy": 0.7, "loss": float("nan")}},
+    ])
+
+    assert best("d1", "accuracy") == ("b", 0.9)  # ties keep the earlier run
+    assert best("d1", "loss") == ("c", 0.4)      # loss ranks by min
+    assert best("d2", "accuracy") == ("d", 0.7)
+    assert best("d2", "loss") is None
+    assert [(e["key"], e["dataset_hash"]) for e in leaderboard.get_leaderboard()] == [
+        ("accuracy", "d1"), ("accuracy", "d2"), ("loss", "d1"),
+    ]
+
+    incremental = leaderboard.get_leaderboard()
+    leaderboard.rebuild()
+    assert leaderboard.get_leaderboard() == incremental
+
+
+def test_direction_change_reranks_history():
+    log_experiments_batch([
+        {"name": "a", "dataset_hash": "d1", "metrics": {"latency": 20}},
+        {"name": "b", "dataset_hash": "d1", "metrics": {"latency": 10}},
+    ])
+    assert best("d1", "latency") == ("a", 20)
+    leaderboard.set_direction("latency", "min")
+    assert best("d1", "latency") == ("b", 10)
+    log_experiment("c", "d1", {}, {"latency": 15})
+    assert best("d1", "latency") == ("b", 10)
+
+
+def test_cli_leaderboard():
+    log_experiment("a", "d1", {}, {"accuracy": 0.8})
+    result = CliRunner().invoke(app, ["leaderboard", "--metric", "accuracy", "--rebuild"])
+    assert result.exit_code == 0, result.output
+    assert "accuracy (max)" in result.output and "0.8" in result.output
@@ -0,0 +1,34 @@
+from datatrace.core import dataset_hash
+from datatrace.merkle import diff_versions
+from datatrace.versioning import add_dataset
+
+
+def _write(root, files):
+    for rel, text in files.items():
+        p = root / rel
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_text(text)
+
+
+def test_directory_version_matches_flat_hash(tmp_path):
+    src = tmp_path / "src"
+    _write(src, {"a.txt": "a", "sub/b.txt": "b"})
+    assert add_dataset(str(src)) == dataset_hash(src, use_cache=False)[:8]
+
+
+def test_diff_walks_only_changed_nodes(tmp_path):
+    src = tmp_path / "src"
+    _write(src, {"a.txt": "a", "same/x.txt": "x", "sub/b.txt": "b", "sub/c.txt": "c"})
+    v1 = add_dataset(str(src))
+
+    (src / "sub" / "b.txt").write_text("b2")
+    (src / "sub" / "c.txt").unlink()
+    _write(src, {"new/d.txt": "d"})
+    v2 = add_dataset(str(src))
+
+    assert diff_versions(v1, v2) == [
+        ("added", "new"),
+        ("modified", "sub/b.txt"),
+        ("removed", "sub/c.txt"),
+    ]
+    assert diff_versions(v1, v1) == []
@@ -0,0 +1,88 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+from datatrace import db, metrics
+from datatrace.experiments import log_experiment, log_experiments_batch
+from datatrace.metrics import aggregate_metric, flush_metrics, get_metric, load_metric, log_metric
+from datatrace.utils import META_DB
+
+
+def test_metrics_are_normalized_on_insert():
+    log_experiment("a", "d1", {}, {"f1": 0.5, "note": "n/a"})
+    log_experiments_batch([
+        {"name": "b", "dataset_hash": "d1", "metrics": {"f1": 0.7}},
+        {"name": "c", "dataset_hash": "d2", "metrics": {"f1": "0.6"}},
+    ])
+
+    assert [(m["name"], m["value"]) for m in get_metric("f1")] == [("a", 0.5), ("b", 0.7), ("c", 0.6)]
+    assert get_metric("note") == []
+    assert aggregate_metric("f1", "max") == {"d1": 0.7, "d2": 0.6}
+    assert aggregate_metric("f1", "count") == {"d1": 2, "d2": 1}
+
+
+def test_existing_json_metrics_are_backfilled():
+    META_DB.parent.mkdir()
+    legacy = sqlite3.connect(META_DB)
+    legacy.execute("""
+        CREATE TABLE experiments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL,
+            dataset_hash TEXT NOT NULL, params TEXT, metrics TEXT, timestamp TEXT NOT NULL
+        )
+    """)
+    legacy.execute(
+        "INSERT INTO experiments (name, dataset_hash, params, metrics, timestamp)"
+        " VALUES ('old', 'd1', '{}', '{\"accuracy\": 0.8}', '2024-01-01')"
+    )
+    legacy.commit()
+    legacy.close()
+
+    db.connect()
+    assert [m["value"] for m in get_metric("accuracy")] == [0.8]
+
+
+def test_metric_series_round_trip(monkeypatch):
+    monkeypatch.setattr(metrics, "SERIES_CHUNK", 100)
+    for i in range(250):
+        log_metric("run1", "loss", 1.0 / (i + 1))
+    log_metric("run1", "lr", 0.1, step=10)
+    log_metric("run1", "lr", 0.05, step=20)
+
+    # two full chunks are on disk before any flush
+    chunks = db.connect().execute("SELECT count, steps FROM metric_series WHERE key = 'loss'").fetchall()
+    assert chunks == [(100, None), (100, None)]
+
+    steps, values, times = load_metric("run1", "loss", with_timestamps=True)
+    assert steps.tolist() == list(range(250))
+    assert values[0] == 1.0 and abs(values[-1] - 1 / 250) < 1e-6
+    assert len(times) == 250 and (times[1:] >= times[:-1] - 1e-3).all()
+
+    steps, values = load_metric("run1", "lr")
+    assert steps.tolist() == [10, 20]
+    assert values.tolist() == [np.float32(0.1), np.float32(0.05)]
+
+
+def test_metric_series_continues_after_restart():
+    log_metric(7, "loss", 0.5)
+    log_metric(7, "loss", 0.4)
+    flush_metrics()
+    metrics._series_buffers.clear()  # as in a new process
+
+    log_metric(7, "loss", 0.3)
+    steps, _ = load_metric(7, "loss")
+    assert steps.tolist() == [0, 1, 2]
+
+
+def test_metric_chunks_never_replace_each_other():
+    log_metric("run1", "loss", 0.5)
+    log_metric("run1", "acc", 0.1)
+    flush_metrics()
+    metrics._series_buffers.clear()  # another process logging the same run
+
+    log_metric("run1", "loss", 0.9, step=0)
+    log_metric("run1", "acc", 0.2)
+    with pytest.raises(ValueError, match="already has a chunk from step 0"):
+        flush_metrics()
+    assert load_metric("run1", "loss")[1].tolist() == [0.5]
+    assert load_metric("run1", "acc")[0].tolist() == [0, 1]
@@ -0,0 +1,63 @@
+import sqlite3
+
+from datatrace import db
+from datatrace.experiments import get_experiments, log_experiment
+from datatrace.migrations import SCHEMA_VERSION, table_columns, user_version
+from datatrace.utils import META_DB
+
+
+def test_legacy_store_is_migrated_in_place():
+    META_DB.parent.mkdir()
+    legacy = sqlite3.connect(META_DB)
+    legacy.execute("""
+        CREATE TABLE experiments (
+            id TEXT PRIMARY KEY, name TEXT, params TEXT,
+            metrics TEXT, notes TEXT, timestamp TEXT
+        )
+    """)
+    legacy.execute(
+        "INSERT INTO experiments VALUES ('e1', 'old', '{}', '{\"acc\": 0.5}', 'n', '2024-01-01')"
+    )
+    legacy.commit()
+    legacy.close()
+
+    conn = db.connect()
+    assert user_version(conn) == SCHEMA_VERSION
+    assert table_columns(conn, "experiments")["id"] == "INTEGER"
+
+    log_experiment("new", "abc", {"lr": 0.1}, {"acc": 0.9})
+    names = {e["name"]: e for e in get_experiments()}
+    assert names["old"]["metrics"] == {"acc": 0.5}
+    assert names["new"]["dataset_hash"] == "abc"
+
+
+def test_legacy_experiment_links_follow_the_new_ids():
+    META_DB.parent.mkdir()
+    legacy = sqlite3.connect(META_DB)
+    legacy.execute("CREATE TABLE experiments (id TEXT PRIMARY KEY, name TEXT, timestamp TEXT)")
+    legacy.execute("""
+        CREATE TABLE experiment_datasets (
+            experiment_id TEXT, dataset_id TEXT, PRIMARY KEY (experiment_id, dataset_id)
+        )
+    """)
+    legacy.executemany("INSERT INTO experiments VALUES (?, ?, '2024-01-01')",
+                       [("2", "b"), ("run-a", "a"), ("1", "c")])
+    legacy.executemany("INSERT INTO experiment_datasets VALUES (?, ?)",
+                       [("run-a", "d1"), ("1", "d2"), ("2", "d2"), ("gone", "d3")])
+    legacy.commit()
+    legacy.close()
+
+    conn = db.connect()
+    ids = dict(conn.execute("SELECT name, id FROM experiments"))
+    links = conn.execute("""
+        SELECT e.name, l.dataset_id FROM experiment_datasets l
+        LEFT JOIN experiments e ON e.id = l.experiment_id
+    """).fetchall()
+    assert sorted(ids.values()) == [1, 2, 3]
+    assert sorted(links, key=str) == sorted(
+        [("a", "d1"), ("c", "d2"), ("b", "d2"), (None, "d3")], key=str
+    )
+
+
+def test_fresh_store_starts_at_current_version():
+    assert user_version(db.connect()) == SCHEMA_VERSION
@@ -0,0 +1,132 @@
+import os
+
+from datatrace.objects import OBJECTS_DIR, TMP_DIR, checkout, gc, release_version
+from datatrace.merkle import resolve_version
+from datatrace.versioning import add_dataset
+
+
+def _blobs():
+    return sorted(p for p in OBJECTS_DIR.glob("??/*"))
+
+
+def test_versions_share_unchanged_blobs(tmp_path):
+    src = tmp_path / "src"
+    src.mkdir()
+    for i in range(10):
+        (src / f"f{i}.txt").write_text(f"row {i}\n")
+    add_dataset(str(src))
+    assert len(_blobs()) == 10
+
+    (src / "f0.txt").write_text("changed\n")
+    add_dataset(str(src))
+    assert len(_blobs()) == 11
+
+
+def test_checkout_roundtrip_and_gc(tmp_path):
+    src = tmp_path / "src"
+    (src / "sub").mkdir(parents=True)
+    (src / "a.csv").write_text("a,b\n1,2\n")
+    (src / "sub" / "b.txt").write_text("b")
+    version = add_dataset(str(src))
+
+    out = tmp_path / "out"
+    assert sum(checkout(version, out).values()) == 2
+    assert (out / "a.csv").read_text() == "a,b\n1,2\n"
+    assert (out / "sub" / "b.txt").read_text() == "b"
+
+    release_version(resolve_version(version))
+    assert gc() == (2, 9)
+    assert _blobs() == []
+
+
+def test_gc_racing_add_dataset_cannot_drop_a_referenced_blob(tmp_path, monkeypatch):
+    from datatrace import versioning
+
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "a.txt").write_text("a")
+    version = add_dataset(str(src))
+    release_version(resolve_version(version))  # blob now unreferenced
+
+    real_put = versioning.put_file
+    swept = []
+
+    def put_then_gc(*args, **kwargs):
+        method = real_put(*args, **kwargs)
+        if not swept:
+            # runs between put_file finding the blob and save_manifest
+            swept.append(gc())
+        return method
+
+    monkeypatch.setattr(versioning, "put_file", put_then_gc)
+    version = add_dataset(str(src))
+    assert swept == [(1, 1)]
+    out = tmp_path / "out"
+    assert sum(checkout(version, out).values()) == 1
+    assert (out / "a.txt").read_text() == "a"
+
+
+def test_cli_add_reports_how_blobs_were_stored(tmp_path):
+    from typer.testing import CliRunner
+    from datatrace.cli import app
+
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "a.txt").write_text("a")
+    result = CliRunner().invoke(app, ["add", str(src), "--link"])
+    assert result.exit_code == 0
+    assert any(m in result.output for m in ("reflink", "hardlink", "copy_file_range", "copy"))
+    result = CliRunner().invoke(app, ["add", str(src)])
+    assert "1 already stored" in result.output
+
+
+def test_link_hardlinks_when_reflinks_are_unavailable(tmp_path, monkeypatch):
+    import errno
+    from typer.testing import CliRunner
+    from datatrace import fastcopy
+    from datatrace.cli import app
+
+    def no_reflink(src, dst):
+        raise OSError(errno.EOPNOTSUPP, "not supported")
+
+    monkeypatch.setattr(fastcopy, "_METHODS", [("reflink", no_reflink), *fastcopy._METHODS[1:]])
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "a.txt").write_text("a")
+    result = CliRunner().invoke(app, ["add", str(src), "--link"])
+    assert result.exit_code == 0 and "1 hardlink" in result.output
+    blob, = _blobs()
+    assert os.path.samefile(blob, src / "a.txt")
+
+    version = add_dataset(str(src))
+    out = tmp_path / "out"
+    result = CliRunner().invoke(app, ["checkout", version, str(out), "--link"])
+    assert result.exit_code == 0 and "1 hardlink" in result.output
+    assert os.path.samefile(blob, out / "a.txt")
+
+
+def test_file_changed_after_hashing_is_not_stored(tmp_path, monkeypatch):
+    import pytest
+    from datatrace import versioning
+    from datatrace.core import file_hash
+    from datatrace.objects import DigestMismatch, has_object
+
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "a.txt").write_text("before")
+    real_hash_tree = versioning.hash_tree
+
+    def hash_then_edit(*args, **kwargs):
+        leaves = real_hash_tree(*args, **kwargs)
+        (src / "a.txt").write_text("after!")  # a writer between hashing and copying
+        return leaves
+
+    monkeypatch.setattr(versioning, "hash_tree", hash_then_edit)
+    with pytest.raises(DigestMismatch):
+        add_dataset(str(src), link=True)
+    assert _blobs() == []
+    assert not any(TMP_DIR.iterdir())
+
+    monkeypatch.setattr(versioning, "hash_tree", real_hash_tree)
+    add_dataset(str(src))
+    assert has_object(file_hash(src / "a.txt", use_cache=False))
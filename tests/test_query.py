@@ -0,0 +1,47 @@
+import pytest
+from typer.testing import CliRunner
+
+from datatrace.cli import app
+from datatrace.experiments import log_experiments_batch
+from datatrace.query import query_runs
+
+
+@pytest.fixture
+def runs():
+    log_experiments_batch([
+        {"name": "a", "dataset_hash": "d1", "params": {"lr": 0.1, "opt": {"name": "adam"}}, "metrics": {"accuracy": 0.7}},
+        {"name": "b", "dataset_hash": "d1", "params": {"lr": 0.001}, "metrics": {"accuracy": 0.9}},
+        {"name": "c", "dataset_hash": "d2", "params": {"lr": 0.005}, "metrics": {"accuracy": 0.8}},
+        {"name": "d", "dataset_hash": "d1", "params": {"lr": 0.002}},
+    ])
+
+
+def names(found):
+    return [r["name"] for r in found]
+
+
+def test_filters_and_ordering(runs):
+    assert names(query_runs("params.lr<0.01", "metrics.accuracy")) == ["b", "c"]
+    assert names(query_runs("params.lr<0.01 and dataset=d1", "params.lr asc")) == ["b", "d"]
+    assert names(query_runs("metrics.accuracy>=0.8", "metrics.accuracy asc")) == ["c", "b"]
+    assert names(query_runs("params.opt.name='adam'")) == ["a"]
+    assert names(query_runs("name!=a", "name asc", limit=2)) == ["b", "c"]
+    # runs without the sort metric are left out
+    assert names(query_runs(order_by="metrics.accuracy")) == ["b", "c", "a"]
+
+
+@pytest.mark.parametrize("where", ["foo<1", "params.lr ~ 1", "metrics.accuracy>high", "params.lr<", "name = "])
+def test_bad_filters_raise(runs, where):
+    with pytest.raises(ValueError):
+        query_runs(where)
+
+
+def test_cli_rejects_an_empty_value(runs):
+    result = CliRunner().invoke(app, ["runs", "--where", "params.lr<"])
+    assert result.exit_code != 0 and "Cannot parse condition" in result.output
+
+
+def test_cli_runs(runs):
+    result = CliRunner().invoke(app, ["runs", "--where", "params.lr<0.01", "--order-by", "metrics.accuracy", "--limit", "1"])
+    assert result.exit_code == 0, result.output
+    assert " b " in result.output and " c " not in result.output
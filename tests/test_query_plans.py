@@ -0,0 +1,116 @@
+import re
+
+import pytest
+
+from datatrace import db, eventlog
+from datatrace.datasets import list_datasets
+from datatrace.leaderboard import best_run, get_leaderboard
+from datatrace.experiments import get_experiments, log_experiment
+from datatrace.merkle import diff_versions, resolve_version
+from datatrace.metrics import aggregate_metric, get_metric, load_metric, log_metric
+from datatrace.objects import checkout, gc, release_version
+from datatrace.query import query_runs
+from datatrace.tracking import compact_usage, get_usage_records, get_usage_rollup, track_usage
+from datatrace.versioning import add_dataset, load_metadata
+
+# Queries that read a whole table on purpose (full listings, gc sweeps)
+FULL_SCANS = {
+    "SELECT digest FROM objects WHERE refcount > 0",
+    "SELECT name, position, sealed FROM event_segments",
+    "SELECT l.key, COALESCE(d.direction, 'max'), l.dataset_hash, l.experiment_id, e.name, l.value"
+    " FROM leaderboard l JOIN experiments e ON e.id = l.experiment_id"
+    " LEFT JOIN leaderboard_metrics d ON d.key = l.key ORDER BY l.key, l.dataset_hash",
+}
+BAD_PLAN = re.compile(r"^SCAN \w+$|USE TEMP B-TREE FOR ORDER BY")
+
+
+def _exercise_public_api(tmp_path):
+    src = tmp_path / "src"
+    (src / "sub").mkdir(parents=True)
+    (src / "a.csv").write_text("a,b\n1,2\n")
+    (src / "sub" / "b.txt").write_text("b")
+    v1 = add_dataset(str(src))
+    (src / "sub" / "b.txt").write_text("b2")
+    v2 = add_dataset(str(src))
+    add_dataset(str(src / "a.csv"))
+
+    list_datasets()
+    list_datasets(limit=1, after=("9999", ""))
+    load_metadata()
+    diff_versions(v1, v2)
+    checkout(v2, tmp_path / "out")
+
+    log_experiment("run", resolve_version(v1), {"lr": 0.1}, {"accuracy": 0.9})
+    get_experiments()
+    get_experiments(limit=1, after=("9999", 0))
+    get_metric("accuracy")
+    aggregate_metric("accuracy", "max")
+    query_runs("metrics.accuracy>0.5, dataset=x", limit=5)
+    query_runs("name=run", "metrics.accuracy", limit=5)
+    get_leaderboard()
+    get_leaderboard("accuracy")
+    best_run(resolve_version(v1), "accuracy")
+    log_metric("run", "loss", 0.5)
+    load_metric("run", "loss")
+    track_usage(resolve_version(v1), "train")
+    get_usage_records()
+    get_usage_records(resolve_version(v1))
+    get_usage_records(resolve_version(v1), limit=1, after=("9999", 0))
+    get_usage_records(limit=1, after=("9999", 0))
+    get_usage_rollup()
+    get_usage_rollup(resolve_version(v1), "hour", since="2020-01-01")
+    compact_usage()
+
+    eventlog.enable()
+    try:
+        track_usage(resolve_version(v1), "train")
+        get_usage_records()
+        eventlog.seal()
+        eventlog.compact()
+    finally:
+        eventlog.enable(False)
+
+    release_version(resolve_version(v1))
+    gc()
+
+    matplotlib = pytest.importorskip("matplotlib")
+    matplotlib.use("Agg")
+    from datatrace.visualize import plot_experiments, visualize_metric
+
+    visualize_metric("accuracy")
+    plot_experiments()
+
+
+def test_every_query_uses_an_index(tmp_path):
+    conn = db.connect()
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        _exercise_public_api(tmp_path)
+    finally:
+        conn.set_trace_callback(None)
+
+    queries = {
+        " ".join(s.split()) for s in statements
+        if s.lstrip().split(None, 1)[0].upper() in ("SELECT", "UPDATE", "DELETE")
+    }
+    assert queries
+
+    bad = {}
+    for sql in queries - FULL_SCANS:
+        plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+        if any(BAD_PLAN.search(step) for step in plan):
+            bad[sql] = plan
+    assert not bad, bad
+
+
+@pytest.mark.parametrize("sql", sorted(FULL_SCANS))
+def test_full_scan_allowlist_is_still_shipped(sql, tmp_path):
+    conn = db.connect()
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        _exercise_public_api(tmp_path)
+    finally:
+        conn.set_trace_callback(None)
+    assert sql in {" ".join(s.split()) for s in statements}
@@ -0,0 +1,93 @@
+import os
+
+import pytest
+
+from datatrace import eventlog, querycache
+from datatrace.datasets import list_datasets, log_dataset
+from datatrace.db import close_all, connect
+from datatrace.experiments import get_experiments, log_experiment
+from datatrace.metrics import get_metric
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    querycache.clear()
+    yield
+    querycache.clear()
+
+
+def queries(func, *args):
+    """Statements executed on this thread's connection while running func."""
+    seen = []
+    connect().set_trace_callback(seen.append)
+    try:
+        result = func(*args)
+    finally:
+        connect().set_trace_callback(None)
+    return result, seen
+
+
+def test_repeated_reads_are_served_until_a_commit():
+    log_experiment("a", "d1", {"lr": 0.1}, {"accuracy": 0.9})
+    first = get_experiments()
+    again, seen = queries(get_experiments)
+    assert again == first and seen == []
+    assert querycache.cache_info()["hits"] == 1
+
+    again.append("scratch")  # callers get their own list
+    assert len(get_experiments()) == 1
+
+    log_experiment("b", "d1", {}, {"accuracy": 0.8})
+    assert [e["name"] for e in get_experiments()] == ["b", "a"]
+    assert [m["value"] for m in get_metric("accuracy")] == [0.9, 0.8]
+
+    # arguments are part of the key
+    assert [e["name"] for e in get_experiments(limit=1)] == ["b"]
+    dataset_id = log_dataset("data.csv", 3, 2, file_hash="d1")
+    assert [d["id"] for d in list_datasets()] == [dataset_id]
+    assert list_datasets(after=("0", "")) == []
+
+
+def test_commits_from_another_process_invalidate():
+    log_experiment("a", "d1", {}, {})
+    assert len(get_experiments()) == 1
+    close_all()
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            log_experiment("b", "d1", {}, {})
+            code = 0
+        finally:
+            os._exit(code)
+    assert os.waitpid(pid, 0)[1] == 0
+    assert [e["name"] for e in get_experiments()] == ["b", "a"]
+
+
+def test_evicts_least_recently_used_by_size(monkeypatch):
+    for i in range(20):
+        log_experiment(f"run{i}", "d1", {}, {f"m{i}": float(i)})
+    get_metric("m0")
+    entry = querycache.cache_info()["bytes"]
+    monkeypatch.setattr(querycache, "MAX_BYTES", entry * 4)
+
+    for i in range(1, 8):
+        get_metric(f"m{i}")
+        get_metric("m0")  # keep m0 recently used
+    info = querycache.cache_info()
+    assert info["entries"] == 4 and info["bytes"] <= entry * 4
+    _, seen = queries(get_metric, "m0")
+    assert seen == []
+    _, seen = queries(get_metric, "m1")
+    assert seen != []
+
+
+def test_bypassed_while_the_event_log_has_records(monkeypatch):
+    monkeypatch.setattr(eventlog, "ENABLED", True)
+    log_experiment("a", "d1", {}, {})
+    assert [e["name"] for e in get_experiments()] == ["a"]
+    log_experiment("b", "d1", {}, {})
+    assert [e["name"] for e in get_experiments()] == ["b", "a"]
+    eventlog.seal()
+    eventlog.compact()
+    assert [e["name"] for e in get_experiments()] == ["b", "a"]
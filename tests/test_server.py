@@ -0,0 +1,134 @@
+import asyncio
+import socket
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from datatrace import client
+from datatrace.client import SOCKET_PATH, Client, ServerError
+from datatrace.datasets import list_datasets, log_dataset
+from datatrace.db import connect
+from datatrace.experiments import get_experiments, log_experiment
+from datatrace.server import TrackingServer
+from datatrace.tracking import get_usage_records, track_usage
+from datatrace.utils import META_DB
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(client, "_unavailable_until", 0.0)
+
+
+@pytest.fixture
+def server():
+    loop = asyncio.new_event_loop()
+    srv = TrackingServer()
+    loop.run_until_complete(srv.start())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield srv
+    client._drop()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.run_until_complete(srv.stop())
+    loop.close()
+
+
+def test_writes_go_through_the_server(server, monkeypatch):
+    calls = []
+    real = client.try_call
+    monkeypatch.setattr(client, "try_call", lambda *a: calls.append(a[0]) or real(*a))
+
+    log_experiment("a", "d1", {"lr": 0.1}, {"accuracy": 0.9})
+    track_usage("d1", "train")
+    dataset_id = log_dataset("data.csv", 3, 2, file_hash="d1")
+    assert log_dataset("other.csv", 3, 2, file_hash="d1") == dataset_id
+
+    assert calls == ["log_experiment", "track_usage", "log_dataset", "log_dataset"]
+    assert [e["name"] for e in get_experiments()] == ["a"]
+    assert [u["action"] for u in get_usage_records("d1")] == ["train"]
+    assert [d["id"] for d in list_datasets()] == [dataset_id]
+    assert connect().execute("SELECT COUNT(*) FROM leaderboard").fetchone()[0] == 1
+
+
+def test_async_usage_writer_never_blocks_on_the_server(server, monkeypatch):
+    from datatrace import tracking
+
+    calls = []
+    real = client.try_call
+
+    def record(op, *args):
+        calls.append((op, threading.current_thread().name))
+        return real(op, *args)
+
+    monkeypatch.setattr(client, "try_call", record)
+    tracking.configure_usage_writer(async_mode=True)
+    try:
+        for _ in range(5):
+            track_usage("d1", "train")
+        tracking.flush()
+    finally:
+        tracking.configure_usage_writer(async_mode=False)
+    assert calls and all(
+        op == "track_usage_batch" and name == "datatrace-writer" for op, name in calls
+    )
+    assert len(get_usage_records("d1")) == 5
+
+
+def test_reads_and_errors(server):
+    c = Client(SOCKET_PATH, timeout=5)
+    assert c.call("ping") == "pong"
+    c.call("log_experiment", "a", "d1", {}, {"loss": 0.5}, "2024-01-01T00:00:00")
+    assert [r["name"] for r in c.call("query_runs", "metrics.loss < 1")] == ["a"]
+    with pytest.raises(ServerError, match="unknown op"):
+        c.call("drop_everything")
+    assert c.call("ping") == "pong"  # the connection survives an error
+    c.close()
+
+
+def test_falls_back_to_direct_writes_without_a_server():
+    assert not SOCKET_PATH.exists()
+    log_experiment("a", "d1", {}, {})
+    assert [e["name"] for e in get_experiments()] == ["a"]
+
+    # a stale socket file left by a crashed server
+    SOCKET_PATH.parent.mkdir(parents=True, exist_ok=True)
+    SOCKET_PATH.touch()
+    track_usage("d1", "train")
+    assert len(get_usage_records("d1")) == 1
+
+
+def test_never_writes_directly_once_the_server_has_the_request(monkeypatch):
+    monkeypatch.setattr(client, "TIMEOUT", 0.2)
+    SOCKET_PATH.parent.mkdir(parents=True, exist_ok=True)
+    wedged = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    wedged.bind(str(SOCKET_PATH))
+    wedged.listen()  # accepts connections but never replies
+    try:
+        started = time.monotonic()
+        with pytest.raises(ConnectionError, match="may have run it"):
+            log_experiment("once", "d1", {}, {})
+        assert time.monotonic() - started < 2
+        assert get_experiments() == []
+
+        # the next call backs off and writes directly without sending
+        log_experiment("direct", "d1", {}, {})
+        assert [e["name"] for e in get_experiments()] == ["direct"]
+    finally:
+        client._drop()
+        wedged.close()
+
+
+def test_busy_database_does_not_duplicate_server_writes(server, monkeypatch):
+    monkeypatch.setattr(client, "TIMEOUT", 5.0)
+    blocker = sqlite3.connect(META_DB, isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+    thread = threading.Thread(target=log_experiment, args=("once", "d1", {}, {}))
+    thread.start()
+    time.sleep(1.0)
+    blocker.execute("COMMIT")
+    blocker.close()
+    thread.join()
+    assert [e["name"] for e in get_experiments()] == ["once"]
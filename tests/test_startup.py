@@ -0,0 +1,47 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+# Wall-clock budget for a cold `datatrace list`, overridable for slow CI boxes
+STARTUP_BUDGET = float(os.environ.get("DATATRACE_STARTUP_BUDGET", "1.0"))
+HEAVY_MODULES = ("pandas", "matplotlib", "numpy", "multiprocessing")
+
+
+def _python(*args):
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    return subprocess.run([sys.executable, *args], env=env, capture_output=True, text=True, check=True)
+
+
+def test_import_does_not_load_heavy_modules():
+    code = (
+        "import sys, datatrace, datatrace.cli; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    assert _python("-c", code).stdout.strip() == ""
+
+
+def test_lazy_attributes_resolve():
+    out = _python("-c", "import datatrace; print(datatrace.version_id('abcdef0123'))").stdout
+    assert out.strip() == "abcdef01"
+
+
+def test_every_public_name_resolves():
+    code = (
+        "import datatrace; "
+        "missing = [n for n in datatrace.__all__ if not hasattr(datatrace, n)]; "
+        "print(missing, datatrace.log_metric.__module__, datatrace.query_runs.__module__)"
+    )
+    assert _python("-c", code).stdout.split() == ["[]", "datatrace.metrics", "datatrace.query"]
+
+
+def test_list_startup_budget():
+    times = []
+    for _ in range(3):
+        start = time.perf_counter()
+        _python("-m", "datatrace.cli", "list")
+        times.append(time.perf_counter() - start)
+    assert statistics.median(times) < STARTUP_BUDGET
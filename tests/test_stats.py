@@ -0,0 +1,49 @@
+from datatrace.stats import csv_stats
+
+
+def test_csv_stats_respects_quoted_newlines(tmp_path):
+    p = tmp_path / "quoted.csv"
+    p.write_text('id,text,score\n1,"line one\nline two",0.5\n2,"say ""hi""\n",0.7\n3,plain,0.9')
+
+    assert csv_stats(p, chunk_size=4) == (3, 3)
+    # newline counting is only exact when no field spans lines
+    assert csv_stats(p, fast=True) == (5, 3)
+
+
+def test_csv_stats_empty_and_header_only(tmp_path):
+    empty = tmp_path / "empty.csv"
+    empty.write_text("")
+    header = tmp_path / "header.csv"
+    header.write_text("a,b,c\r\n")
+
+    assert csv_stats(empty) == (0, 0)
+    assert csv_stats(header) == (0, 3)
+
+
+def test_csv_stats_cr_line_ends_and_trailing_blank_lines(tmp_path):
+    mac = tmp_path / "mac.csv"
+    mac.write_bytes(b"a,b\r1,2\r3,4\r")
+    blank = tmp_path / "blank.csv"
+    blank.write_bytes(b"a,b\n1,2\n\n\n")
+    crlf = tmp_path / "crlf.csv"
+    crlf.write_bytes(b"a,b\r\n1,2\r\n\r\n")
+
+    for chunk_size in (1, 2, 3, 1024):
+        assert csv_stats(mac, chunk_size=chunk_size) == (2, 2)
+        assert csv_stats(blank, chunk_size=chunk_size) == (1, 2)
+        assert csv_stats(crlf, chunk_size=chunk_size) == (1, 2)
+
+
+def test_csv_stats_skips_blank_lines_like_pandas(tmp_path):
+    middle = tmp_path / "middle.csv"
+    middle.write_bytes(b"a,b\n1,2\n\n3,4\n \t\n5,6\n")
+    crlf = tmp_path / "crlf_middle.csv"
+    crlf.write_bytes(b"\r\na,b\r\n1,2\r\n\r\n3,4")
+    quoted = tmp_path / "quoted_blank.csv"
+    quoted.write_bytes(b'a,b\n"x\n\ny",1\n""\n')
+
+    for chunk_size in (1, 2, 3, 1024):
+        assert csv_stats(middle, chunk_size=chunk_size) == (3, 2)
+        assert csv_stats(crlf, chunk_size=chunk_size) == (2, 2)
+        assert csv_stats(quoted, chunk_size=chunk_size) == (2, 2)
+    assert csv_stats(middle, fast=True) == (3, 2)
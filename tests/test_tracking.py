@@ -0,0 +1,82 @@
+import threading
+
+import pytest
+
+from datatrace import db, tracking
+from datatrace.tracking import (
+    compact_usage, configure_usage_writer, get_usage_records, get_usage_rollup, track_usage,
+)
+
+
+@pytest.fixture
+def usage_writer():
+    writers = []
+
+    def configure(**kwargs):
+        writers.append(configure_usage_writer(**kwargs))
+        return writers[-1]
+
+    yield configure
+    configure_usage_writer(async_mode=False)
+
+
+def test_async_usage_is_flushed(usage_writer):
+    usage_writer(batch_size=16)
+    for i in range(100):
+        track_usage("abc", f"epoch {i}")
+    tracking.flush()
+    assert len(get_usage_records("abc")) == 100
+
+
+def test_drop_mode_discards_when_full(usage_writer):
+    gate = threading.Event()
+    writer = usage_writer(maxsize=2, on_full="drop")
+    real_write = writer.write_batch
+    writer.write_batch = lambda rows: (gate.wait(), real_write(rows))
+
+    for i in range(20):
+        track_usage("abc", "step")
+    assert writer.dropped > 0
+    gate.set()
+    tracking.flush()
+    assert len(get_usage_records("abc")) == 20 - writer.dropped
+
+
+def test_sync_mode_writes_immediately():
+    track_usage("abc", "train")
+    assert [r["action"] for r in get_usage_records("abc")] == ["train"]
+
+
+def test_rollups_survive_compaction():
+    conn = db.connect()
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2  # INCREMENTAL
+    with conn:
+        tracking._insert_usage(conn, [
+            ("abc", "train", "2020-01-01T10:15:00"),
+            ("abc", "train", "2020-01-01T10:45:00"),
+            ("abc", "eval", "2020-01-01T11:00:00"),
+            ("xyz", "train", "2020-01-02T09:00:00"),
+        ])
+    track_usage("abc", "train")
+
+    daily = get_usage_rollup("abc", since="2020-01-01")
+    assert sorted((r["bucket"], r["action"], r["count"]) for r in daily[1:]) == [
+        ("2020-01-01", "eval", 1), ("2020-01-01", "train", 2),
+    ]
+    assert daily[0]["count"] == 1
+
+    removed = compact_usage(retention_days=30, hourly_retention_days=90)
+    assert removed == {"usage": 4, "usage_hourly": 3}
+    assert len(get_usage_records()) == 1
+    assert get_usage_rollup("abc") == daily
+    assert len(get_usage_rollup(granularity="hour")) == 1
+    assert {r["hash"] for r in get_usage_rollup()} == {"abc", "xyz"}
+
+
+def test_compaction_converts_old_databases_to_incremental_vacuum():
+    conn = db.connect()
+    conn.execute("PRAGMA auto_vacuum = NONE")
+    conn.execute("VACUUM")
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 0
+    compact_usage()
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
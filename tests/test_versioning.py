@@ -6,4 +6,19 @@ def test_add_dataset(tmp_path):
     p.write_text("a,b\n1,2")
     version = add_dataset(str(p))
     assert len(version) == 8
-    
\ No newline at end of file
+    
+
+def test_file_whose_blob_came_from_a_directory_gets_stats(tmp_path):
+    import os
+    from datatrace.datasets import list_datasets
+
+    src = tmp_path / "src"
+    src.mkdir()
+    p = src / "a.csv"
+    p.write_text("a,b\n1,2\n3,4\n")
+    st = p.stat()
+    os.utime(p, ns=(st.st_atime_ns, st.st_mtime_ns - 60 * 10**9))  # cacheable
+    add_dataset(str(src))
+    add_dataset(str(p))
+    stats = {d["path"]: (d["rows"], d["columns"]) for d in list_datasets()}
+    assert stats[str(p)] == (2, 2)